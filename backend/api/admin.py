@@ -0,0 +1,106 @@
+import io
+import json
+import pstats
+
+from django.contrib import admin
+from django.http import FileResponse, Http404
+from django.shortcuts import get_object_or_404
+from django.urls import path, reverse
+from django.utils.html import format_html
+
+from .models import RequestProfile, StoredFile, Task
+
+
+class RequestProfileAdmin(admin.ModelAdmin):
+    """Профили запросов"""
+    list_display = (
+        'created', 'method', 'path', 'user', 'status', 'duration',
+        'query_count', 'query_time',
+    )
+    list_filter = ('method', 'status')
+    search_fields = ('path', 'user')
+    readonly_fields = (
+        'created', 'method', 'path', 'user', 'status', 'duration',
+        'query_count', 'query_time', 'note', 'download', 'stats', 'sql',
+    )
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def get_urls(self):
+        return [
+            path('<int:pk>/download/',
+                 self.admin_site.admin_view(self.download_view),
+                 name='api_requestprofile_download'),
+        ] + super().get_urls()
+
+    def download_view(self, request, pk):
+        if not self.has_view_permission(request):
+            raise Http404
+        profile = get_object_or_404(RequestProfile, pk=pk)
+        if not profile.stats_path.exists():
+            raise Http404
+        return FileResponse(
+            profile.stats_path.open('rb'), as_attachment=True,
+            filename=f'profile-{profile.pk}.prof'
+        )
+
+    @admin.display(description='Файл pstats')
+    def download(self, obj):
+        return format_html(
+            '<a href="{}">profile-{}.prof</a>',
+            reverse('admin:api_requestprofile_download', args=[obj.pk]),
+            obj.pk
+        )
+
+    @admin.display(description='Самые дорогие функции')
+    def stats(self, obj):
+        if not obj.stats_path.exists():
+            return '—'
+        output = io.StringIO()
+        pstats.Stats(str(obj.stats_path), stream=output).sort_stats(
+            'cumulative'
+        ).print_stats(40)
+        return format_html('<pre>{}</pre>', output.getvalue())
+
+    @admin.display(description='SQL')
+    def sql(self, obj):
+        if not obj.sql_path.exists():
+            return '—'
+        queries = json.loads(obj.sql_path.read_text())
+        return format_html('<pre>{}</pre>', '\n\n'.join(
+            f'{query["ms"]:.2f} мс [{query["alias"]}] {query["sql"]}\n'
+            f'    {query["params"]}'
+            for query in queries
+        ))
+
+
+class TaskAdmin(admin.ModelAdmin):
+    """Задачи"""
+    list_display = (
+        'id', 'name', 'status', 'priority', 'attempts', 'run_after',
+        'finished',
+    )
+    list_filter = ('status', 'name')
+    search_fields = ('name', 'dedup_key')
+    readonly_fields = ('created', 'finished', 'locked_by', 'locked_until')
+    show_full_result_count = False
+
+
+class StoredFileAdmin(admin.ModelAdmin):
+    """Файлы медиа"""
+    list_display = ('name', 'size', 'references', 'orphaned', 'created')
+    search_fields = ('name',)
+    readonly_fields = ('name', 'size', 'references', 'orphaned', 'created')
+    show_full_result_count = False
+
+    def has_add_permission(self, request):
+        return False
+
+
+admin.site.register(RequestProfile, RequestProfileAdmin)
+admin.site.register(Task, TaskAdmin)
+admin.site.register(StoredFile, StoredFileAdmin)
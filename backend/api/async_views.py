@@ -0,0 +1,245 @@
+"""Асинхронные версии самых нагруженных GET-эндпоинтов.
+
+Подключаются вместо DRF-вьюсетов при ASYNC_READS=True и рассчитаны на
+запуск через ASGI (uvicorn). Независимые запросы к базе — страница
+рецептов и флаги текущего пользователя — выполняются параллельно в
+отдельных потоках, каждый со своим соединением. Остальные методы
+передаются исходным синхронным вьюсетам.
+"""
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import AnonymousUser
+from django.http import Http404, HttpResponse, HttpResponseNotModified
+from django.shortcuts import get_object_or_404
+from django.utils.cache import patch_vary_headers
+from django_filters.utils import translate_validation
+from rest_framework import exceptions
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+from rest_framework.views import APIView, exception_handler
+
+from recipes.models import Favorite, Ingredient, ShopList, Tag
+from users.models import Subscription, User
+from .authentication import CachedTokenAuthentication
+from .catalog import catalog_response
+from .conditional import etag_matches, recipe_etag
+from .fieldsets import select_recipes, select_subscriptions
+from .filters import RecipeFilter
+from .pagination import CustomPagination
+from .serializers import (IngredientSerializer, RecipeGetSerializer,
+                          TagSerializer, UserWithRecipesSerializer)
+from .threads import concurrently, in_thread
+from .views import (IngredientViewSet, RecipeViewSet, TagViewSet,
+                    UserViewSet)
+
+SAFE_METHODS = ('GET', 'HEAD')
+
+
+def render(data, status=200):
+    """Ответ с тем же Content-Type, что у DRF Response."""
+    renderer = api_settings.DEFAULT_RENDERER_CLASSES[0]()
+    content_type = renderer.media_type
+    if renderer.charset:
+        content_type = f'{content_type}; charset={renderer.charset}'
+    return HttpResponse(renderer.render(data), status=status,
+                        content_type=content_type)
+
+
+def allowed_methods(fallback):
+    """Заголовок Allow, как его считает DRF для fallback-вьюсета."""
+    methods = {'get', 'head', 'options'}
+    methods.update(fallback.actions)
+    return ', '.join(method.upper() for method in APIView.http_method_names
+                     if method in methods)
+
+
+def finalize(response, allow):
+    """Заголовки, которые DRF добавляет к каждому ответу."""
+    response['Allow'] = allow
+    patch_vary_headers(response, ('Accept',))
+    return response
+
+
+def handle_exception(request, error):
+    """Ответ на ошибку через обработчик исключений DRF."""
+    if isinstance(error, Http404):
+        error = exceptions.NotFound()
+    if isinstance(error, (exceptions.NotAuthenticated,
+                          exceptions.AuthenticationFailed)):
+        error.auth_header = (
+            CachedTokenAuthentication().authenticate_header(request)
+        )
+    response = exception_handler(error, {'request': request})
+    rendered = render(response.data, response.status_code)
+    for header, value in response.items():
+        if header.lower() != 'content-type':
+            rendered[header] = value
+    return rendered
+
+
+def async_api_view(fallback, login_required=False):
+    """Аутентификация, обработка ошибок DRF и рендеринг для async-вью.
+
+    Ответ совпадает с ответом DRF-вьюсета: тот же Content-Type, Allow,
+    Vary и тексты ошибок. Остальные методы, включая неразрешённые, отдаёт
+    сам fallback, чтобы порядок проверок (401 или 405) был как у DRF.
+    """
+    allow = allowed_methods(fallback)
+
+    def decorator(view):
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            if request.method not in SAFE_METHODS:
+                return await sync_to_async(fallback)(
+                    request, *args, **kwargs
+                )
+            drf_request = Request(request)
+            try:
+                result = await in_thread(
+                    CachedTokenAuthentication().authenticate
+                )(request)
+                drf_request.user = result[0] if result else AnonymousUser()
+                if login_required and not drf_request.user.is_authenticated:
+                    raise exceptions.NotAuthenticated()
+                data = await view(drf_request, *args, **kwargs)
+            except (exceptions.APIException, Http404) as error:
+                return finalize(handle_exception(request, error), allow)
+            if not isinstance(data, HttpResponse):
+                data = render(data)
+            return finalize(data, allow)
+        wrapper.csrf_exempt = True
+        return wrapper
+    return decorator
+
+
+def user_flags(user):
+    """Множества id избранного, покупок и подписок пользователя."""
+    if not user.is_authenticated:
+        return {'favorited': set(), 'in_shopping_cart': set(),
+                'subscribed': set()}
+    return {
+        'favorited': set(Favorite.objects.filter(
+            user=user).values_list('recipe_id', flat=True)),
+        'in_shopping_cart': set(ShopList.objects.filter(
+            user=user).values_list('recipe_id', flat=True)),
+        'subscribed': set(Subscription.objects.filter(
+            user=user).values_list('author_id', flat=True)),
+    }
+
+
+def recipe_page(request):
+    filterset = RecipeFilter(
+        request.query_params,
+        queryset=select_recipes(request, annotate_flags=False),
+        request=request
+    )
+    if not filterset.is_valid():
+        raise translate_validation(filterset.errors)
+    paginator = CustomPagination()
+    page = paginator.paginate_queryset(filterset.qs, request)
+    return paginator, page
+
+
+def get_recipe(request, lookup):
+    return get_object_or_404(
+        select_recipes(request, annotate_flags=False), **lookup
+    )
+
+
+@async_api_view(
+    fallback=RecipeViewSet.as_view({'get': 'list', 'post': 'create'})
+)
+async def recipe_list(request):
+    (paginator, page), flags = await concurrently(
+        (recipe_page, request), (user_flags, request.user)
+    )
+    data = RecipeGetSerializer(
+        page, many=True, context={'request': request, **flags}
+    ).data
+    return paginator.get_paginated_response(data).data
+
+
+async def recipe_detail_data(request, **lookup):
+    """Рецепт с ETag; 304 без сериализации, если у клиента он свежий.
+
+    ETag считается до чтения рецепта, как и в синхронной версии: если
+    рецепт изменится между запросами, клиент получит более новое тело под
+    старым ETag и при следующем запросе просто скачает его снова. В
+    обратном порядке он закэшировал бы старое тело под новым ETag.
+    """
+    etag, = await concurrently((
+        recipe_etag, request.user, lookup,
+        api_settings.DEFAULT_RENDERER_CLASSES[0].format
+    ))
+    if etag is not None and etag_matches(request, etag):
+        response = HttpResponseNotModified()
+        response['ETag'] = etag
+        return response
+    recipe, flags = await concurrently(
+        (get_recipe, request, lookup), (user_flags, request.user)
+    )
+    response = render(RecipeGetSerializer(
+        recipe, context={'request': request, **flags}
+    ).data)
+    if etag is not None:
+        response['ETag'] = etag
+    return response
+
+
+@async_api_view(fallback=RecipeViewSet.as_view({
+    'get': 'retrieve', 'put': 'update',
+    'patch': 'partial_update', 'delete': 'destroy',
+}))
+async def recipe_detail(request, pk):
+    return await recipe_detail_data(request, pk=pk)
+
+
+@async_api_view(
+    fallback=RecipeViewSet.as_view({'get': 'retrieve_by_slug'})
+)
+async def recipe_by_slug(request, slug):
+    return await recipe_detail_data(request, slug=slug)
+
+
+@async_api_view(fallback=TagViewSet.as_view({'get': 'list'}))
+async def tag_list(request):
+    return TagSerializer([tag async for tag in Tag.objects.all()],
+                         many=True).data
+
+
+@async_api_view(fallback=IngredientViewSet.as_view({'get': 'list'}))
+async def ingredient_list(request):
+    if not request.query_params:
+        return await in_thread(catalog_response)(request)
+    queryset = IngredientViewSet.filter_backends[0]().filter_queryset(
+        request, Ingredient.objects.all(), IngredientViewSet
+    )
+    return IngredientSerializer(
+        [ingredient async for ingredient in queryset], many=True
+    ).data
+
+
+def subscriptions_page(request):
+    paginator = CustomPagination()
+    page = paginator.paginate_queryset(
+        select_subscriptions(request, User.objects.filter(
+            following__user=request.user
+        )),
+        request
+    )
+    return paginator, page
+
+
+@async_api_view(
+    fallback=UserViewSet.as_view({'get': 'subscriptions'}),
+    login_required=True
+)
+async def subscriptions(request):
+    paginator, page = await in_thread(subscriptions_page)(request)
+    # Все подписки страницы принадлежат пользователю: флаг известен заранее.
+    data = UserWithRecipesSerializer(page, many=True, context={
+        'request': request,
+        'subscribed': {author.id for author in page},
+    }).data
+    return paginator.get_paginated_response(data).data
@@ -0,0 +1,103 @@
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import DEFAULT_CACHE_ALIAS, caches
+from rest_framework.authentication import TokenAuthentication
+
+from recipes.shopping import cache_is_shared
+from .metrics import observe_cache
+
+
+class LocalTokenCache:
+    """Ограниченный LRU-кэш токенов с временем жизни записей.
+
+    Живёт в памяти процесса, поэтому сброс виден только в текущем
+    воркере: в остальных выход или смена пароля действуют до истечения
+    TOKEN_CACHE_LOCAL_TTL. Используется, только если общего кэша нет.
+    """
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires, value = item
+            if expires < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+
+class SharedTokenCache:
+    """Кэш токенов в общем бэкенде Django, виден всем воркерам."""
+    prefix = 'auth-token:'
+
+    def __init__(self, alias, ttl):
+        self.cache = caches[alias]
+        self.ttl = ttl
+
+    def get(self, key):
+        return self.cache.get(self.prefix + key)
+
+    def set(self, key, value):
+        self.cache.set(self.prefix + key, value, self.ttl)
+
+    def delete(self, key):
+        self.cache.delete(self.prefix + key)
+
+
+def build_token_cache():
+    """Общий кэш, если он есть; локальный — с коротким TTL."""
+    if settings.TOKEN_CACHE_ALIAS:
+        return SharedTokenCache(
+            settings.TOKEN_CACHE_ALIAS, settings.TOKEN_CACHE_TTL
+        )
+    if cache_is_shared():
+        return SharedTokenCache(DEFAULT_CACHE_ALIAS, settings.TOKEN_CACHE_TTL)
+    return LocalTokenCache(settings.TOKEN_CACHE_SIZE, min(
+        settings.TOKEN_CACHE_TTL, settings.TOKEN_CACHE_LOCAL_TTL
+    ))
+
+
+token_cache = build_token_cache()
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """TokenAuthentication, который не ходит в БД за известным токеном."""
+
+    def authenticate_credentials(self, key):
+        cached = token_cache.get(key)
+        observe_cache('token', cached is not None)
+        if cached is not None:
+            user, token = cached
+            # Копия, чтобы изменения request.user не попали в кэш.
+            return copy.copy(user), token
+        user, token = super().authenticate_credentials(key)
+        token_cache.set(key, (user, token))
+        return copy.copy(user), token
+
+
+def invalidate_token(key):
+    """Сбрасывает закэшированного владельца токена."""
+    token_cache.delete(key)
@@ -0,0 +1,115 @@
+"""Каталог ингредиентов, заранее сериализованный и сжатый.
+
+Полный список ингредиентов одинаков для всех, поэтому он собирается в
+JSON один раз и лежит в INGREDIENT_CATALOG_DIR рядом со сжатыми
+копиями (.gz и, если установлен brotli, .br). Оттуда его может отдавать
+nginx; Django отдаёт те же байты с ETag и Content-Encoding. Изменение
+ингредиента удаляет файлы, и следующий запрос собирает их заново.
+"""
+import gzip
+import hashlib
+import os
+import threading
+from pathlib import Path
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseNotModified
+
+from recipes.models import Ingredient
+from .conditional import etag_matches
+from .renderers import FastJSONRenderer
+from .serializers import IngredientSerializer
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+FILENAME = 'ingredients.json'
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+_lock = threading.Lock()
+_loaded = {}
+
+
+def catalog_path(suffix=''):
+    return Path(settings.INGREDIENT_CATALOG_DIR) / (FILENAME + suffix)
+
+
+def write_atomic(path, content):
+    temporary = path.with_name(f'.{path.name}.{os.getpid()}.tmp')
+    temporary.write_bytes(content)
+    os.replace(temporary, path)
+
+
+def build_catalog():
+    """Сериализует все ингредиенты и записывает JSON и его сжатые копии."""
+    content = FastJSONRenderer().render(IngredientSerializer(
+        Ingredient.objects.order_by('id'), many=True
+    ).data)
+    catalog_path().parent.mkdir(parents=True, exist_ok=True)
+    # Сжатые копии пишутся первыми: nginx не должен увидеть новый JSON
+    # рядом со старым .gz.
+    write_atomic(catalog_path('.gz'), gzip.compress(content, 9, mtime=0))
+    if brotli is not None:
+        write_atomic(catalog_path('.br'), brotli.compress(content))
+    write_atomic(catalog_path(), content)
+    return content
+
+
+def invalidate_catalog():
+    for suffix in ('', '.gz', '.br'):
+        catalog_path(suffix).unlink(missing_ok=True)
+
+
+def load_catalog():
+    """Словарь {кодировка: байты} и ETag; пересобирается при изменениях."""
+    with _lock:
+        try:
+            stat = catalog_path().stat()
+        except FileNotFoundError:
+            build_catalog()
+            stat = catalog_path().stat()
+        version = (stat.st_mtime_ns, stat.st_size)
+        if _loaded.get('version') != version:
+            bodies = {'identity': catalog_path().read_bytes()}
+            for encoding, suffix in ENCODINGS:
+                if catalog_path(suffix).exists():
+                    bodies[encoding] = catalog_path(suffix).read_bytes()
+            _loaded.update(
+                version=version, bodies=bodies,
+                etag=hashlib.sha1(bodies['identity']).hexdigest(),
+            )
+        return _loaded['bodies'], _loaded['etag']
+
+
+def accepted_encodings(request):
+    accepted = set()
+    for item in request.META.get('HTTP_ACCEPT_ENCODING', '').split(','):
+        name, _, params = item.strip().partition(';')
+        if params.replace(' ', '') not in ('q=0', 'q=0.0', 'q=0.00'):
+            accepted.add(name.strip().lower())
+    return accepted
+
+
+def catalog_response(request):
+    """Каталог в лучшей из принимаемых клиентом кодировок."""
+    bodies, digest = load_catalog()
+    accepted = accepted_encodings(request)
+    encoding = next(
+        (name for name, _ in ENCODINGS if name in accepted and name in bodies),
+        'identity'
+    )
+    etag = (f'"{digest}"' if encoding == 'identity'
+            else f'"{digest}-{encoding}"')
+    if etag_matches(request, etag):
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(
+            bodies[encoding], content_type='application/json'
+        )
+        if encoding != 'identity':
+            response['Content-Encoding'] = encoding
+    response['ETag'] = etag
+    response['Vary'] = 'Accept-Encoding'
+    return response
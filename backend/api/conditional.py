@@ -0,0 +1,54 @@
+"""Условные GET-запросы к рецепту: слабый ETag и ответ 304.
+
+ETag складывается из Recipe.modified, флагов текущего пользователя
+(избранное, покупки, подписка на автора) и формата ответа. modified
+обновляется не только при сохранении рецепта, но и при изменении его
+ингредиентов и тэгов, а также самих ингредиентов, тэгов и автора,
+которые попадают в ответ (recipes/signals.py). Проверка стоит одного
+запроса к базе и обходится без сериализатора.
+"""
+from django.core.exceptions import ValidationError
+from django.db.models import Exists, OuterRef
+
+from recipes.models import Favorite, Recipe, ShopList
+from users.models import Subscription
+
+
+def etag_matches(request, etag):
+    """Есть ли etag в If-None-Match; сравнение слабое, как для GET."""
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH', '')
+    tags = {tag.strip().removeprefix('W/') for tag in if_none_match.split(',')}
+    return etag.removeprefix('W/') in tags or '*' in tags
+
+
+def recipe_etag(user, lookup, variant):
+    """Слабый ETag рецепта для user или None, если рецепта нет.
+
+    variant различает представления одного рецепта, например форматы
+    ответа.
+    """
+    try:
+        queryset = Recipe.objects.filter(**lookup)
+    except (TypeError, ValueError, ValidationError):
+        # Нечисловой pk: ответ тот же, что для несуществующего рецепта.
+        return None
+    if user.is_authenticated:
+        queryset = queryset.annotate(
+            favorited=Exists(Favorite.objects.filter(
+                recipe=OuterRef('pk'), user=user
+            )),
+            in_cart=Exists(ShopList.objects.filter(
+                recipe=OuterRef('pk'), user=user
+            )),
+            subscribed=Exists(Subscription.objects.filter(
+                author=OuterRef('author'), user=user
+            )),
+        ).values_list('modified', 'favorited', 'in_cart', 'subscribed')
+    else:
+        queryset = queryset.values_list('modified')
+    row = queryset.first()
+    if row is None:
+        return None
+    modified, *flags = row
+    flags = ''.join(str(int(flag)) for flag in flags) or '-'
+    return f'W/"{modified:%Y%m%d%H%M%S%f}-{flags}-{variant}"'
@@ -0,0 +1,370 @@
+"""Уведомления о новых рецептах авторов, на которых подписан пользователь.
+
+GET /api/events/ — поток Server-Sent Events. Его обслуживает не Django, а
+EventStreamApplication из foodgram_backend/asgi.py: соединение живёт
+часами, и ему не нужны ни middleware, ни поток из пула на всё это время.
+Браузерный EventSource не умеет передавать заголовки, поэтому, кроме
+Authorization: Token, принимается ?ticket= — короткоживущий подписанный
+билет из POST /api/events/ticket/.
+
+Новый рецепт публикуется после фиксации транзакции через EVENTS_BACKEND:
+MemoryBackend доставляет события только внутри процесса, RedisBackend —
+всем воркерам через pub/sub Redis. В каждом процессе один Hub
+раскладывает события по соединениям подписчиков.
+
+У соединения своя очередь на EVENTS_QUEUE_SIZE событий. Если клиент не
+успевает их читать, очередь сбрасывается и клиент получает событие
+overflow: ленту нужно перечитать запросом к API. При переподключении с
+Last-Event-ID досылаются пропущенные рецепты.
+"""
+import asyncio
+import json
+import logging
+from collections import defaultdict
+from functools import lru_cache
+from urllib.parse import parse_qs
+
+from django.conf import settings
+from django.core import signing
+from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction
+from django.utils.module_loading import import_string
+from rest_framework.exceptions import AuthenticationFailed
+
+from recipes.models import Recipe
+from users.models import Subscription
+from .authentication import CachedTokenAuthentication
+from .threads import in_thread
+
+try:
+    import redis
+    import redis.asyncio as aioredis
+except ImportError:
+    redis = aioredis = None
+
+logger = logging.getLogger(__name__)
+
+PATH = '/api/events/'
+CHANNEL = 'foodgram:events'
+SALT = 'api.events'
+OVERFLOW = {'type': 'overflow'}
+
+
+def make_ticket(user):
+    """Билет для ?ticket=, действует EVENTS_TICKET_MAX_AGE секунд."""
+    return signing.TimestampSigner(salt=SALT).sign(str(user.pk))
+
+
+def ticket_user_id(ticket):
+    try:
+        return int(signing.TimestampSigner(salt=SALT).unsign(
+            ticket, max_age=settings.EVENTS_TICKET_MAX_AGE
+        ))
+    except (signing.BadSignature, ValueError):
+        return None
+
+
+def recipe_event(recipe):
+    return {
+        'type': 'recipe',
+        'id': recipe.pk,
+        'author': recipe.author_id,
+        'data': {
+            'id': recipe.pk,
+            'name': recipe.name,
+            'slug': recipe.slug,
+            'image': recipe.image.url if recipe.image else None,
+            'cooking_time': recipe.cooking_time,
+            'author': recipe.author_id,
+        },
+    }
+
+
+def follow_event(subscription, active):
+    return {'type': 'follow', 'user': subscription.user_id,
+            'author': subscription.author_id, 'active': active}
+
+
+class Connection:
+    """Очередь событий одного клиента и авторы, на которых он подписан."""
+
+    def __init__(self, user_id, authors):
+        self.user_id = user_id
+        self.authors = set(authors)
+        self.replayed_id = 0
+        self.queue = asyncio.Queue(settings.EVENTS_QUEUE_SIZE)
+
+    def put(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # Клиент всё равно перечитает ленту: копить хвост незачем.
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(OVERFLOW)
+
+
+class Hub:
+    """Соединения процесса по авторам; работает в цикле событий ASGI."""
+
+    def __init__(self):
+        self.loop = None
+        self.listener = None
+        self.by_author = defaultdict(set)
+        self.by_user = defaultdict(set)
+        self.count = 0
+
+    def start(self):
+        loop = asyncio.get_running_loop()
+        if self.loop is not loop:
+            self.loop = loop
+            self.listener = loop.create_task(
+                get_backend().listen(self.deliver)
+            )
+
+    def connect(self, connection):
+        self.start()
+        self.count += 1
+        self.by_user[connection.user_id].add(connection)
+        for author in connection.authors:
+            self.by_author[author].add(connection)
+
+    def disconnect(self, connection):
+        self.count -= 1
+        self.discard(self.by_user, connection.user_id, connection)
+        for author in connection.authors:
+            self.discard(self.by_author, author, connection)
+
+    @staticmethod
+    def discard(index, key, connection):
+        connections = index.get(key)
+        if connections is not None:
+            connections.discard(connection)
+            if not connections:
+                del index[key]
+
+    def deliver(self, event):
+        if event['type'] == 'recipe':
+            for connection in self.by_author.get(event['author'], ()):
+                connection.put(event)
+        elif event['type'] == 'follow':
+            for connection in self.by_user.get(event['user'], ()):
+                if event['active']:
+                    connection.authors.add(event['author'])
+                    self.by_author[event['author']].add(connection)
+                else:
+                    connection.authors.discard(event['author'])
+                    self.discard(self.by_author, event['author'], connection)
+        elif event['type'] == 'overflow':
+            for connections in self.by_user.values():
+                for connection in connections:
+                    connection.put(OVERFLOW)
+
+    def deliver_threadsafe(self, event):
+        loop = self.loop
+        if loop is not None and not loop.is_closed():
+            loop.call_soon_threadsafe(self.deliver, event)
+
+
+hub = Hub()
+
+
+class MemoryBackend:
+    """События внутри процесса: для одного воркера и разработки."""
+
+    def publish(self, event):
+        hub.deliver_threadsafe(event)
+
+    async def listen(self, deliver):
+        pass
+
+
+class RedisBackend:
+    """События всем воркерам через pub/sub Redis (EVENTS_REDIS_URL)."""
+
+    def __init__(self):
+        if redis is None:
+            raise ImproperlyConfigured('Для RedisBackend нужен пакет redis.')
+        self.url = settings.EVENTS_REDIS_URL
+        self.client = redis.Redis.from_url(self.url)
+
+    def publish(self, event):
+        try:
+            self.client.publish(CHANNEL, json.dumps(event))
+        except redis.RedisError:
+            logger.exception('Событие %s не опубликовано', event['type'])
+
+    async def listen(self, deliver):
+        reconnect = False
+        while True:
+            try:
+                async with aioredis.Redis.from_url(self.url) as client, \
+                        client.pubsub() as pubsub:
+                    await pubsub.subscribe(CHANNEL)
+                    if reconnect:
+                        # Пока подписки не было, события могли потеряться.
+                        deliver(OVERFLOW)
+                    async for message in pubsub.listen():
+                        if message['type'] == 'message':
+                            deliver(json.loads(message['data']))
+            except redis.RedisError:
+                logger.exception('Подписка на события Redis прервалась')
+            reconnect = True
+            await asyncio.sleep(1)
+
+
+@lru_cache(maxsize=None)
+def get_backend():
+    return import_string(settings.EVENTS_BACKEND)()
+
+
+def publish(event):
+    """Публикует событие после фиксации текущей транзакции."""
+    transaction.on_commit(lambda: get_backend().publish(event))
+
+
+def authenticate(authorization, ticket):
+    """id пользователя из заголовка Authorization или билета."""
+    if ticket:
+        return ticket_user_id(ticket)
+    keyword, _, key = authorization.partition(' ')
+    if keyword != CachedTokenAuthentication.keyword or not key:
+        return None
+    try:
+        user, _ = CachedTokenAuthentication().authenticate_credentials(
+            key.strip()
+        )
+    except AuthenticationFailed:
+        return None
+    return user.pk
+
+
+def followed_authors(user_id):
+    return list(Subscription.objects.filter(user_id=user_id).values_list(
+        'author_id', flat=True
+    ))
+
+
+def missed_recipes(authors, last_id):
+    """Рецепты после last_id; больше EVENTS_REPLAY_LIMIT — overflow."""
+    recipes = list(Recipe.objects.filter(
+        author__in=authors, pk__gt=last_id
+    ).order_by('pk')[:settings.EVENTS_REPLAY_LIMIT + 1])
+    events = [recipe_event(recipe)
+              for recipe in recipes[:settings.EVENTS_REPLAY_LIMIT]]
+    if len(recipes) > settings.EVENTS_REPLAY_LIMIT:
+        events.append(OVERFLOW)
+    return events
+
+
+def encode(event):
+    if event['type'] == 'overflow':
+        return b'event: overflow\ndata: {}\n\n'
+    data = json.dumps(event['data'], ensure_ascii=False)
+    return f'id: {event["id"]}\nevent: recipe\ndata: {data}\n\n'.encode()
+
+
+class EventStreamApplication:
+    """ASGI-приложение: PATH — поток событий, остальное — в Django."""
+
+    def __init__(self, django_application):
+        self.django_application = django_application
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or scope['path'] != PATH:
+            return await self.django_application(scope, receive, send)
+        if scope['method'] != 'GET':
+            return await self.respond(send, 405, 'Метод не разрешён.')
+        headers = {name.decode('latin-1').lower(): value.decode('latin-1')
+                   for name, value in scope['headers']}
+        query = parse_qs(scope['query_string'].decode('latin-1'))
+        user_id = await in_thread(authenticate)(
+            headers.get('authorization', ''), query.get('ticket', [''])[0]
+        )
+        if user_id is None:
+            return await self.respond(
+                send, 401, 'Учетные данные не были предоставлены.'
+            )
+        if hub.count >= settings.EVENTS_MAX_CONNECTIONS:
+            return await self.respond(
+                send, 503, 'Слишком много соединений.',
+                [(b'retry-after', b'30')]
+            )
+        connection = Connection(
+            user_id, await in_thread(followed_authors)(user_id)
+        )
+        hub.connect(connection)
+        try:
+            await self.stream(connection, headers, receive, send)
+        finally:
+            hub.disconnect(connection)
+
+    @staticmethod
+    async def respond(send, status, detail, headers=()):
+        await send({
+            'type': 'http.response.start',
+            'status': status,
+            'headers': [(b'content-type', b'application/json'), *headers],
+        })
+        await send({
+            'type': 'http.response.body',
+            'body': json.dumps({'detail': detail}).encode(),
+        })
+
+    async def stream(self, connection, headers, receive, send):
+        await send({
+            'type': 'http.response.start',
+            'status': 200,
+            'headers': [
+                (b'content-type', b'text/event-stream'),
+                (b'cache-control', b'no-cache'),
+                # nginx не должен копить поток в своём буфере.
+                (b'x-accel-buffering', b'no'),
+            ],
+        })
+        body = f'retry: {settings.EVENTS_RETRY_SECONDS * 1000}\n\n'.encode()
+        last_id = headers.get('last-event-id', '')
+        if last_id.isdigit() and connection.authors:
+            # Подключение к hub уже есть: новые события не потеряются, а
+            # дубли с уже досланными отбрасывает write.
+            for event in await in_thread(missed_recipes)(
+                connection.authors, int(last_id)
+            ):
+                body += encode(event)
+                if event['type'] == 'recipe':
+                    connection.replayed_id = event['id']
+        await send({'type': 'http.response.body', 'body': body,
+                    'more_body': True})
+        writer = asyncio.ensure_future(self.write(connection, send))
+        disconnect = asyncio.ensure_future(self.wait_disconnect(receive))
+        try:
+            await asyncio.wait((writer, disconnect),
+                               return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            writer.cancel()
+            disconnect.cancel()
+        if writer.done() and not writer.cancelled():
+            writer.result()
+
+    @staticmethod
+    async def write(connection, send):
+        while True:
+            try:
+                event = await asyncio.wait_for(
+                    connection.queue.get(), settings.EVENTS_HEARTBEAT_SECONDS
+                )
+            except asyncio.TimeoutError:
+                # Комментарий держит соединение живым в прокси.
+                chunk = b': ping\n\n'
+            else:
+                if (event['type'] == 'recipe'
+                        and event['id'] <= connection.replayed_id):
+                    continue
+                chunk = encode(event)
+            await send({'type': 'http.response.body', 'body': chunk,
+                        'more_body': True})
+
+    @staticmethod
+    async def wait_disconnect(receive):
+        while (await receive())['type'] != 'http.disconnect':
+            pass
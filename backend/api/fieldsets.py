@@ -0,0 +1,110 @@
+from django.db.models import Count, Exists, OuterRef
+
+from recipes.models import Favorite, Recipe, ShopList
+from users.models import Subscription, User
+
+
+class FieldSelection:
+    """Разбор параметров ?fields= и ?expand= запроса.
+
+    Без параметров ответ полный, как раньше. Если передан хотя бы один
+    из них, в ответ попадают только поля из fields (или все, если fields
+    не задан), а связи сворачиваются до id, пока их нет в expand.
+    """
+
+    def __init__(self, request):
+        params = getattr(request, 'query_params', None)
+        if params is None:
+            params = getattr(request, 'GET', {})
+        self.only = self.split(params.get('fields'))
+        self.expand = self.split(params.get('expand')) or set()
+        self.sparse = self.only is not None or 'expand' in params
+
+    @staticmethod
+    def split(value):
+        if value is None:
+            return None
+        return {name.strip() for name in value.split(',') if name.strip()}
+
+    def wants(self, name):
+        return self.only is None or name in self.only
+
+    def expands(self, name):
+        return self.wants(name) and (not self.sparse or name in self.expand)
+
+
+class DynamicFieldsMixin:
+    """Оставляет в сериализаторе только запрошенные поля.
+
+    Применяется лишь к корневому сериализатору, созданному с request в
+    контексте; вложенные сериализаторы выдают свои поля целиком.
+    collapsed_fields задаёт фабрики полей, которыми заменяются
+    несвёрнутые связи.
+    """
+    collapsed_fields = {}
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = kwargs.get('context', {}).get('request')
+        if request is None:
+            return
+        selection = FieldSelection(request)
+        if not selection.sparse:
+            return
+        for name in list(self.fields):
+            if not selection.wants(name):
+                self.fields.pop(name)
+            elif (name in self.collapsed_fields
+                  and not selection.expands(name)):
+                self.fields[name] = self.collapsed_fields[name]()
+
+
+def select_recipes(request, annotate_flags=True):
+    """Queryset рецептов с подгрузкой только нужных для ответа данных."""
+    selection = FieldSelection(request)
+    queryset = Recipe.objects.all()
+    if selection.expands('author'):
+        queryset = queryset.select_related('author')
+    if selection.wants('tags'):
+        queryset = queryset.prefetch_related('tags')
+    if selection.expands('ingredients'):
+        queryset = queryset.prefetch_related('IngredientInRecipe__ingredient')
+    elif selection.wants('ingredients'):
+        queryset = queryset.prefetch_related('IngredientInRecipe')
+    user = request.user
+    if annotate_flags and user.is_authenticated:
+        if selection.wants('is_favorited'):
+            queryset = queryset.annotate(favorited_flag=Exists(
+                Favorite.objects.filter(recipe=OuterRef('pk'), user=user)
+            ))
+        if selection.wants('is_in_shopping_cart'):
+            queryset = queryset.annotate(in_shopping_cart_flag=Exists(
+                ShopList.objects.filter(recipe=OuterRef('pk'), user=user)
+            ))
+    return queryset
+
+
+def select_users(request, queryset=None):
+    """Queryset пользователей с флагом подписки текущего пользователя."""
+    selection = FieldSelection(request)
+    queryset = User.objects.all() if queryset is None else queryset
+    user = request.user
+    if user.is_authenticated and selection.wants('is_subscribed'):
+        queryset = queryset.annotate(subscribed_flag=Exists(
+            Subscription.objects.filter(author=OuterRef('pk'), user=user)
+        ))
+    return queryset
+
+
+def select_subscriptions(request, queryset):
+    """Подписки: рецепты и их число подгружаются только по запросу."""
+    selection = FieldSelection(request)
+    queryset = select_users(request, queryset)
+    if selection.wants('recipes'):
+        queryset = queryset.prefetch_related('recipes')
+    if selection.wants('recipes_count'):
+        # В GROUP BY-запросах Meta.ordering не применяется.
+        queryset = queryset.annotate(
+            recipes_total=Count('recipes')
+        ).order_by(*User._meta.ordering)
+    return queryset
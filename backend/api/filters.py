@@ -1,7 +1,8 @@
+from django import forms
 from django_filters import rest_framework as filters
 from rest_framework.filters import SearchFilter
 
-from recipes.models import Recipe, Tag
+from recipes.models import Recipe, RecipeTag
 
 
 class IngredientFilter(SearchFilter):
@@ -9,17 +10,40 @@ class IngredientFilter(SearchFilter):
     search_param = 'name'
 
 
+class SlugListField(forms.MultipleChoiceField):
+    """Список слагов без проверки по справочнику."""
+
+    def valid_value(self, value):
+        return True
+
+
+class TagsFilter(filters.MultipleChoiceFilter):
+    """Рецепты, у которых есть хотя бы один из тэгов.
+
+    Полусоединение с таблицей связи (id IN (подзапрос)) вместо JOIN: без
+    дублей рецептов, без DISTINCT и без отдельного запроса слагов к Tag.
+    Подзапрос идёт по индексу (tag_id, recipe_id).
+    """
+    field_class = SlugListField
+
+    def filter(self, queryset, value):
+        if not value:
+            return queryset
+        return queryset.filter(pk__in=RecipeTag.objects.filter(
+            tag__slug__in=value
+        ).values('recipe_id'))
+
+
 class RecipeFilter(filters.FilterSet):
     """Фильтр для рецептов по избранному, списку покупок, автору и тэгам."""
     author = filters.CharFilter(method='filter_by_author')
-    tags = filters.ModelMultipleChoiceFilter(
-        field_name='tags__slug',
-        queryset=Tag.objects.all(),
-        label='Tags',
-        to_field_name='slug'
-    )
+    tags = TagsFilter(label='Tags')
     is_favorited = filters.BooleanFilter(method='get_favorite')
     is_in_shopping_cart = filters.BooleanFilter(method='get_is_in_shopping_cart')
+    ordering = filters.ChoiceFilter(
+        choices=(('trending', 'Популярные сейчас'),),
+        method='order_by_trending',
+    )
 
     def get_favorite(self, queryset, name, value):
         if value:
@@ -31,6 +55,10 @@ class RecipeFilter(filters.FilterSet):
             return queryset.filter(shopping_cart__user=self.request.user)
         return queryset
 
+    def order_by_trending(self, queryset, name, value):
+        """Порядок по заранее посчитанной оценке: чтение по индексу."""
+        return queryset.order_by('-trending_score', '-id')
+
     def filter_by_author(self, queryset, name, value):
         try:
             author_id = int(value)
@@ -40,4 +68,5 @@ class RecipeFilter(filters.FilterSet):
 
     class Meta:
         model = Recipe
-        fields = ['tags', 'author', 'is_favorited', 'is_in_shopping_cart']
\ No newline at end of file
+        fields = ['tags', 'author', 'is_favorited', 'is_in_shopping_cart',
+                  'ordering']
\ No newline at end of file
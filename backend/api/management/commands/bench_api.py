@@ -0,0 +1,134 @@
+import asyncio
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.test import AsyncClient, Client
+
+DEFAULT_PATHS = ('/api/recipes/', '/api/tags/', '/api/ingredients/')
+
+
+class HeadersAsyncClient(AsyncClient):
+    """AsyncClient, передающий заголовки в ASGI-scope."""
+
+    def __init__(self, raw_headers):
+        super().__init__()
+        self.raw_headers = raw_headers
+
+    def _base_scope(self, **request):
+        scope = super()._base_scope(**request)
+        scope['headers'] = scope['headers'] + self.raw_headers
+        return scope
+
+
+class Command(BaseCommand):
+    help = ('measuring requests/sec of API endpoints in-process; '
+            'run with different DATABASE_URL / CONN_MAX_AGE / DB_POOL_SIZE / '
+            'SQLITE_PRAGMAS to compare database configurations')
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='*', default=DEFAULT_PATHS)
+        parser.add_argument('--requests', type=int, default=200)
+        parser.add_argument('--threads', type=int, default=4)
+        parser.add_argument('--token', default='',
+                            help='токен для авторизованных запросов')
+        parser.add_argument('--asgi', action='store_true',
+                            help='гонять запросы через ASGI-обработчик; '
+                                 '--threads задаёт число корутин')
+
+    def describe_database(self):
+        config = settings.DATABASES['default']
+        return (f"{config['ENGINE'].rsplit('.', 1)[-1]} "
+                f"CONN_MAX_AGE={config.get('CONN_MAX_AGE')} "
+                f"POOL={config.get('POOL', {}).get('MAX_SIZE', 0)} "
+                f"PRAGMAS={'on' if settings.SQLITE_PRAGMAS else 'off'}")
+
+    def run_worker(self, path, count, token):
+        headers = {'HTTP_AUTHORIZATION': f'Token {token}'} if token else {}
+        client = Client(HTTP_HOST='localhost', **headers)
+        timings = []
+        try:
+            for _ in range(count):
+                start = time.perf_counter()
+                response = client.get(path)
+                timings.append(time.perf_counter() - start)
+                if response.status_code != 200:
+                    raise RuntimeError(f'{path}: {response.status_code}')
+        finally:
+            connections.close_all()
+        return timings
+
+    async def run_async_worker(self, client, path, count):
+        timings = []
+        for _ in range(count):
+            start = time.perf_counter()
+            response = await client.get(path)
+            timings.append(time.perf_counter() - start)
+            if response.status_code != 200:
+                raise RuntimeError(f'{path}: {response.status_code}')
+        return timings
+
+    async def run_async(self, path, count, workers, token):
+        headers = []
+        if token:
+            headers.append((b'authorization', f'Token {token}'.encode()))
+        client = HeadersAsyncClient(headers)
+        return await asyncio.gather(*(
+            self.run_async_worker(client, path, count)
+            for _ in range(workers)
+        ))
+
+    @staticmethod
+    def summarize(results, elapsed):
+        timings = sorted(t for result in results for t in result)
+        return (len(timings) / elapsed,
+                statistics.median(timings) * 1000,
+                timings[int(len(timings) * 0.95) - 1] * 1000)
+
+    def bench(self, path, total, threads, token):
+        per_thread = max(1, total // threads)
+        start = time.perf_counter()
+        with ThreadPoolExecutor(threads) as executor:
+            results = list(executor.map(
+                lambda _: self.run_worker(path, per_thread, token),
+                range(threads)
+            ))
+        return self.summarize(results, time.perf_counter() - start)
+
+    async def bench_async(self, paths, total, workers, token):
+        per_worker = max(1, total // workers)
+        stats = []
+        for path in paths:
+            start = time.perf_counter()
+            results = await self.run_async(path, per_worker, workers, token)
+            stats.append(self.summarize(results, time.perf_counter() - start))
+        return stats
+
+    def report(self, path, rps, p50, p95):
+        self.stdout.write(
+            f'{path:<40} {rps:8.1f} req/s  '
+            f'p50 {p50:7.2f} ms  p95 {p95:7.2f} ms'
+        )
+
+    def handle(self, *args, **options):
+        settings.ALLOWED_HOSTS += ['localhost', 'testserver']
+        self.stdout.write(
+            f"{'ASGI' if options['asgi'] else 'WSGI'} "
+            f"ASYNC_READS={settings.ASYNC_READS} {self.describe_database()}"
+        )
+        if options['asgi']:
+            stats = asyncio.run(self.bench_async(
+                options['paths'], options['requests'], options['threads'],
+                options['token']
+            ))
+        else:
+            stats = [
+                self.bench(path, options['requests'], options['threads'],
+                           options['token'])
+                for path in options['paths']
+            ]
+        for path, row in zip(options['paths'], stats):
+            self.report(path, *row)
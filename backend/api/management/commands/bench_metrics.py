@@ -0,0 +1,50 @@
+import tempfile
+import timeit
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.http import HttpResponse
+from django.test import RequestFactory, override_settings
+from django.urls import resolve
+
+from api.metrics import MetricsMiddleware, install_query_counter
+
+
+class Command(BaseCommand):
+    help = 'measuring the per-request overhead of MetricsMiddleware'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--number', type=int, default=20000)
+        parser.add_argument('--queries', type=int, default=5,
+                            help='SQL-запросов на один запрос')
+
+    def handle(self, *args, **options):
+        request = RequestFactory().get('/api/recipes/')
+        request.resolver_match = resolve('/api/recipes/')
+        install_query_counter(connection)
+
+        def view(request):
+            with connection.cursor() as cursor:
+                for _ in range(options['queries']):
+                    cursor.execute('SELECT 1')
+            return HttpResponse()
+
+        with tempfile.TemporaryDirectory() as directory, override_settings(
+            METRICS_ENABLED=True, METRICS_DIR=directory
+        ):
+            middleware = MetricsMiddleware(view)
+            number = options['number']
+            bare = min(timeit.repeat(
+                lambda: view(request), number=number, repeat=3
+            ))
+            measured = min(timeit.repeat(
+                lambda: middleware(request), number=number, repeat=3
+            ))
+        self.stdout.write(
+            f'view with {options["queries"]} queries: '
+            f'{bare / number * 1e6:7.1f} us\n'
+            f'with metrics:                 '
+            f'{measured / number * 1e6:7.1f} us\n'
+            f'overhead per request:         '
+            f'{(measured - bare) / number * 1e6:7.1f} us'
+        )
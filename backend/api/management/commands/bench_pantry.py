@@ -0,0 +1,95 @@
+import random
+import statistics
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from recipes.fake_data import create_fake_recipes
+from recipes.models import Recipe
+from recipes.pantry import DENSE_RATIO, PantryIndex
+
+
+class Command(BaseCommand):
+    help = ('measuring build time and latency of the pantry search index '
+            'on synthetic recipes, checked against brute force '
+            '(rolled back afterwards)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipes', type=int, default=100000)
+        parser.add_argument('--ingredients', type=int, default=2000)
+        parser.add_argument('--ingredients-per-recipe', type=int, default=8)
+        parser.add_argument('--skew', type=float, default=1.0,
+                            help='показатель Ципфа для частот ингредиентов')
+        parser.add_argument('--pantry', type=int, default=20,
+                            help='сколько продуктов в запросе')
+        parser.add_argument('--max-missing', type=int, default=2)
+        parser.add_argument('--queries', type=int, default=200)
+
+    def brute_force(self, index, pantry, max_missing):
+        found = {}
+        for recipe_id, ingredients in index.ingredients.items():
+            missing = len(ingredients - pantry)
+            if ingredients & pantry and missing <= max_missing:
+                found[recipe_id] = missing
+        return found
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            start = time.perf_counter()
+            data = create_fake_recipes(
+                options['recipes'], ingredients=options['ingredients'],
+                ingredients_per_recipe=options['ingredients_per_recipe'],
+                ingredient_skew=options['skew']
+            )
+            Recipe.objects.update(modified=timezone.now() - timedelta(days=1))
+            self.stdout.write(
+                f'data: {options["recipes"]} recipes in '
+                f'{time.perf_counter() - start:.1f} s'
+            )
+            index = PantryIndex()
+            start = time.perf_counter()
+            with index.lock:
+                index.rebuild()
+            self.stdout.write(
+                f'build: {len(index)} recipes, {len(index.dense)} dense and '
+                f'{len(index.sparse)} sparse postings (1/{DENSE_RATIO}) in '
+                f'{time.perf_counter() - start:.2f} s'
+            )
+            index.checked = time.monotonic()
+
+            rng = random.Random(0)
+            # Продукты берутся из самых частых ингредиентов и случайных.
+            popular = data['ingredients'][:options['pantry'] * 2]
+            timings, found = [], 0
+            for number in range(options['queries']):
+                pantry = {ingredient.pk for ingredient in rng.sample(
+                    popular, options['pantry'] // 2
+                ) + rng.sample(data['ingredients'], options['pantry'] // 2)}
+                start = time.perf_counter()
+                matches = index.search(pantry, options['max_missing'])
+                page = matches[:6]
+                total = len(matches)
+                timings.append(time.perf_counter() - start)
+                found += total
+                if number < 5:
+                    expected = self.brute_force(
+                        index, pantry, options['max_missing']
+                    )
+                    ranked = matches[:total]
+                    if (dict(ranked) != expected
+                            or [missing for _, missing in ranked]
+                            != sorted(expected.values())
+                            or len(page) != min(6, total)):
+                        raise CommandError('Результат расходится с перебором')
+            timings.sort()
+            self.stdout.write(
+                f'search ({options["pantry"]} products, max_missing '
+                f'{options["max_missing"]}): '
+                f'p50 {statistics.median(timings) * 1000:.2f} ms  '
+                f'p95 {timings[int(len(timings) * 0.95) - 1] * 1000:.2f} ms  '
+                f'avg matches {found / len(timings):.0f}'
+            )
+            transaction.set_rollback(True)
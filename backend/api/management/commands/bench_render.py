@@ -0,0 +1,90 @@
+import datetime
+import decimal
+import json
+import os
+import timeit
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.translation import gettext_lazy
+from rest_framework.renderers import JSONRenderer
+
+from api.renderers import FastJSONRenderer
+
+DATA_ROOT = os.path.join(settings.BASE_DIR, 'data')
+
+
+def ingredient_payload():
+    with open(os.path.join(DATA_ROOT, 'ingredients.json'),
+              encoding='utf-8') as f:
+        return [
+            {'id': pk, 'name': item['name'],
+             'measurement_unit': item['measurement_unit'], 'amount': None}
+            for pk, item in enumerate(json.load(f), start=1)
+        ]
+
+
+def recipe_payload(count, ingredients):
+    author = {'email': 'cook@example.com', 'id': 1, 'username': 'cook',
+              'first_name': 'Иван', 'last_name': 'Петров',
+              'is_subscribed': False, 'avatar': None}
+    return {
+        'count': count * 10, 'next': 'http://localhost/api/recipes/?page=2',
+        'previous': None,
+        'results': [{
+            'id': pk,
+            'tags': [{'id': 1, 'name': 'Завтрак', 'slug': 'breakfast'}],
+            'author': author,
+            'ingredients': ingredients[pk % 100:pk % 100 + 12],
+            'is_favorited': bool(pk % 2), 'is_in_shopping_cart': False,
+            'name': f'Рецепт {pk}', 'image': f'/media/{pk}.png',
+            'text': 'Описание рецепта. ' * 20, 'cooking_time': pk % 90 + 1,
+            'slug': f'slug{pk}',
+            'slug_url': f'http://localhost/api/recipe/slug{pk}/',
+        } for pk in range(count)],
+    }
+
+
+def special_payload():
+    return {
+        'decimal': decimal.Decimal('1.50'),
+        'datetime': datetime.datetime(
+            2024, 1, 2, 3, 4, 5, 678901, tzinfo=datetime.timezone.utc),
+        'naive': datetime.datetime(2024, 1, 2, 3, 4, 5),
+        'date': datetime.date(2024, 1, 2),
+        'lazy': gettext_lazy('Not found.'),
+        'separators': 'a\u2028b\u2029c',
+        1: 'int key',
+    }
+
+
+class Command(BaseCommand):
+    help = 'comparing JSONRenderer and FastJSONRenderer on large payloads'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipes', type=int, default=1000)
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        ingredients = ingredient_payload()
+        payloads = {
+            f'ingredients ({len(ingredients)})': ingredients,
+            f'recipes ({options["recipes"]})': recipe_payload(
+                options['recipes'], ingredients),
+        }
+        stock, fast = JSONRenderer(), FastJSONRenderer()
+        for name, data in {**payloads, 'special types': special_payload()
+                           }.items():
+            if stock.render(data) != fast.render(data):
+                raise CommandError(f'{name}: вывод рендереров отличается')
+        for name, data in payloads.items():
+            timings = [
+                min(timeit.repeat(lambda: renderer.render(data),
+                                  number=1, repeat=options['repeat']))
+                for renderer in (stock, fast)
+            ]
+            self.stdout.write(
+                f'{name:<20} json {timings[0] * 1000:8.2f} ms  '
+                f'fast {timings[1] * 1000:8.2f} ms  '
+                f'x{timings[0] / timings[1]:.1f}'
+            )
@@ -0,0 +1,95 @@
+import random
+import time
+from collections import defaultdict
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import F, Sum
+
+from recipes.fake_data import create_fake_recipes
+from recipes.models import IngredientInRecipe, ShopList
+from recipes.shopping import UNITS, format_amount, shopping_list
+
+
+class Command(BaseCommand):
+    help = ('comparing the old per-unit shopping list query with the '
+            'unit-normalizing aggregation on a synthetic cart '
+            '(rolled back afterwards)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--cart', type=int, default=500,
+                            help='рецептов в списке покупок')
+        parser.add_argument('--ingredients-per-recipe', type=int, default=10)
+        parser.add_argument('--repeat', type=int, default=10)
+
+    @staticmethod
+    def timed(func, repeat):
+        best, result = None, None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            result = func()
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        return best * 1000, result
+
+    @staticmethod
+    def reference(user):
+        totals = defaultdict(float)
+        for row in IngredientInRecipe.objects.filter(
+            recipe__shopping_cart__user=user
+        ).values('amount', 'recipe__shopping_cart__multiplier',
+                 'ingredient__name', 'ingredient__measurement_unit'):
+            unit = row['ingredient__measurement_unit']
+            canonical, factor = UNITS.get(unit, (unit, 1))
+            totals[row['ingredient__name'], canonical] += (
+                row['amount'] * factor
+                * float(row['recipe__shopping_cart__multiplier'])
+            )
+        return totals
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            data = create_fake_recipes(
+                options['cart'], authors=2,
+                ingredients_per_recipe=options['ingredients_per_recipe']
+            )
+            user = data['authors'][0]
+            rng = random.Random(0)
+            multipliers = [Decimal(value) for value in ('0.5', '1', '2', '3')]
+            ShopList.objects.bulk_create([
+                ShopList(user=user, recipe=recipe,
+                         multiplier=rng.choice(multipliers))
+                for recipe in data['recipes']
+            ])
+            old_ms, old_rows = self.timed(lambda: list(
+                IngredientInRecipe.objects.filter(
+                    recipe__shopping_cart__user=user
+                ).values(
+                    name=F('ingredient__name'),
+                    measurement_unit=F('ingredient__measurement_unit')
+                ).annotate(total_amount=Sum('amount'))
+            ), options['repeat'])
+            new_ms, new_rows = self.timed(lambda: [
+                f'{row["name"]} - {format_amount(row["total"], row["unit"])}'
+                for row in shopping_list(user)
+            ], options['repeat'])
+            ref_ms, expected = self.timed(
+                lambda: self.reference(user), options['repeat']
+            )
+            totals = {(row['name'], row['unit']): row['total']
+                      for row in shopping_list(user)}
+            if totals.keys() != expected.keys() or any(
+                abs(totals[key] - value) > 1e-6 * max(1, value)
+                for key, value in expected.items()
+            ):
+                raise CommandError('Итоги расходятся с построчным подсчётом')
+            self.stdout.write(
+                f'cart: {options["cart"]} recipes\n'
+                f'old query (no units, no multipliers) {old_ms:8.2f} ms  '
+                f'{len(old_rows)} lines\n'
+                f'normalized aggregation + formatting  {new_ms:8.2f} ms  '
+                f'{len(new_rows)} lines\n'
+                f'row-by-row Python reference          {ref_ms:8.2f} ms'
+            )
+            transaction.set_rollback(True)
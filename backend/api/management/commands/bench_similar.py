@@ -0,0 +1,90 @@
+import random
+import statistics
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from api.serializers import RecipePostSerializer
+from recipes.fake_data import create_fake_recipes
+from recipes.models import Recipe
+from recipes.similarity import SimilarityIndex
+
+
+class Command(BaseCommand):
+    help = ('measuring build time, query latency and incremental updates '
+            'of the similar-recipes index on synthetic recipes '
+            '(rolled back afterwards)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipes', type=int, default=100000)
+        parser.add_argument('--ingredients', type=int, default=2000)
+        parser.add_argument('--ingredients-per-recipe', type=int, default=8)
+        parser.add_argument('--queries', type=int, default=1000)
+        parser.add_argument('--limit', type=int, default=6)
+
+    @staticmethod
+    def percentiles(timings):
+        timings = sorted(timings)
+        return (statistics.median(timings) * 1000,
+                timings[int(len(timings) * 0.99) - 1] * 1000)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            start = time.perf_counter()
+            data = create_fake_recipes(
+                options['recipes'], ingredients=options['ingredients'],
+                ingredients_per_recipe=options['ingredients_per_recipe']
+            )
+            self.stdout.write(
+                f'data: {options["recipes"]} recipes in '
+                f'{time.perf_counter() - start:.1f} s'
+            )
+            # Без этого всё созданное попадает в окно догоняющего обновления.
+            Recipe.objects.update(modified=timezone.now() - timedelta(days=1))
+            index = SimilarityIndex()
+            start = time.perf_counter()
+            with index.lock:
+                index.rebuild()
+            self.stdout.write(
+                f'build: {len(index)} recipes in '
+                f'{time.perf_counter() - start:.2f} s'
+            )
+            index.checked = time.monotonic()
+
+            rng = random.Random(0)
+            sample = rng.sample(data['recipes'],
+                                min(options['queries'], len(data['recipes'])))
+            timings = []
+            for recipe in sample:
+                start = time.perf_counter()
+                index.similar(recipe.pk, options['limit'])
+                timings.append(time.perf_counter() - start)
+            p50, p99 = self.percentiles(timings)
+            self.stdout.write(
+                f'query: p50 {p50:.2f} ms  p99 {p99:.2f} ms  '
+                f'(top {options["limit"]})'
+            )
+
+            recipe = sample[0]
+            ingredients = rng.sample(data['ingredients'],
+                                     options['ingredients_per_recipe'])
+            recipe.ingredients.clear()
+            RecipePostSerializer.save_ingredients(recipe, [
+                {'ingredient': {'id': ingredient}, 'amount': 1}
+                for ingredient in ingredients
+            ])
+            recipe.save()
+            start = time.perf_counter()
+            with index.lock:
+                index.catch_up()
+            self.stdout.write(
+                f'incremental update: '
+                f'{(time.perf_counter() - start) * 1000:.2f} ms'
+            )
+            if set(index.recipes[recipe.pk]) != {
+                    ingredient.pk for ingredient in ingredients}:
+                raise CommandError('Индекс не увидел изменённый рецепт')
+            transaction.set_rollback(True)
@@ -0,0 +1,79 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+
+from api.filters import TagsFilter
+from recipes.fake_data import create_fake_recipes
+from recipes.models import Recipe, RecipeTag
+
+
+class Command(BaseCommand):
+    help = ('comparing JOIN + DISTINCT and EXISTS tag filtering '
+            'on synthetic recipes (rolled back afterwards)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipes', type=int, default=20000)
+        parser.add_argument('--tags', type=int, default=30)
+        parser.add_argument('--tags-per-recipe', type=int, default=8)
+        parser.add_argument('--filter-tags', type=int, default=3)
+        parser.add_argument('--repeat', type=int, default=5)
+
+    @staticmethod
+    def timed(func, repeat):
+        best, result = None, None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            result = func()
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        return best * 1000, result
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            start = time.perf_counter()
+            data = create_fake_recipes(
+                options['recipes'], tags=options['tags'],
+                tags_per_recipe=options['tags_per_recipe']
+            )
+            self.stdout.write(
+                f'data: {options["recipes"]} recipes in '
+                f'{time.perf_counter() - start:.1f} s'
+            )
+            slugs = [tag.slug for tag in data['tags'][:options['filter_tags']]]
+            queryset = Recipe.objects.order_by('-pub_date', '-id')
+            variants = {
+                'join': lambda: queryset.filter(tags__slug__in=slugs),
+                'join distinct': lambda: queryset.filter(
+                    tags__slug__in=slugs).distinct(),
+                'exists': lambda: queryset.filter(Exists(
+                    RecipeTag.objects.filter(
+                        recipe=OuterRef('pk'), tag__slug__in=slugs)
+                )),
+                'semi-join': lambda: TagsFilter().filter(queryset, slugs),
+            }
+            results = {}
+            for name, build in variants.items():
+                count_ms, count = self.timed(
+                    lambda: build().count(), options['repeat'])
+                page_ms, page = self.timed(
+                    lambda: list(build().values_list('id', flat=True)[:6]),
+                    options['repeat'])
+                ids_ms, ids = self.timed(
+                    lambda: list(build().values_list('id', flat=True)),
+                    options['repeat'])
+                results[name] = ids
+                self.stdout.write(
+                    f'{name:<15} count={count:<7} count {count_ms:8.2f} ms  '
+                    f'page {page_ms:7.2f} ms  all ids {ids_ms:8.2f} ms'
+                )
+            found = results['semi-join']
+            if (len(found) != len(set(found))
+                    or set(found) != set(results['join'])):
+                raise CommandError('Фильтр по тэгам вернул другие рецепты')
+            self.stdout.write(
+                f'duplicates in plain join: '
+                f'{len(results["join"]) - len(set(results["join"]))}'
+            )
+            transaction.set_rollback(True)
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from api.catalog import ENCODINGS, build_catalog, catalog_path
+
+
+class Command(BaseCommand):
+    help = ('building the precompressed ingredient catalog served at '
+            '/api/ingredients/')
+
+    def handle(self, *args, **options):
+        content = build_catalog()
+        self.stdout.write(f'{catalog_path()}: {len(content)} bytes')
+        for encoding, suffix in ENCODINGS:
+            path = catalog_path(suffix)
+            if path.exists():
+                self.stdout.write(
+                    f'  {encoding}: {path.stat().st_size} bytes'
+                )
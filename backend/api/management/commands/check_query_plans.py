@@ -0,0 +1,150 @@
+import json
+from datetime import datetime, timezone
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import F, Sum
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from api.fieldsets import select_recipes, select_subscriptions
+from api.filters import RecipeFilter
+from api.sync import after
+from recipes.models import (Favorite, Ingredient, IngredientInRecipe, Recipe,
+                            ShopList, Tag)
+from users.models import Subscription, User
+
+SINCE = (datetime(2024, 1, 1, tzinfo=timezone.utc), 1)
+
+
+def api_request(params=None):
+    request = Request(APIRequestFactory().get('/api/', params or {}))
+    request.user = User(pk=1)
+    return request
+
+
+def filtered(params):
+    request = api_request(params)
+    return RecipeFilter(
+        request.query_params, queryset=select_recipes(request),
+        request=request
+    ).qs
+
+
+def hot_queries():
+    """Запросы из api/views.py и api/filters.py: (имя, queryset, допуски).
+
+    Допуски: 'sort' — сортировка уже отобранных по индексу строк,
+    'scan' — проход по первичному ключу с LIMIT или по маленькому
+    справочнику.
+    """
+    return [
+        ('recipes: page', select_recipes(api_request())[:6], ()),
+        ('recipes: tags filter',
+         filtered({'tags': ['breakfast', 'lunch']})[:6], ('sort',)),
+        ('recipes: author filter', filtered({'author': '1'})[:6], ()),
+        ('recipes: favorited filter',
+         filtered({'is_favorited': 'true'})[:6], ('sort',)),
+        ('recipes: cart filter',
+         filtered({'is_in_shopping_cart': 'true'})[:6], ('sort',)),
+        ('recipe: by pk', select_recipes(api_request()).filter(pk=1), ()),
+        ('recipe: by slug',
+         select_recipes(api_request()).filter(slug='slug'), ()),
+        ('prefetch: tags', Tag.objects.filter(recipes__in=[1, 2, 3]), ()),
+        ('prefetch: ingredients', IngredientInRecipe.objects.filter(
+            recipe__in=[1, 2, 3]).select_related('ingredient'), ()),
+        ('flag: is_favorited',
+         Favorite.objects.filter(recipe=1, user=1)[:1], ()),
+        ('flag: is_in_shopping_cart',
+         ShopList.objects.filter(recipe=1, user=1)[:1], ()),
+        ('flag: is_subscribed',
+         Subscription.objects.filter(author=1, user=1)[:1], ()),
+        ('users: page', User.objects.all()[:6], ('scan',)),
+        ('users: subscriptions', select_subscriptions(
+            api_request(), User.objects.filter(following__user=1)
+        )[:6], ('sort',)),
+        ('users: subscription recipes',
+         Recipe.objects.filter(author__in=[1, 2, 3]), ('sort',)),
+        ('cart: download', IngredientInRecipe.objects.filter(
+            recipe__shopping_cart__user=1).values(
+            name=F('ingredient__name'),
+            measurement_unit=F('ingredient__measurement_unit')).annotate(
+            total_amount=Sum('amount')), ('sort',)),
+        ('ingredients: search',
+         Ingredient.objects.filter(name__istartswith='му'), ('scan',)),
+        ('sync: recipes', Recipe.objects.filter(
+            after(SINCE, 'modified')).order_by('modified', 'id')[:500], ()),
+        ('sync: favorites', Favorite.objects.filter(user=1).filter(
+            after(SINCE, 'modified')).order_by('modified', 'id')[:500], ()),
+    ]
+
+
+def sqlite_problems(rows):
+    problems = []
+    for row in rows:
+        detail = row[-1]
+        if (detail.startswith('SCAN ') and 'USING' not in detail
+                and 'CONSTANT ROW' not in detail):
+            problems.append(('scan', detail))
+        elif 'USE TEMP B-TREE' in detail:
+            problems.append(('sort', detail))
+    return problems
+
+
+def postgresql_problems(node):
+    problems = []
+    if node['Node Type'] == 'Seq Scan':
+        problems.append(('scan', f"Seq Scan on {node['Relation Name']}"))
+    elif node['Node Type'] in ('Sort', 'Incremental Sort'):
+        problems.append(('sort', f"{node['Node Type']} by "
+                                 f"{', '.join(node.get('Sort Key', []))}"))
+    for child in node.get('Plans', []):
+        problems += postgresql_problems(child)
+    return problems
+
+
+def explain(queryset):
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            # На пустой базе планировщик всегда выбрал бы seq scan:
+            # запрещаем его, и оставшиеся Seq Scan/Sort значат «нет индекса».
+            cursor.execute('SET LOCAL enable_seqscan = off')
+            cursor.execute('SET LOCAL enable_sort = off')
+            cursor.execute('EXPLAIN (FORMAT JSON) ' + sql, params)
+            plan = cursor.fetchone()[0]
+            plan = json.loads(plan) if isinstance(plan, str) else plan
+            return json.dumps(plan, indent=2), postgresql_problems(
+                plan[0]['Plan'])
+        cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+        rows = cursor.fetchall()
+        return '\n'.join(row[-1] for row in rows), sqlite_problems(rows)
+
+
+class Command(BaseCommand):
+    help = ('capturing EXPLAIN for the hot API queries and failing on '
+            'sequential scans or temporary sorts')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--verbose-plans', action='store_true',
+                            help='печатать планы целиком')
+
+    def handle(self, *args, **options):
+        if connection.vendor not in ('sqlite', 'postgresql'):
+            raise CommandError(f'{connection.vendor} не поддерживается')
+        failures = []
+        for name, queryset, allowed in hot_queries():
+            with transaction.atomic():
+                plan, problems = explain(queryset)
+            problems = [detail for kind, detail in problems
+                        if kind not in allowed]
+            status = 'FAIL' if problems else 'ok'
+            self.stdout.write(f'{status:<5} {name}')
+            if options['verbose_plans'] or problems:
+                self.stdout.write('      ' + plan.replace('\n', '\n      '))
+            if problems:
+                failures.append(f'{name}: {"; ".join(problems)}')
+        if failures:
+            raise CommandError(
+                'Планы запросов без индексов:\n' + '\n'.join(failures)
+            )
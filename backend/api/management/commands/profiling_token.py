@@ -0,0 +1,14 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from api.profiling import make_token
+
+
+class Command(BaseCommand):
+    help = 'printing a signed X-Profile header value for profiling requests'
+
+    def handle(self, *args, **options):
+        self.stdout.write(f'X-Profile: {make_token()}')
+        self.stderr.write(
+            f'valid for {settings.PROFILING_TOKEN_MAX_AGE} seconds'
+        )
@@ -0,0 +1,43 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from api.storage import prune_orphans, recount, sweep_untracked
+
+
+class Command(BaseCommand):
+    help = ('removing media files that nothing has referenced for '
+            'MEDIA_ORPHAN_GRACE_SECONDS')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--grace', type=int,
+                            default=settings.MEDIA_ORPHAN_GRACE_SECONDS,
+                            help='сколько секунд файл лежит без ссылок')
+        parser.add_argument('--batch-size', type=int,
+                            default=settings.MEDIA_PRUNE_BATCH_SIZE)
+        parser.add_argument('--full', action='store_true',
+                            help='пересчитать ссылки и проверить файлы, '
+                                 'которых нет в учёте')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='только показать, что будет удалено')
+
+    def handle(self, *args, **options):
+        horizon = timezone.now() - timedelta(seconds=options['grace'])
+        batch_size = options['batch_size']
+        dry_run = options['dry_run']
+        if options['full'] and not dry_run:
+            fixed = recount(batch_size)
+            self.stdout.write(f'Исправлено счётчиков: {fixed}')
+        deleted, freed = prune_orphans(horizon, batch_size, dry_run)
+        if options['full']:
+            untracked, untracked_size = sweep_untracked(
+                horizon, batch_size, dry_run
+            )
+            deleted += untracked
+            freed += untracked_size
+        verb = 'Будет удалено' if dry_run else 'Удалено'
+        self.stdout.write(
+            f'{verb} файлов: {deleted}, {freed / 2 ** 20:.1f} МБ'
+        )
@@ -0,0 +1,79 @@
+import multiprocessing
+import signal
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.utils.module_loading import autodiscover_modules
+
+from api.taskqueue import prune, work
+
+PRUNE_INTERVAL = 3600
+
+
+def process_main(burst):
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *args: stop.set())
+    signal.signal(signal.SIGINT, lambda *args: stop.set())
+    work(stop, burst)
+
+
+class Command(BaseCommand):
+    help = 'running queued background tasks'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int,
+                            default=settings.TASK_CONCURRENCY)
+        parser.add_argument('--pool', choices=('thread', 'process'),
+                            default='thread')
+        parser.add_argument('--burst', action='store_true',
+                            help='выйти, когда очередь опустеет')
+
+    def handle(self, *args, **options):
+        autodiscover_modules('tasks')
+        if options['pool'] == 'process':
+            self.run_processes(options['concurrency'], options['burst'])
+        else:
+            self.run_threads(options['concurrency'], options['burst'])
+
+    def run_threads(self, concurrency, burst):
+        stop = threading.Event()
+        signal.signal(signal.SIGTERM, lambda *args: stop.set())
+        signal.signal(signal.SIGINT, lambda *args: stop.set())
+        threads = [
+            threading.Thread(target=work, args=(stop, burst), daemon=True)
+            for _ in range(concurrency)
+        ]
+        for thread in threads:
+            thread.start()
+        self.wait(threads)
+
+    def run_processes(self, concurrency, burst):
+        # Дочерним процессам нельзя наследовать открытые соединения.
+        connections.close_all()
+        context = multiprocessing.get_context('fork')
+        processes = [
+            context.Process(target=process_main, args=(burst,))
+            for _ in range(concurrency)
+        ]
+        for process in processes:
+            process.start()
+        signal.signal(signal.SIGTERM, lambda *args: [
+            process.terminate() for process in processes
+        ])
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        self.wait(processes)
+
+    def wait(self, workers):
+        """Ждёт исполнителей, раз в PRUNE_INTERVAL чистит очередь."""
+        pruned = None
+        while any(worker.is_alive() for worker in workers):
+            if pruned is None or time.monotonic() - pruned > PRUNE_INTERVAL:
+                pruned = time.monotonic()
+                deleted = prune()
+                if deleted:
+                    self.stdout.write(f'Удалено выполненных задач: {deleted}')
+            for worker in workers:
+                worker.join(settings.TASK_POLL_SECONDS)
@@ -0,0 +1,118 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db.models import Count
+from django.test import Client, override_settings
+
+from api.catalog import build_catalog
+from api.response_cache import response_cache
+from recipes.models import Recipe, Tag
+from recipes.shopping import cache_is_shared
+
+
+class Command(BaseCommand):
+    help = ('warming the ingredient catalog and the anonymous response '
+            'cache for recipe pages, tags and the most favorited recipes')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pages', type=int,
+                            default=settings.WARM_CACHE_PAGES,
+                            help='страниц рецептов на набор тэгов')
+        parser.add_argument('--limit', type=int, default=6,
+                            help='рецептов на странице, как во фронтенде')
+        parser.add_argument('--top', type=int,
+                            default=settings.WARM_CACHE_TOP_RECIPES,
+                            help='самых популярных рецептов')
+        parser.add_argument('--tags', action='append', default=[],
+                            help='дополнительный набор тэгов: slug,slug')
+        parser.add_argument('--host', action='append',
+                            help='Host, под которым сайт видят посетители')
+        parser.add_argument('--accept', action='append',
+                            help='заголовок Accept посетителей')
+        parser.add_argument('--threads', type=int,
+                            default=settings.WARM_CACHE_THREADS)
+
+    @override_settings(METRICS_ENABLED=False)
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        self.step('ingredient catalog', build_catalog)
+        cache = response_cache()
+        if not cache_is_shared(cache):
+            # Кэш в памяти этого процесса воркерам сервера не достанется.
+            self.stdout.write(
+                'response cache is process-local, skipping pages '
+                '(set REDIS_URL to share it)'
+            )
+            return
+        hosts = options['host'] or settings.WARM_CACHE_HOSTS
+        accepts = options['accept'] or ['*/*']
+        with ThreadPoolExecutor(options['threads']) as pool:
+            for name, paths in (
+                ('tags', ['/api/tags/']),
+                ('recipe pages', self.recipe_pages(options)),
+                ('top recipes', self.top_recipes(options['top'])),
+            ):
+                urls = [(path, host, accept) for path in paths
+                        for host in hosts for accept in accepts]
+                self.step(name, lambda: self.fetch_all(pool, urls))
+        self.stdout.write(f'done in {time.perf_counter() - started:.2f}s')
+
+    def step(self, name, func):
+        started = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - started
+        if isinstance(result, dict):
+            summary = ', '.join(f'{state} {count}'
+                                for state, count in sorted(result.items()))
+        else:
+            summary = f'{len(result)} bytes'
+        self.stdout.write(f'{name}: {summary} in {elapsed:.2f}s')
+
+    @staticmethod
+    def tag_sets(extra):
+        slugs = list(Tag.objects.order_by('id').values_list('slug', flat=True))
+        sets = [[]] + [[slug] for slug in slugs]
+        if len(slugs) > 1:
+            sets.append(slugs)
+        sets += [value.split(',') for value in extra]
+        # Порядок тэгов в запросе не важен: ключ кэша их сортирует.
+        unique = {frozenset(tags): tags for tags in reversed(sets)}
+        return [tags for tags in sets if unique[frozenset(tags)] is tags]
+
+    def recipe_pages(self, options):
+        return [
+            '/api/recipes/?' + urlencode(
+                [('page', page), ('limit', options['limit'])]
+                + [('tags', slug) for slug in tags]
+            )
+            for tags in self.tag_sets(options['tags'])
+            for page in range(1, options['pages'] + 1)
+        ]
+
+    @staticmethod
+    def top_recipes(count):
+        ids = Recipe.objects.annotate(
+            favorites=Count('Favorite')
+        ).order_by('-favorites', '-id').values_list('id', flat=True)[:count]
+        return [f'/api/recipes/{pk}/' for pk in ids]
+
+    @staticmethod
+    def fetch(url):
+        path, host, accept = url
+        client = Client(raise_request_exception=False)
+        response = client.get(path, HTTP_HOST=host, HTTP_ACCEPT=accept)
+        if response.status_code != 200:
+            return f'error {response.status_code}'
+        # MISS — ответ посчитан и сохранён, HIT — он уже был в кэше.
+        return {'MISS': 'warmed', 'HIT': 'cached', 'STALE': 'stale'}.get(
+            response.get('X-Cache'), 'not cacheable'
+        )
+
+    def fetch_all(self, pool, urls):
+        states = {}
+        for state in pool.map(self.fetch, urls):
+            states[state] = states.get(state, 0) + 1
+        return states
@@ -0,0 +1,300 @@
+"""Метрики запросов в формате Prometheus.
+
+Каждый процесс копит счётчики у себя в памяти: запросы по view и
+методу, гистограммы времени ответа и числа SQL-запросов, ошибки и
+попадания в кэши. Раз в METRICS_FLUSH_SECONDS процесс записывает свой
+снимок в METRICS_DIR/<pid>.json, а /api/metrics/ складывает снимки всех
+воркеров gunicorn. Файлы завершившихся воркеров остаются, чтобы счётчики
+не уменьшались; каталог нужно очищать при перезапуске сервиса.
+"""
+import atexit
+import contextvars
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter
+from pathlib import Path
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.urls import Resolver404, resolve
+
+PREFIX = 'foodgram'
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+_queries = contextvars.ContextVar('metrics_queries', default=None)
+
+
+class Histogram:
+    """Счётчики по корзинам (не накопительные), сумма и число значений."""
+
+    def __init__(self, buckets, counts=None, total=0.0):
+        self.buckets = buckets
+        self.counts = counts or [0] * (len(buckets) + 1)
+        self.total = total
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.total += value
+
+    def merge(self, counts, total):
+        if len(counts) == len(self.counts):
+            self.counts = [x + y for x, y in zip(self.counts, counts)]
+            self.total += total
+
+
+class Metrics:
+    """Счётчики одного процесса."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.pid = os.getpid()
+        self.flushed = time.monotonic()
+        self.requests = Counter()
+        self.errors = Counter()
+        self.cache = Counter()
+        self.durations = {}
+        self.queries = {}
+
+    def check_fork(self):
+        # После fork воркер не должен писать счётчики родителя под своим pid.
+        if self.pid != os.getpid():
+            self.reset()
+
+    def observe_request(self, view, method, status, duration, queries):
+        key = (view, method)
+        with self.lock:
+            self.check_fork()
+            self.requests[view, method, str(status)] += 1
+            if status >= 500:
+                self.errors[key] += 1
+            if key not in self.durations:
+                self.durations[key] = Histogram(DURATION_BUCKETS)
+                self.queries[key] = Histogram(QUERY_BUCKETS)
+            self.durations[key].observe(duration)
+            self.queries[key].observe(queries)
+            now = time.monotonic()
+            due = now - self.flushed >= settings.METRICS_FLUSH_SECONDS
+            if due:
+                self.flushed = now
+        if due:
+            self.flush()
+
+    def observe_cache(self, name, result):
+        with self.lock:
+            self.check_fork()
+            self.cache[name, result] += 1
+
+    def snapshot(self):
+        with self.lock:
+            self.check_fork()
+            return {
+                'requests': [[*key, value]
+                             for key, value in self.requests.items()],
+                'errors': [[*key, value]
+                           for key, value in self.errors.items()],
+                'cache': [[*key, value] for key, value in self.cache.items()],
+                'durations': [[*key, histogram.counts, histogram.total]
+                              for key, histogram in self.durations.items()],
+                'queries': [[*key, histogram.counts, histogram.total]
+                            for key, histogram in self.queries.items()],
+            }
+
+    def flush(self):
+        """Записывает снимок процесса в METRICS_DIR."""
+        self.flushed = time.monotonic()
+        directory = Path(settings.METRICS_DIR)
+        directory.mkdir(parents=True, exist_ok=True)
+        path = directory / f'{os.getpid()}.json'
+        temporary = path.with_name(
+            f'.{path.name}.{threading.get_ident()}.tmp'
+        )
+        temporary.write_text(json.dumps(self.snapshot()))
+        os.replace(temporary, path)
+
+
+metrics = Metrics()
+
+
+@atexit.register
+def flush_on_exit():
+    if settings.configured and settings.METRICS_ENABLED and metrics.requests:
+        metrics.flush()
+
+
+def observe_cache(name, hit):
+    """Отмечает обращение к кэшу name: попадание или промах."""
+    if settings.METRICS_ENABLED:
+        metrics.observe_cache(name, 'hit' if hit else 'miss')
+
+
+def count_query(execute, sql, params, many, context):
+    """Обёртка execute: считает SQL-запросы текущего HTTP-запроса."""
+    counter = _queries.get()
+    if counter is not None:
+        counter[0] += 1
+    return execute(sql, params, many, context)
+
+
+def install_query_counter(connection):
+    if count_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(count_query)
+
+
+def view_name(request):
+    match = request.resolver_match
+    if match is None:
+        # Ответы из кэша отдаются до разбора URL.
+        try:
+            match = resolve(request.path_info)
+        except Resolver404:
+            return 'unmatched'
+    return match.view_name
+
+
+class MetricsMiddleware:
+    """Меряет каждый запрос; стоит первым, чтобы учесть и ответы из кэша."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def observe(self, request, response, started, counter):
+        duration = time.perf_counter() - started
+        name = view_name(request)
+        metrics.observe_request(
+            name, request.method, response.status_code, duration, counter[0]
+        )
+        state = response.get('X-Cache')
+        if state:
+            metrics.observe_cache('response', state.lower())
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if not settings.METRICS_ENABLED:
+            return self.get_response(request)
+        counter = [0]
+        token = _queries.set(counter)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _queries.reset(token)
+        self.observe(request, response, started, counter)
+        return response
+
+    async def __acall__(self, request):
+        if not settings.METRICS_ENABLED:
+            return await self.get_response(request)
+        counter = [0]
+        token = _queries.set(counter)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _queries.reset(token)
+        self.observe(request, response, started, counter)
+        return response
+
+
+def collect():
+    """Складывает снимки всех процессов из METRICS_DIR."""
+    requests, errors, cache = Counter(), Counter(), Counter()
+    durations, queries = {}, {}
+    for path in Path(settings.METRICS_DIR).glob('*.json'):
+        try:
+            snapshot = json.loads(path.read_text())
+        except (OSError, ValueError):
+            continue
+        for target, rows in ((requests, snapshot['requests']),
+                             (errors, snapshot['errors']),
+                             (cache, snapshot['cache'])):
+            for *key, value in rows:
+                target[tuple(key)] += value
+        for target, buckets, rows in (
+            (durations, DURATION_BUCKETS, snapshot['durations']),
+            (queries, QUERY_BUCKETS, snapshot['queries']),
+        ):
+            for view, method, counts, total in rows:
+                target.setdefault(
+                    (view, method), Histogram(buckets)
+                ).merge(counts, total)
+    return requests, errors, cache, durations, queries
+
+
+def escape(value):
+    return (str(value).replace('\\', r'\\').replace('"', r'\"')
+            .replace('\n', r'\n'))
+
+
+def labels(**values):
+    return '{' + ','.join(
+        f'{name}="{escape(value)}"' for name, value in values.items()
+    ) + '}'
+
+
+def histogram_lines(name, histograms):
+    for (view, method), histogram in sorted(histograms.items()):
+        cumulative = 0
+        bounds = [*map(str, histogram.buckets), '+Inf']
+        for bound, count in zip(bounds, histogram.counts):
+            cumulative += count
+            yield (f'{name}_bucket'
+                   f'{labels(view=view, method=method, le=bound)} '
+                   f'{cumulative}')
+        yield f'{name}_sum{labels(view=view, method=method)} {histogram.total}'
+        yield f'{name}_count{labels(view=view, method=method)} {cumulative}'
+
+
+def render_metrics():
+    """Метрики всех процессов в текстовом формате Prometheus."""
+    if settings.METRICS_ENABLED:
+        metrics.flush()
+    requests, errors, cache, durations, queries = collect()
+    lines = [
+        f'# HELP {PREFIX}_http_requests_total Запросы по view, методу и '
+        f'статусу.',
+        f'# TYPE {PREFIX}_http_requests_total counter',
+    ]
+    lines += [
+        f'{PREFIX}_http_requests_total'
+        f'{labels(view=view, method=method, status=status)} {value}'
+        for (view, method, status), value in sorted(requests.items())
+    ]
+    lines += [
+        f'# HELP {PREFIX}_http_errors_total Ответы с кодом 5xx.',
+        f'# TYPE {PREFIX}_http_errors_total counter',
+    ]
+    lines += [
+        f'{PREFIX}_http_errors_total{labels(view=view, method=method)} '
+        f'{value}'
+        for (view, method), value in sorted(errors.items())
+    ]
+    lines += [
+        f'# HELP {PREFIX}_http_request_duration_seconds Время ответа.',
+        f'# TYPE {PREFIX}_http_request_duration_seconds histogram',
+        *histogram_lines(f'{PREFIX}_http_request_duration_seconds',
+                         durations),
+        f'# HELP {PREFIX}_http_request_queries SQL-запросов на запрос.',
+        f'# TYPE {PREFIX}_http_request_queries histogram',
+        *histogram_lines(f'{PREFIX}_http_request_queries', queries),
+        f'# HELP {PREFIX}_cache_requests_total Обращения к кэшам.',
+        f'# TYPE {PREFIX}_cache_requests_total counter',
+    ]
+    lines += [
+        f'{PREFIX}_cache_requests_total{labels(cache=name, result=result)} '
+        f'{value}'
+        for (name, result), value in sorted(cache.items())
+    ]
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,30 @@
+# Generated by Django 4.2.13 on 2026-10-19 08:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0002_task'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StoredFile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True, verbose_name='Путь')),
+                ('size', models.PositiveBigIntegerField(default=0, verbose_name='Размер, байт')),
+                ('references', models.IntegerField(default=0, verbose_name='Ссылок')),
+                ('orphaned', models.DateTimeField(blank=True, null=True, verbose_name='Без ссылок с')),
+                ('created', models.DateTimeField(auto_now_add=True, verbose_name='Загружен')),
+            ],
+            options={
+                'verbose_name': 'Файл',
+                'verbose_name_plural': 'Файлы',
+                'ordering': ['-id'],
+                'indexes': [models.Index(condition=models.Q(('references__lte', 0)), fields=['orphaned'], name='stored_file_orphaned_idx')],
+            },
+        ),
+    ]
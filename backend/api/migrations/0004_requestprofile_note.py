@@ -0,0 +1,18 @@
+# Generated by Django 4.2.13 on 2026-10-19 09:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0003_storedfile'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='requestprofile',
+            name='note',
+            field=models.CharField(blank=True, max_length=200, verbose_name='Примечание'),
+        ),
+    ]
@@ -0,0 +1,184 @@
+from pathlib import Path
+
+from django.conf import settings
+from django.db import models
+
+
+class RequestProfile(models.Model):
+    """Профиль одного запроса; сам профиль и SQL лежат в PROFILING_DIR."""
+    created = models.DateTimeField(
+        'Дата',
+        auto_now_add=True,
+    )
+    method = models.CharField(
+        'Метод',
+        max_length=10,
+    )
+    path = models.CharField(
+        'Адрес',
+        max_length=500,
+    )
+    user = models.CharField(
+        'Пользователь',
+        max_length=150,
+        blank=True,
+    )
+    status = models.PositiveSmallIntegerField('Код ответа')
+    duration = models.FloatField('Время, мс')
+    query_count = models.PositiveIntegerField('SQL-запросов')
+    query_time = models.FloatField('Время SQL, мс')
+    note = models.CharField(
+        'Примечание',
+        max_length=200,
+        blank=True,
+    )
+
+    class Meta:
+        verbose_name = 'Профиль запроса'
+        verbose_name_plural = 'Профили запросов'
+        ordering = ['-id']
+
+    def __str__(self):
+        return f'{self.method} {self.path}'
+
+    def file_path(self, suffix):
+        return Path(settings.PROFILING_DIR) / f'{self.pk}{suffix}'
+
+    @property
+    def stats_path(self):
+        return self.file_path('.prof')
+
+    @property
+    def sql_path(self):
+        return self.file_path('.sql.json')
+
+
+class Task(models.Model):
+    """Отложенная задача из очереди api.taskqueue."""
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUSES = (
+        (QUEUED, 'В очереди'),
+        (RUNNING, 'Выполняется'),
+        (DONE, 'Выполнена'),
+        (FAILED, 'Ошибка'),
+    )
+
+    name = models.CharField(
+        'Задача',
+        max_length=200,
+    )
+    payload = models.JSONField(
+        'Аргументы',
+        default=dict,
+    )
+    priority = models.SmallIntegerField(
+        'Приоритет',
+        default=0,
+    )
+    dedup_key = models.CharField(
+        'Ключ дедупликации',
+        max_length=200,
+        null=True,
+        blank=True,
+    )
+    status = models.CharField(
+        'Состояние',
+        max_length=10,
+        choices=STATUSES,
+        default=QUEUED,
+    )
+    attempts = models.PositiveSmallIntegerField(
+        'Попыток',
+        default=0,
+    )
+    max_attempts = models.PositiveSmallIntegerField(
+        'Максимум попыток',
+        default=3,
+    )
+    run_after = models.DateTimeField('Не раньше')
+    locked_by = models.CharField(
+        'Исполнитель',
+        max_length=100,
+        blank=True,
+    )
+    locked_until = models.DateTimeField(
+        'Занята до',
+        null=True,
+        blank=True,
+    )
+    last_error = models.TextField(
+        'Последняя ошибка',
+        blank=True,
+    )
+    created = models.DateTimeField(
+        'Создана',
+        auto_now_add=True,
+    )
+    finished = models.DateTimeField(
+        'Завершена',
+        null=True,
+        blank=True,
+    )
+
+    class Meta:
+        verbose_name = 'Задача'
+        verbose_name_plural = 'Задачи'
+        ordering = ['-id']
+        constraints = [
+            # Одинаковая задача ставится в очередь один раз, пока ждёт.
+            models.UniqueConstraint(
+                fields=['dedup_key'],
+                condition=models.Q(status='queued'),
+                name='unique_queued_task',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['status', '-priority', 'run_after', 'id'],
+                         name='task_claim_idx'),
+            models.Index(fields=['status', 'finished'],
+                         name='task_finished_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.name} #{self.pk}'
+
+
+class StoredFile(models.Model):
+    """Файл медиа с именем по содержимому и числом ссылок на него."""
+    name = models.CharField(
+        'Путь',
+        max_length=255,
+        unique=True,
+    )
+    size = models.PositiveBigIntegerField(
+        'Размер, байт',
+        default=0,
+    )
+    references = models.IntegerField(
+        'Ссылок',
+        default=0,
+    )
+    orphaned = models.DateTimeField(
+        'Без ссылок с',
+        null=True,
+        blank=True,
+    )
+    created = models.DateTimeField(
+        'Загружен',
+        auto_now_add=True,
+    )
+
+    class Meta:
+        verbose_name = 'Файл'
+        verbose_name_plural = 'Файлы'
+        ordering = ['-id']
+        indexes = [
+            models.Index(fields=['orphaned'], name='stored_file_orphaned_idx',
+                         condition=models.Q(references__lte=0)),
+        ]
+
+    def __str__(self):
+        return self.name
@@ -1,8 +1,130 @@
+import hashlib
+import json
+
+from django.conf import settings
 from django.core import paginator
+from django.core.cache import cache
+from django.db import connections
+from django.db.models import QuerySet
+from django.utils.functional import cached_property
+from django.utils.translation import gettext_lazy as _
 from rest_framework.pagination import PageNumberPagination
 
+from .metrics import observe_cache
+
+COUNT_VERSION_KEY = 'pagination-count-version'
+
+
+def bump_count_version():
+    """Сбрасывает закэшированные счётчики после изменения данных."""
+    try:
+        cache.incr(COUNT_VERSION_KEY)
+    except ValueError:
+        cache.set(COUNT_VERSION_KEY, 1, None)
+
+
+class CachedCountPaginator(paginator.Paginator):
+    """Paginator, не считающий COUNT(*) на каждый запрос страницы.
+
+    Точный счётчик кэшируется по SQL запроса и версии данных. На
+    PostgreSQL сначала берётся оценка планировщика: если она больше
+    COUNT_ESTIMATE_THRESHOLD, отдаётся она, а count_is_approximate
+    становится True.
+    """
+    count_is_approximate = False
+
+    def validate_number(self, number):
+        if not self.count_is_approximate:
+            return super().validate_number(number)
+        # Оценка может быть меньше настоящего числа строк: верхнюю
+        # границу проверяет page() по самой выборке.
+        try:
+            number = int(number)
+        except (TypeError, ValueError):
+            raise paginator.PageNotAnInteger(
+                _('That page number is not an integer')
+            )
+        if number < 1:
+            raise paginator.EmptyPage(_('That page number is less than 1'))
+        return number
+
+    def page(self, number):
+        """Страница; при оценке счётчика has_next решает лишняя строка.
+
+        Вместо сравнения с оценкой берётся page_size + 1 строк, а
+        EmptyPage возникает, только если выборка страницы пуста.
+        """
+        if not self.count or not self.count_is_approximate:
+            return super().page(number)
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        rows = list(self.object_list[bottom:bottom + self.per_page + 1])
+        if not rows and number > 1:
+            raise paginator.EmptyPage(_('That page contains no results'))
+        return ApproximatePage(rows[:self.per_page], number, self,
+                               len(rows) > self.per_page)
+
+    def cache_key(self, sql, params):
+        version = cache.get(COUNT_VERSION_KEY, 0)
+        digest = hashlib.sha1(
+            repr((sql, params)).encode()
+        ).hexdigest()
+        return f'pagination-count:{version}:{digest}'
+
+    def estimate(self, sql, params):
+        connection = connections[self.object_list.db]
+        if connection.vendor != 'postgresql':
+            return None
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN (FORMAT JSON) ' + sql, params)
+            plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]['Plan']['Plan Rows'])
+
+    @cached_property
+    def count(self):
+        if not isinstance(self.object_list, QuerySet):
+            return super().count
+        sql, params = self.object_list.query.sql_with_params()
+        key = self.cache_key(sql, params)
+        cached = cache.get(key)
+        observe_cache('pagination_count', cached is not None)
+        if cached is not None:
+            self.count_is_approximate, total = cached
+            return total
+        estimate = self.estimate(sql, params)
+        if (estimate is not None
+                and estimate > settings.COUNT_ESTIMATE_THRESHOLD):
+            self.count_is_approximate, total = True, estimate
+        else:
+            total = self.object_list.count()
+        cache.set(key, (self.count_is_approximate, total),
+                  settings.COUNT_CACHE_TTL)
+        return total
+
+
+class ApproximatePage(paginator.Page):
+    """Страница, у которой следующая известна по выборке, а не по count."""
+
+    def __init__(self, object_list, number, paginator, more):
+        super().__init__(object_list, number, paginator)
+        self.more = more
+
+    def has_next(self):
+        return self.more
+
+    def end_index(self):
+        return (self.number - 1) * self.paginator.per_page + len(self)
+
 
 class CustomPagination(PageNumberPagination):
-    django_paginator_class = paginator.Paginator
+    django_paginator_class = CachedCountPaginator
     page_size_query_param = 'limit'
     page_size = 6
+
+    def get_paginated_response(self, data):
+        response = super().get_paginated_response(data)
+        if self.page.paginator.count_is_approximate:
+            response.data['count_is_approximate'] = True
+        return response
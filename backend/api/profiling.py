@@ -0,0 +1,200 @@
+"""Профилирование отдельных запросов по требованию.
+
+Запрос профилируется, если в нём есть заголовок X-Profile и либо он
+пришёл от сотрудника (X-Profile: 1 с сессией или токеном), либо значение
+заголовка — подписанный токен из manage.py profiling_token. Такой запрос
+выполняется под cProfile, его SQL-запросы записываются, а профиль
+сохраняется в PROFILING_DIR и виден в админке. Номер профиля приходит в
+заголовке ответа X-Profile-Id. Остальные запросы проверяют только
+наличие заголовка.
+"""
+import contextvars
+import cProfile
+import json
+import threading
+import time
+
+from asgiref.sync import (iscoroutinefunction, markcoroutinefunction,
+                          sync_to_async)
+from django.conf import settings
+from django.core import signing
+from rest_framework.exceptions import AuthenticationFailed
+
+from .authentication import CachedTokenAuthentication
+from .models import RequestProfile
+
+HEADER = 'HTTP_X_PROFILE'
+SALT = 'api.profiling'
+
+_sql = contextvars.ContextVar('profiling_sql', default=None)
+# cProfile в асинхронном режиме видит весь поток цикла событий, поэтому
+# одновременно профилируется только один запрос.
+_async_profile = threading.Lock()
+
+ASYNC_NOTE = ('Асинхронный режим: профиль охватывает весь цикл событий, '
+              'включая чужие запросы; код внутри sync_to_async не виден.')
+
+
+def make_token():
+    """Значение заголовка X-Profile, действующее PROFILING_TOKEN_MAX_AGE."""
+    return signing.TimestampSigner(salt=SALT).sign('profile')
+
+
+class QueryLog:
+    """SQL профилируемого запроса; хранит первые PROFILING_MAX_QUERIES."""
+
+    def __init__(self):
+        self.entries = []
+        self.count = 0
+        self.time = 0.0
+
+    def add(self, entry):
+        self.count += 1
+        self.time += entry['ms']
+        if len(self.entries) < settings.PROFILING_MAX_QUERIES:
+            self.entries.append(entry)
+
+
+def log_query(execute, sql, params, many, context):
+    """Обёртка execute: пишет SQL профилируемого запроса."""
+    log = _sql.get()
+    if log is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        log.add({
+            'sql': sql,
+            'params': repr(params)[:1000],
+            'many': many,
+            'alias': context['connection'].alias,
+            'ms': (time.perf_counter() - started) * 1000,
+        })
+
+
+def install_query_log(connection):
+    if log_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(log_query)
+
+
+def request_user(request):
+    """Пользователь из сессии или из заголовка Authorization."""
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        return user
+    keyword, _, key = request.META.get('HTTP_AUTHORIZATION', '').partition(
+        ' '
+    )
+    if keyword != CachedTokenAuthentication.keyword or not key:
+        return None
+    try:
+        return CachedTokenAuthentication().authenticate_credentials(
+            key.strip()
+        )[0]
+    except AuthenticationFailed:
+        return None
+
+
+def profiling_allowed(request):
+    value = request.META[HEADER]
+    try:
+        signing.TimestampSigner(salt=SALT).unsign(
+            value, max_age=settings.PROFILING_TOKEN_MAX_AGE
+        )
+        return True
+    except signing.BadSignature:
+        pass
+    user = request_user(request)
+    return value == '1' and user is not None and user.is_staff
+
+
+def save_profile(request, response, profiler, queries, duration, note=''):
+    user = request_user(request)
+    profile = RequestProfile.objects.create(
+        method=request.method,
+        path=request.get_full_path()[:500],
+        user=user.get_username() if user is not None else '',
+        status=response.status_code,
+        duration=duration * 1000,
+        query_count=queries.count,
+        query_time=queries.time,
+        note=note,
+    )
+    profile.stats_path.parent.mkdir(parents=True, exist_ok=True)
+    profiler.dump_stats(profile.stats_path)
+    profile.sql_path.write_text(
+        json.dumps(queries.entries, ensure_ascii=False)
+    )
+    for old in RequestProfile.objects.order_by('-id')[
+        settings.PROFILING_KEEP:
+    ]:
+        old.delete()
+    return profile
+
+
+class ProfilingMiddleware:
+    """Профилирует запросы с разрешённым заголовком X-Profile.
+
+    В асинхронном режиме cProfile видит только поток цикла событий, зато
+    весь: корутины других запросов тоже попадают в профиль, а код внутри
+    sync_to_async — нет (SQL — попадает). Пока профилируется один запрос,
+    остальные выполняются без профиля и получают X-Profile-Busy.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if HEADER not in request.META or not profiling_allowed(request):
+            return self.get_response(request)
+        queries = QueryLog()
+        token = _sql.set(queries)
+        profiler = cProfile.Profile()
+        started = time.perf_counter()
+        profiler.enable()
+        try:
+            response = self.get_response(request)
+        finally:
+            profiler.disable()
+            _sql.reset(token)
+        duration = time.perf_counter() - started
+        profile = save_profile(request, response, profiler, queries, duration)
+        response['X-Profile-Id'] = profile.pk
+        return response
+
+    async def __acall__(self, request):
+        if HEADER not in request.META or not await sync_to_async(
+            profiling_allowed
+        )(request):
+            return await self.get_response(request)
+        if not _async_profile.acquire(blocking=False):
+            response = await self.get_response(request)
+            response['X-Profile-Busy'] = '1'
+            return response
+        try:
+            queries = QueryLog()
+            token = _sql.set(queries)
+            profiler = cProfile.Profile()
+            started = time.perf_counter()
+            profiler.enable()
+            try:
+                response = await self.get_response(request)
+            finally:
+                profiler.disable()
+                _sql.reset(token)
+        finally:
+            _async_profile.release()
+        duration = time.perf_counter() - started
+        profile = await sync_to_async(save_profile)(
+            request, response, profiler, queries, duration, ASYNC_NOTE
+        )
+        response['X-Profile-Id'] = profile.pk
+        return response
@@ -0,0 +1,175 @@
+import asyncio
+import hashlib
+import re
+import time
+from urllib.parse import urlencode
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.http import HttpResponse, HttpResponseNotModified
+
+from .conditional import etag_matches
+
+VERSION_KEY = 'response-cache-version'
+POLL_INTERVAL = 0.05
+
+
+def response_cache():
+    return caches[settings.RESPONSE_CACHE_ALIAS]
+
+
+def bump_response_version():
+    cache = response_cache()
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.set(VERSION_KEY, 1, None)
+
+
+def invalidate_responses():
+    """Сбрасывает кэш ответов, когда текущая транзакция зафиксирована."""
+    transaction.on_commit(bump_response_version)
+
+
+class AnonymousResponseCacheMiddleware:
+    """Кэш целых ответов на анонимные GET к RESPONSE_CACHE_PATHS.
+
+    Анонимный запрос — без заголовка Authorization. Ключ — хост, путь,
+    отсортированные параметры и Accept. Запись свежая
+    RESPONSE_CACHE_SECONDS, затем ещё RESPONSE_CACHE_STALE_SECONDS
+    отдаётся устаревшей, пока её пересчитывает один запрос, взявший
+    блокировку. Если записи нет, остальные запросы ждут этот пересчёт
+    не дольше RESPONSE_CACHE_LOCK_SECONDS.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.paths = [re.compile(path) for path in
+                      settings.RESPONSE_CACHE_PATHS]
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def cacheable(self, request):
+        return (settings.RESPONSE_CACHE_SECONDS > 0
+                and request.method == 'GET'
+                and 'HTTP_AUTHORIZATION' not in request.META
+                # Профилируемый запрос должен дойти до view.
+                and 'HTTP_X_PROFILE' not in request.META
+                and any(path.match(request.path_info)
+                        for path in self.paths))
+
+    @staticmethod
+    def cache_key(request, version):
+        query = sorted(
+            (name, sorted(values)) for name, values in request.GET.lists()
+        )
+        raw = '\n'.join((
+            request.get_host(), request.path_info,
+            urlencode(query, doseq=True), request.META.get('HTTP_ACCEPT', '')
+        ))
+        digest = hashlib.sha1(raw.encode()).hexdigest()
+        return f'response-cache:{version}:{digest}'
+
+    @staticmethod
+    def is_fresh(entry):
+        return time.time() - entry[0] < settings.RESPONSE_CACHE_SECONDS
+
+    @staticmethod
+    def to_entry(response):
+        if (response.status_code != 200 or response.streaming
+                or response.cookies):
+            return None
+        return time.time(), response.content, dict(response.headers)
+
+    @staticmethod
+    def from_entry(request, entry, state):
+        created, content, headers = entry
+        etag = headers.get('ETag')
+        if etag and etag_matches(request, etag):
+            response = HttpResponseNotModified()
+            response['ETag'] = etag
+        else:
+            response = HttpResponse(content, headers=headers)
+        response['X-Cache'] = state
+        return response
+
+    @staticmethod
+    def timeout():
+        return (settings.RESPONSE_CACHE_SECONDS
+                + settings.RESPONSE_CACHE_STALE_SECONDS)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if not self.cacheable(request):
+            return self.get_response(request)
+        cache = response_cache()
+        key = self.cache_key(request, cache.get(VERSION_KEY, 0))
+        entry = cache.get(key)
+        if entry is not None and self.is_fresh(entry):
+            return self.from_entry(request, entry, 'HIT')
+        lock = key + ':lock'
+        if not cache.add(lock, True, settings.RESPONSE_CACHE_LOCK_SECONDS):
+            if entry is not None:
+                return self.from_entry(request, entry, 'STALE')
+            entry = self.wait(cache, key, lock)
+            if entry is not None:
+                return self.from_entry(request, entry, 'HIT')
+        try:
+            response = self.get_response(request)
+            entry = self.to_entry(response)
+            if entry is not None:
+                cache.set(key, entry, self.timeout())
+        finally:
+            cache.delete(lock)
+        response['X-Cache'] = 'MISS'
+        return response
+
+    def wait(self, cache, key, lock):
+        deadline = time.monotonic() + settings.RESPONSE_CACHE_LOCK_SECONDS
+        while time.monotonic() < deadline:
+            time.sleep(POLL_INTERVAL)
+            entry = cache.get(key)
+            if entry is not None or cache.get(lock) is None:
+                return entry
+        return None
+
+    async def __acall__(self, request):
+        if not self.cacheable(request):
+            return await self.get_response(request)
+        cache = response_cache()
+        key = self.cache_key(request, await cache.aget(VERSION_KEY, 0))
+        entry = await cache.aget(key)
+        if entry is not None and self.is_fresh(entry):
+            return self.from_entry(request, entry, 'HIT')
+        lock = key + ':lock'
+        if not await cache.aadd(lock, True,
+                                settings.RESPONSE_CACHE_LOCK_SECONDS):
+            if entry is not None:
+                return self.from_entry(request, entry, 'STALE')
+            entry = await self.await_entry(cache, key, lock)
+            if entry is not None:
+                return self.from_entry(request, entry, 'HIT')
+        try:
+            response = await self.get_response(request)
+            entry = self.to_entry(response)
+            if entry is not None:
+                await cache.aset(key, entry, self.timeout())
+        finally:
+            await cache.adelete(lock)
+        response['X-Cache'] = 'MISS'
+        return response
+
+    async def await_entry(self, cache, key, lock):
+        deadline = time.monotonic() + settings.RESPONSE_CACHE_LOCK_SECONDS
+        while time.monotonic() < deadline:
+            await asyncio.sleep(POLL_INTERVAL)
+            entry = await cache.aget(key)
+            if entry is not None or await cache.aget(lock) is None:
+                return entry
+        return None
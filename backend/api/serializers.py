@@ -1,4 +1,6 @@
+from django.conf import settings
 from django.core.validators import MaxValueValidator, MinValueValidator
+from django.db import transaction
 from django.db.models import Model, Q
 from djoser.serializers import UserCreateSerializer, UserSerializer
 from rest_framework import serializers, status
@@ -7,11 +9,16 @@ from rest_framework.response import Response
 
 from users.models import Subscription, User
 from api.fields import Base64ImageField
+from api.fieldsets import DynamicFieldsMixin
+from api.tasks import recipe_saved
+from recipes.duplicates import find_duplicates, fingerprint_fields
 from recipes.models import (Favorite, Ingredient, IngredientInRecipe, Recipe,
-                            ShopList, Tag)
+                            ShopList, Tag, Tombstone)
+from recipes.shopping import cache_is_shared
+from recipes.signals import touch_once
 
 
-class UserGetSerializer(UserSerializer):
+class UserGetSerializer(DynamicFieldsMixin, UserSerializer):
     """Сериализатор для просмотра профиля пользователя."""
     is_subscribed = serializers.SerializerMethodField(read_only=True)
 
@@ -31,6 +38,12 @@ class UserGetSerializer(UserSerializer):
         request = self.context.get('request')
         if request.user.is_anonymous:
             return False
+        subscribed = self.context.get('subscribed')
+        if subscribed is not None:
+            return obj.id in subscribed
+        flag = getattr(obj, 'subscribed_flag', None)
+        if flag is not None:
+            return flag
 
         return Subscription.objects.filter(
             author=obj, user=request.user
@@ -41,6 +54,11 @@ class UserWithRecipesSerializer(UserGetSerializer):
     """Сериализатор для просмотра пользователя с рецептами."""
     recipes = serializers.SerializerMethodField(read_only=True)
     recipes_count = serializers.SerializerMethodField(read_only=True)
+    collapsed_fields = {
+        'recipes': lambda: serializers.SerializerMethodField(
+            method_name='get_recipe_ids'
+        ),
+    }
 
     class Meta:
         model = User
@@ -65,16 +83,28 @@ class UserWithRecipesSerializer(UserGetSerializer):
         return data
 
     def get_recipes_count(self, obj):
+        total = getattr(obj, 'recipes_total', None)
+        if total is not None:
+            return total
         return obj.recipes.count()
 
-    def get_recipes(self, object):
-        request = self.context.get('request')
-        context = {'request': request}
-        recipe_limit = request.query_params.get('recipe_limit')
-        queryset = object.recipes.all()[:3]
+    def limited_recipes(self, obj):
+        """Рецепты автора с учётом recipe_limit, не больше трёх."""
+        recipe_limit = self.context['request'].query_params.get('recipe_limit')
+        queryset = obj.recipes.all()[:3]
         if recipe_limit:
             queryset = queryset[:int(recipe_limit)]
-        return RecipeShortSerializer(queryset, context=context, many=True).data
+        return queryset
+
+    def get_recipes(self, object):
+        context = {'request': self.context.get('request')}
+        return RecipeShortSerializer(
+            self.limited_recipes(object), context=context, many=True
+        ).data
+
+    def get_recipe_ids(self, obj):
+        """Свёрнутые рецепты: те же, что в развёрнутом виде, только id."""
+        return [recipe.pk for recipe in self.limited_recipes(obj)]
 
 
 class UserPostSerializer(UserCreateSerializer):
@@ -140,8 +170,7 @@ class IngredientSerializer(serializers.ModelSerializer):
         model = Ingredient
         fields = ('id',
                   'name',
-                  'measurement_unit',
-                  'amount')
+                  'measurement_unit')
 
 
 class IngredientInRecipeSerializer(serializers.ModelSerializer):
@@ -182,7 +211,7 @@ class TagSerializer(serializers.ModelSerializer):
                   'slug')
 
 
-class RecipeGetSerializer(serializers.ModelSerializer):
+class RecipeGetSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     """Сериализатор для модели Recipe и GET запросов к /recipe/
     /recipe/id/.
     """
@@ -196,6 +225,16 @@ class RecipeGetSerializer(serializers.ModelSerializer):
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
     slug_url = serializers.SerializerMethodField()
+    collapsed_fields = {
+        'author': lambda: serializers.PrimaryKeyRelatedField(read_only=True),
+        'tags': lambda: serializers.PrimaryKeyRelatedField(
+            many=True, read_only=True
+        ),
+        'ingredients': lambda: serializers.SlugRelatedField(
+            source='IngredientInRecipe', slug_field='ingredient_id',
+            many=True, read_only=True
+        ),
+    }
 
     class Meta:
         model = Recipe
@@ -219,11 +258,23 @@ class RecipeGetSerializer(serializers.ModelSerializer):
         return self.get_request().user
 
     def get_is_favorited(self, obj):
+        favorited = self.context.get('favorited')
+        if favorited is not None:
+            return obj.id in favorited
+        flag = getattr(obj, 'favorited_flag', None)
+        if flag is not None:
+            return flag
         return self.is_obj_exists_if_not_anonymous(
             Favorite, Q(recipe=obj) & Q(user=self.get_user())
         )
 
     def get_is_in_shopping_cart(self, obj):
+        in_shopping_cart = self.context.get('in_shopping_cart')
+        if in_shopping_cart is not None:
+            return obj.id in in_shopping_cart
+        flag = getattr(obj, 'in_shopping_cart_flag', None)
+        if flag is not None:
+            return flag
         return self.is_obj_exists_if_not_anonymous(
             ShopList, Q(recipe=obj) & Q(user=self.get_user())
         )
@@ -289,6 +340,8 @@ class RecipePostSerializer(serializers.ModelSerializer):
                 'Время готовки должно быть не меньше одной минуты')
         return cooking_time
 
+    @transaction.atomic
+    @touch_once()
     def create(self, validated_data):
         author = self.context.get('request').user
         ingredients = validated_data.pop('IngredientInRecipe')
@@ -298,6 +351,8 @@ class RecipePostSerializer(serializers.ModelSerializer):
         self.save_ingredients(recipe, ingredients)
         return recipe
 
+    @transaction.atomic
+    @touch_once()
     def update(self, instance, validated_data):
         ingredients = validated_data.pop('IngredientInRecipe', [])
         tags = validated_data.pop('tags', [])
@@ -309,6 +364,8 @@ class RecipePostSerializer(serializers.ModelSerializer):
 
         instance.ingredients.clear()
         self.save_ingredients(instance, ingredients)
+        if cache_is_shared():
+            recipe_saved.defer(instance.pk)
 
         return instance
 
@@ -332,6 +389,38 @@ class RecipePostSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError('Теги не должны дублироваться.')
         return tags
 
+    def validate(self, attrs):
+        """Считает отпечаток рецепта и ищет почти такие же рецепты.
+
+        Найденные id остаются в self.duplicates; при политике reject
+        они возвращаются ошибкой.
+        """
+        attrs.update(fingerprint_fields(
+            attrs.get('name', getattr(self.instance, 'name', '')),
+            [item['ingredient']['id'].pk
+             for item in attrs.get('IngredientInRecipe', [])]
+        ))
+        self.duplicates = []
+        if settings.DUPLICATE_RECIPE_POLICY == 'off':
+            return attrs
+        recipes = Recipe.objects.all()
+        if self.instance is not None:
+            recipes = recipes.exclude(pk=self.instance.pk)
+        if settings.DUPLICATE_RECIPE_SCOPE == 'author':
+            recipes = recipes.filter(author=(
+                self.instance.author if self.instance is not None
+                else self.context['request'].user
+            ))
+        self.duplicates = find_duplicates(
+            attrs, recipes, settings.DUPLICATE_RECIPE_DISTANCE
+        )
+        if self.duplicates and settings.DUPLICATE_RECIPE_POLICY == 'reject':
+            raise ValidationError({
+                'non_field_errors': ['Такой рецепт уже опубликован.'],
+                'duplicates': self.duplicates,
+            })
+        return attrs
+
 
 class FavoriteSerializer(serializers.ModelSerializer):
     """Сериализатор для избранных рецептов."""
@@ -358,6 +447,15 @@ class FavoriteSerializer(serializers.ModelSerializer):
             user=self.context.get('request').user, **validated_data)
 
 
+class ShoppingMultiplierSerializer(serializers.ModelSerializer):
+    """Множитель порций рецепта в списке покупок."""
+    recipe = serializers.PrimaryKeyRelatedField(read_only=True)
+
+    class Meta:
+        model = ShopList
+        fields = ('recipe', 'multiplier')
+
+
 class ShoppingListSerializer(serializers.ModelSerializer):
     """Сериализатор для списка покупок."""
     user = serializers.PrimaryKeyRelatedField(
@@ -395,3 +493,19 @@ class RecipeShortSerializer(serializers.ModelSerializer):
             'image',
             'cooking_time'
         )
+
+
+class SyncItemSerializer(serializers.Serializer):
+    """Сериализатор для изменений избранного и списка покупок."""
+    recipe = serializers.IntegerField(source='recipe_id')
+    modified = serializers.DateTimeField()
+
+
+class TombstoneSerializer(serializers.ModelSerializer):
+    """Сериализатор для отметок об удалении."""
+    type = serializers.CharField(source='kind')
+    id = serializers.IntegerField(source='object_id')
+
+    class Meta:
+        model = Tombstone
+        fields = ('type', 'id', 'deleted')
@@ -0,0 +1,150 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_save)
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from recipes.models import (Favorite, Ingredient, IngredientInRecipe, Recipe,
+                            ShopList, Tag)
+from users.models import Subscription, User
+from .authentication import invalidate_token
+from .catalog import invalidate_catalog
+from .events import follow_event, publish, recipe_event
+from .metrics import install_query_counter
+from .models import RequestProfile
+from .profiling import install_query_log
+from .pagination import bump_count_version
+from .response_cache import invalidate_responses
+from .storage import files_after_save, files_before_save, files_deleted
+
+
+@receiver(post_delete, sender=Token)
+def token_deleted(sender, instance, **kwargs):
+    """Выход из системы удаляет токен — убираем его и из кэша."""
+    invalidate_token(instance.key)
+
+
+@receiver(post_save, sender=User)
+def user_changed(sender, instance, created, update_fields=None, **kwargs):
+    """Смена пароля или деактивация сбрасывает кэш токенов пользователя.
+
+    Вход (last_login) токены не меняет, запрос к ним не нужен.
+    """
+    if created or (update_fields and set(update_fields) <= {'last_login'}):
+        return
+    for key in Token.objects.filter(user=instance).values_list(
+        'key', flat=True
+    ):
+        invalidate_token(key)
+
+
+@receiver(connection_created)
+def tune_sqlite(sender, connection, **kwargs):
+    """Применяет SQLITE_PRAGMAS к каждому новому соединению SQLite."""
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for pragma, value in settings.SQLITE_PRAGMAS.items():
+            cursor.execute(f'PRAGMA {pragma} = {value};')
+
+
+@receiver(connection_created)
+def instrument_queries(sender, connection, **kwargs):
+    """Подключает к соединению счётчик SQL для метрик и журнал SQL
+    для профилирования; вне их запросов обёртки ничего не делают."""
+    install_query_counter(connection)
+    install_query_log(connection)
+
+
+@receiver(post_delete, sender=RequestProfile)
+def profile_deleted(sender, instance, **kwargs):
+    """Удаляет файлы профиля вместе с записью."""
+    instance.stats_path.unlink(missing_ok=True)
+    instance.sql_path.unlink(missing_ok=True)
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+@receiver(post_save, sender=Favorite)
+@receiver(post_delete, sender=Favorite)
+@receiver(post_save, sender=ShopList)
+@receiver(post_delete, sender=ShopList)
+@receiver(post_save, sender=Subscription)
+@receiver(post_delete, sender=Subscription)
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def data_changed(sender, **kwargs):
+    """Меняет версию данных, от которой зависят кэшированные счётчики."""
+    bump_count_version()
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+@receiver(post_save, sender=IngredientInRecipe)
+@receiver(post_delete, sender=IngredientInRecipe)
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+@receiver(post_delete, sender=User)
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def public_data_changed(sender, **kwargs):
+    """Сбрасывает кэш анонимных ответов после изменения рецептов."""
+    invalidate_responses()
+
+
+@receiver(post_save, sender=User)
+def author_changed(sender, instance, update_fields=None, **kwargs):
+    """Автор есть в ответах с рецептами; вход (last_login) не в счёт."""
+    if update_fields and set(update_fields) <= {'last_login'}:
+        return
+    invalidate_responses()
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def catalog_changed(sender, **kwargs):
+    """Удаляет собранный каталог; следующий запрос соберёт его заново."""
+    transaction.on_commit(invalidate_catalog)
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_published(sender, instance, created, **kwargs):
+    """Сообщает подписчикам автора о новом рецепте."""
+    if created:
+        publish(recipe_event(instance))
+
+
+@receiver(post_save, sender=Subscription)
+def subscribed(sender, instance, created, **kwargs):
+    """Открытые потоки событий подписчика начинают получать автора."""
+    if created:
+        publish(follow_event(instance, True))
+
+
+@receiver(post_delete, sender=Subscription)
+def unsubscribed(sender, instance, **kwargs):
+    publish(follow_event(instance, False))
+
+
+@receiver(pre_save, sender=Recipe)
+@receiver(pre_save, sender=User)
+def remember_files(sender, instance, update_fields=None, **kwargs):
+    instance._files_before_save = files_before_save(instance, update_fields)
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_save, sender=User)
+def count_file_references(sender, instance, **kwargs):
+    """Новая картинка или аватар — ссылка на файл, прежний теряет одну."""
+    before = instance.__dict__.pop('_files_before_save', None)
+    if before:
+        files_after_save(instance, before)
+
+
+@receiver(post_delete, sender=Recipe)
+@receiver(post_delete, sender=User)
+def release_files(sender, instance, **kwargs):
+    files_deleted(instance)
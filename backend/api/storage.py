@@ -0,0 +1,251 @@
+"""Хранилище медиа с именами по содержимому.
+
+Файл называется по SHA-256 содержимого: <upload_to>/<ab>/<хэш>.<ext>.
+Одинаковые загрузки ложатся в один файл, а новое содержимое всегда
+получает новое имя, поэтому nginx отдаёт /media/ с бессрочным кэшем.
+
+Сколько полей моделей ссылается на файл, хранит StoredFile: загрузка
+создаёт запись, сигналы моделей с такими полями меняют счётчик.
+manage.py prune_media удаляет файлы, на которые давно никто не ссылается.
+Загрузка и удаление одного файла блокируют его запись, чтобы удаление не
+забрало файл, который только что загрузили заново.
+"""
+import hashlib
+import os
+import posixpath
+import uuid
+from collections import Counter
+from functools import lru_cache
+from itertools import islice
+
+from django.apps import apps
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.db import models, transaction
+from django.db.models import Case, F, Value, When
+from django.utils import timezone
+
+from .models import StoredFile
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """FileSystemStorage, который не хранит одинаковые файлы дважды."""
+
+    def get_available_name(self, name, max_length=None):
+        # Имя всё равно заменяется хэшем в _save.
+        return name
+
+    def _save(self, name, content):
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        digest = digest.hexdigest()
+        directory = posixpath.join(posixpath.dirname(name), digest[:2])
+        extension = posixpath.splitext(name)[1].lower()
+        name = posixpath.join(directory, digest + extension)
+        now = timezone.now()
+        with transaction.atomic():
+            stored, created = StoredFile.objects.select_for_update(
+            ).get_or_create(
+                name=name, defaults={'size': content.size, 'orphaned': now}
+            )
+            if not created and stored.references <= 0:
+                # Свежая загрузка продлевает файлу срок до удаления.
+                StoredFile.objects.filter(pk=stored.pk).update(orphaned=now)
+            if not self.exists(name):
+                temporary = super()._save(
+                    posixpath.join(directory, f'.{uuid.uuid4().hex}'), content
+                )
+                os.replace(self.path(temporary), self.path(name))
+        return name
+
+
+@lru_cache(maxsize=None)
+def stored_fields(model):
+    """Имена файловых полей model, которые хранятся в этом хранилище."""
+    return tuple(
+        field.attname for field in model._meta.concrete_fields
+        if isinstance(field, models.FileField)
+        and isinstance(field.storage, ContentAddressedStorage)
+    )
+
+
+def change_references(added=(), removed=()):
+    """Учитывает новые и пропавшие ссылки моделей на файлы."""
+    added = [name for name in added if name]
+    removed = [name for name in removed if name]
+    for name in added:
+        StoredFile.objects.filter(name=name).update(
+            references=F('references') + 1, orphaned=None
+        )
+    for name in removed:
+        StoredFile.objects.filter(name=name).update(
+            references=F('references') - 1,
+            orphaned=Case(
+                When(references__lte=1, then=Value(timezone.now())),
+                default=F('orphaned'),
+            ),
+        )
+
+
+def files_before_save(instance, update_fields=None):
+    """{поле: файл} до сохранения для полей, которые сохраняются."""
+    fields = stored_fields(type(instance))
+    if update_fields is not None:
+        fields = tuple(name for name in fields if name in update_fields)
+    if not fields:
+        return {}
+    before = None
+    if not instance._state.adding:
+        before = type(instance)._base_manager.filter(
+            pk=instance.pk
+        ).values(*fields).first()
+    before = before or {}
+    return {field: before.get(field) or '' for field in fields}
+
+
+def files_after_save(instance, before):
+    after = {field: str(getattr(instance, field) or '') for field in before}
+    change_references(
+        added=[name for field, name in after.items()
+               if name != before[field]],
+        removed=[name for field, name in before.items()
+                 if name != after[field]],
+    )
+
+
+def files_deleted(instance):
+    change_references(removed=[
+        str(getattr(instance, field) or '')
+        for field in stored_fields(type(instance))
+    ])
+
+
+def stored_models():
+    for model in apps.get_models():
+        for field in stored_fields(model):
+            yield model, field
+
+
+def referenced_files(names=None, batch_size=2000):
+    """Counter {файл: ссылок} по базе, для names или для всех файлов."""
+    counts = Counter()
+    for model, field in stored_models():
+        rows = model._base_manager.exclude(**{field: ''}).exclude(
+            **{f'{field}__isnull': True}
+        )
+        if names is not None:
+            rows = rows.filter(**{f'{field}__in': names})
+        counts.update(rows.values_list(field, flat=True).iterator(
+            chunk_size=batch_size
+        ))
+    return counts
+
+
+def prune_orphans(horizon, batch_size, dry_run=False):
+    """Удаляет файлы без ссылок с момента раньше horizon.
+
+    Счётчик мог разойтись с базой (bulk_create, update()), поэтому
+    каждая часть перед удалением сверяется с моделями; найденные ссылки
+    исправляют счётчик. Возвращает число файлов и освобождённые байты.
+    """
+    deleted = freed = last = 0
+    while True:
+        with transaction.atomic():
+            batch = list(StoredFile.objects.select_for_update().filter(
+                references__lte=0, orphaned__lt=horizon, pk__gt=last
+            ).order_by('pk')[:batch_size])
+            if not batch:
+                return deleted, freed
+            last = batch[-1].pk
+            referenced = referenced_files(
+                [stored.name for stored in batch], batch_size
+            )
+            for name, references in referenced.items():
+                StoredFile.objects.filter(name=name).update(
+                    references=references, orphaned=None
+                )
+            orphans = [stored for stored in batch
+                       if stored.name not in referenced]
+            if not dry_run:
+                for stored in orphans:
+                    default_storage.delete(stored.name)
+                StoredFile.objects.filter(
+                    pk__in=[stored.pk for stored in orphans]
+                ).delete()
+            deleted += len(orphans)
+            freed += sum(stored.size for stored in orphans)
+
+
+def recount(batch_size):
+    """Пересчитывает ссылки по базе и заводит записи для файлов, загруженных
+    до этого хранилища. Возвращает число исправленных записей."""
+    counts = referenced_files(batch_size=batch_size)
+    now = timezone.now()
+    fixed = last = 0
+    while True:
+        batch = list(StoredFile.objects.filter(pk__gt=last).order_by(
+            'pk'
+        )[:batch_size])
+        if not batch:
+            break
+        last = batch[-1].pk
+        changed = []
+        for stored in batch:
+            references = counts.pop(stored.name, 0)
+            if references != stored.references:
+                stored.references = references
+                stored.orphaned = None if references else (
+                    stored.orphaned or now
+                )
+                changed.append(stored)
+        StoredFile.objects.bulk_update(changed, ['references', 'orphaned'])
+        fixed += len(changed)
+    new = [
+        StoredFile(name=name, size=default_storage.size(name),
+                   references=references)
+        for name, references in counts.items()
+        if default_storage.exists(name)
+    ]
+    StoredFile.objects.bulk_create(new, batch_size=batch_size,
+                                   ignore_conflicts=True)
+    return fixed + len(new)
+
+
+def untracked_files(horizon):
+    """Файлы каталогов upload_to, изменённые раньше horizon."""
+    prefixes = {
+        model._meta.get_field(field).upload_to
+        for model, field in stored_models()
+    }
+    deadline = horizon.timestamp()
+    for prefix in sorted(prefix for prefix in prefixes
+                         if isinstance(prefix, str)):
+        for directory, _, filenames in os.walk(default_storage.path(prefix)):
+            for filename in filenames:
+                path = os.path.join(directory, filename)
+                if os.path.getmtime(path) < deadline:
+                    yield os.path.relpath(
+                        path, default_storage.location
+                    ).replace(os.sep, '/')
+
+
+def sweep_untracked(horizon, batch_size, dry_run=False):
+    """Удаляет старые файлы без записи StoredFile и без ссылок: замены до
+    этого хранилища и обрывки прерванных загрузок."""
+    deleted = freed = 0
+    files = untracked_files(horizon)
+    while True:
+        batch = list(islice(files, batch_size))
+        if not batch:
+            return deleted, freed
+        keep = set(StoredFile.objects.filter(
+            name__in=batch
+        ).values_list('name', flat=True))
+        keep.update(referenced_files(batch, batch_size))
+        for name in batch:
+            if name in keep:
+                continue
+            freed += default_storage.size(name)
+            deleted += 1
+            if not dry_run:
+                default_storage.delete(name)
@@ -0,0 +1,129 @@
+import base64
+import json
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+from recipes.models import Favorite, Recipe, ShopList, Tombstone
+
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+STREAMS = ('recipes', 'favorites', 'shopping_cart', 'deleted')
+
+
+def encode_token(cursors, synced):
+    """Упаковывает курсоры потоков и момент synced в непрозрачный токен.
+
+    synced — до какого момента клиент получил все отметки об удалении.
+    """
+    raw = {
+        name: [moment.isoformat(), pk] for name, (moment, pk)
+        in cursors.items()
+    }
+    raw['synced'] = synced.isoformat()
+    raw = json.dumps(raw, separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_token(token):
+    """Распаковывает токен в курсоры и synced.
+
+    Без токена синхронизация идёт с начала, а synced равен None.
+    """
+    cursors = {name: (EPOCH, 0) for name in STREAMS}
+    if not token:
+        return cursors, None
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        raw = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        for name in STREAMS:
+            moment, pk = raw[name]
+            cursors[name] = (datetime.fromisoformat(moment), int(pk))
+        # В токенах без synced клиент гарантированно видел отметки
+        # только до своего курсора.
+        synced = raw.get('synced')
+        synced = (datetime.fromisoformat(synced) if synced
+                  else cursors['deleted'][0])
+    except (ValueError, TypeError, KeyError, AttributeError):
+        raise ValidationError({'since': 'Некорректный токен синхронизации.'})
+    return cursors, synced
+
+
+def after(cursor, field):
+    """Условие «строго после курсора» по паре (время, id)."""
+    moment, pk = cursor
+    return (Q(**{f'{field}__gt': moment})
+            | Q(**{field: moment, 'id__gt': pk}))
+
+
+def take(queryset, cursor, field, limit, horizon):
+    """Возвращает пачку строк после курсора и новый курсор.
+
+    Строки новее horizon не отдаются: с такой же отметкой времени ещё
+    может зафиксироваться чужая транзакция, и курсор бы её перешагнул.
+    """
+    rows = list(queryset.filter(
+        after(cursor, field), **{f'{field}__lt': horizon}
+    ).order_by(field, 'id')[:limit])
+    if rows:
+        last = rows[-1]
+        cursor = (getattr(last, field), last.id)
+    return rows, cursor, len(rows) == limit
+
+
+def is_expired(synced):
+    """Отметки об удалении после synced могли быть уже удалены.
+
+    prune_tombstones удаляет отметки старше SYNC_TOMBSTONE_DAYS, поэтому
+    клиенту, который не синхронизировался дольше, нужен полный сброс.
+    """
+    horizon = timezone.now() - timedelta(days=settings.SYNC_TOMBSTONE_DAYS)
+    return synced is not None and synced < horizon
+
+
+def collect_changes(user, cursors, limit):
+    """Собирает изменения по всем потокам, начиная с курсоров.
+
+    Возвращает изменения, новые курсоры, признак неполной пачки и synced
+    для следующего токена.
+    """
+    horizon = timezone.now() - timedelta(
+        seconds=settings.SYNC_OVERLAP_SECONDS
+    )
+    changes = {}
+    has_more = False
+
+    recipes, cursors['recipes'], more = take(
+        Recipe.objects.select_related('author').prefetch_related(
+            'tags', 'IngredientInRecipe__ingredient'
+        ),
+        cursors['recipes'], 'modified', limit, horizon
+    )
+    changes['recipes'] = recipes
+    has_more |= more
+
+    tombstones = Tombstone.objects.filter(user_id__isnull=True)
+    if user.is_authenticated:
+        for name, model in (('favorites', Favorite),
+                            ('shopping_cart', ShopList)):
+            rows, cursors[name], more = take(
+                model.objects.filter(user=user),
+                cursors[name], 'modified', limit, horizon
+            )
+            changes[name] = rows
+            has_more |= more
+        tombstones = Tombstone.objects.filter(
+            Q(user_id__isnull=True) | Q(user_id=user.id)
+        )
+
+    changes['deleted'], cursors['deleted'], more = take(
+        tombstones, cursors['deleted'], 'deleted', limit, horizon
+    )
+    has_more |= more
+    # Отметки выданы полностью — клиент знает обо всех удалениях до
+    # horizon, иначе только до курсора.
+    synced = cursors['deleted'][0] if more else horizon
+    return changes, cursors, has_more, synced
@@ -0,0 +1,194 @@
+"""Очередь отложенных задач в базе данных, без внешнего брокера.
+
+Задача — функция, помеченная @task в модуле tasks.py любого приложения.
+enqueue записывает её вызов в таблицу Task, defer делает то же после
+фиксации текущей транзакции. manage.py run_tasks забирает задачи по
+приоритету и выполняет их в пуле потоков или процессов.
+
+Задача забирается условным UPDATE (статус не изменился — значит, она
+наша), поэтому так можно работать и на SQLite, и на PostgreSQL. Забранная
+задача арендуется на TASK_LEASE_SECONDS: если исполнитель упал, после
+аренды её заберёт другой. Упавшая задача повторяется с экспоненциальной
+задержкой, пока не исчерпает max_attempts. Задачи с одинаковым
+dedup_key, ожидающие в очереди, не дублируются.
+"""
+import logging
+import os
+import socket
+import threading
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import (DatabaseError, IntegrityError, close_old_connections,
+                       connections, transaction)
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import Task
+
+logger = logging.getLogger(__name__)
+
+TASKS = {}
+CLAIM_BATCH = 10
+
+
+class TaskFunction:
+    """Функция-задача: вызывается как обычно или ставится в очередь."""
+
+    def __init__(self, func, name, priority, max_attempts, key):
+        self.func = func
+        self.name = name
+        self.priority = priority
+        self.max_attempts = max_attempts
+        self.key = key
+
+    def __call__(self, *args, **kwargs):
+        return self.func(*args, **kwargs)
+
+    def enqueue(self, *args, priority=None, delay=0, dedup_key=None,
+                **kwargs):
+        """Ставит вызов в очередь; None, если такой уже ждёт."""
+        if dedup_key is None and self.key is not None:
+            dedup_key = self.key(*args, **kwargs)
+        try:
+            with transaction.atomic():
+                return Task.objects.create(
+                    name=self.name,
+                    payload={'args': list(args), 'kwargs': kwargs},
+                    priority=self.priority if priority is None else priority,
+                    dedup_key=dedup_key,
+                    max_attempts=self.max_attempts,
+                    run_after=timezone.now() + timedelta(seconds=delay),
+                )
+        except IntegrityError:
+            return None
+
+    def defer(self, *args, **kwargs):
+        """enqueue после фиксации текущей транзакции."""
+        transaction.on_commit(lambda: self.enqueue(*args, **kwargs))
+
+
+def task(name=None, priority=0, max_attempts=3, key=None):
+    """Регистрирует функцию как задачу.
+
+    key получает те же аргументы, что и задача, и возвращает ключ
+    дедупликации.
+    """
+    def decorator(func):
+        task_function = TaskFunction(
+            func, name or f'{func.__module__}.{func.__qualname__}',
+            priority, max_attempts, key
+        )
+        TASKS[task_function.name] = task_function
+        return task_function
+    return decorator
+
+
+def worker_name():
+    return f'{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}'
+
+
+def claim(worker):
+    """Забирает самую приоритетную готовую задачу или возвращает None."""
+    now = timezone.now()
+    candidates = Task.objects.filter(
+        Q(status=Task.QUEUED, run_after__lte=now)
+        | Q(status=Task.RUNNING, locked_until__lt=now)
+    ).order_by('-priority', 'run_after', 'id').values_list(
+        'id', 'status', 'locked_until'
+    )[:CLAIM_BATCH]
+    for task_id, status, locked_until in candidates:
+        claimed = Task.objects.filter(
+            pk=task_id, status=status, locked_until=locked_until
+        ).update(
+            status=Task.RUNNING,
+            locked_by=worker,
+            locked_until=now + timedelta(
+                seconds=settings.TASK_LEASE_SECONDS
+            ),
+            attempts=F('attempts') + 1,
+        )
+        if claimed:
+            return Task.objects.get(pk=task_id)
+    return None
+
+
+def finish(task, worker, **fields):
+    return Task.objects.filter(
+        pk=task.pk, status=Task.RUNNING, locked_by=worker
+    ).update(locked_until=None, **fields)
+
+
+def execute(task, worker):
+    """Выполняет забранную задачу и записывает результат."""
+    function = TASKS.get(task.name)
+    try:
+        if function is None:
+            raise LookupError(f'Задача {task.name} не зарегистрирована')
+        if task.attempts > task.max_attempts:
+            raise RuntimeError('Исполнитель не завершил задачу за аренду')
+        function.func(*task.payload.get('args', ()),
+                      **task.payload.get('kwargs', {}))
+    except Exception:
+        error = traceback.format_exc()
+        logger.exception('Задача %s упала', task)
+        if function is not None and task.attempts < task.max_attempts:
+            delay = settings.TASK_RETRY_DELAY_SECONDS * 2 ** (
+                task.attempts - 1
+            )
+            try:
+                with transaction.atomic():
+                    finish(task, worker, status=Task.QUEUED,
+                           last_error=error,
+                           run_after=timezone.now() + timedelta(
+                               seconds=delay
+                           ))
+                return
+            except IntegrityError:
+                # В очереди уже ждёт такая же задача, она и выполнит работу.
+                error += '\nПовтор не нужен: в очереди та же задача.'
+        finish(task, worker, status=Task.FAILED, last_error=error,
+               finished=timezone.now())
+    else:
+        finish(task, worker, status=Task.DONE, finished=timezone.now())
+
+
+def run_next(worker):
+    """Выполняет одну задачу; False, если готовых задач нет."""
+    close_old_connections()
+    task = claim(worker)
+    if task is None:
+        return False
+    execute(task, worker)
+    return True
+
+
+def work(stop, burst=False):
+    """Цикл исполнителя: до stop или, в режиме burst, до пустой очереди."""
+    worker = worker_name()
+    try:
+        while not stop.is_set():
+            try:
+                found = run_next(worker)
+            except DatabaseError:
+                # Занятая база (SQLite) или разрыв соединения: подождём.
+                logger.exception('Очередь задач недоступна')
+                stop.wait(settings.TASK_POLL_SECONDS)
+                continue
+            if not found:
+                if burst:
+                    return
+                stop.wait(settings.TASK_POLL_SECONDS)
+    finally:
+        connections.close_all()
+
+
+def prune():
+    """Удаляет выполненные задачи старше TASK_KEEP_DONE_SECONDS."""
+    return Task.objects.filter(
+        status=Task.DONE,
+        finished__lt=timezone.now() - timedelta(
+            seconds=settings.TASK_KEEP_DONE_SECONDS
+        ),
+    ).delete()[0]
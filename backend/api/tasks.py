@@ -0,0 +1,20 @@
+"""Отложенные задачи API; их находит и выполняет manage.py run_tasks."""
+from recipes.models import ShopList
+from recipes.shopping import cached_shopping_list
+from .taskqueue import task
+
+
+@task(key=lambda user_id: f'shopping-list:{user_id}')
+def build_shopping_list(user_id):
+    """Заранее собирает список покупок, чтобы скачивание было быстрым."""
+    cached_shopping_list(user_id)
+
+
+@task(key=lambda recipe_id: f'recipe-saved:{recipe_id}', priority=-1)
+def recipe_saved(recipe_id):
+    """Пересобирает списки покупок, в которых есть изменённый рецепт."""
+    user_ids = ShopList.objects.filter(recipe_id=recipe_id).values_list(
+        'user_id', flat=True
+    )
+    for user_id in user_ids.iterator():
+        build_shopping_list.enqueue(user_id)
@@ -0,0 +1,102 @@
+import tempfile
+from pathlib import Path
+from unittest import mock
+
+from asgiref.sync import async_to_sync, sync_to_async
+from django.db.utils import ConnectionHandler
+from django.http import HttpResponse
+from django.test import SimpleTestCase, override_settings
+from django.test.client import AsyncRequestFactory, RequestFactory
+
+from foodgram_backend.db_routers import (ReplicaRouter,
+                                         ReplicaRoutingMiddleware)
+from recipes.models import Tag
+
+
+@override_settings(REPLICA_PIN_SECONDS=5)
+class ReplicaRoutingTests(SimpleTestCase):
+    """Основная база и реплика — два файла SQLite с разной меткой."""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.files = ConnectionHandler({
+            alias: {'ENGINE': 'django.db.backends.sqlite3',
+                    'NAME': str(Path(directory.name) / f'{alias}.sqlite3')}
+            for alias in ('default', 'replica1')
+        })
+        self.addCleanup(self.files.close_all)
+        for alias in ('default', 'replica1'):
+            with self.files[alias].cursor() as cursor:
+                cursor.execute('CREATE TABLE marker (name TEXT)')
+                cursor.execute('INSERT INTO marker VALUES (%s)', [alias])
+        patcher = mock.patch('foodgram_backend.db_routers.replica_aliases',
+                             return_value=['replica1'])
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.factory = RequestFactory()
+
+    def read_marker(self, request):
+        """Отвечает меткой базы, которую роутер выбрал для чтения."""
+        alias = ReplicaRouter().db_for_read(Tag)
+        with self.files[alias].cursor() as cursor:
+            cursor.execute('SELECT name FROM marker')
+            return HttpResponse(cursor.fetchone()[0])
+
+    def request(self, middleware, method, path='/api/tags/', **extra):
+        request = getattr(self.factory, method)(path, **extra)
+        return middleware(request)
+
+    def test_safe_api_request_reads_replica(self):
+        middleware = ReplicaRoutingMiddleware(self.read_marker)
+        response = self.request(middleware, 'get')
+        self.assertEqual(response.content, b'replica1')
+        response = self.request(middleware, 'get', path='/admin/')
+        self.assertEqual(response.content, b'default')
+        response = self.request(middleware, 'post')
+        self.assertEqual(response.content, b'default')
+
+    def test_write_pins_client_by_signed_cookie(self):
+        middleware = ReplicaRoutingMiddleware(self.read_marker)
+        pin = self.request(middleware, 'post').cookies[
+            ReplicaRoutingMiddleware.cookie_name
+        ]
+        # Другой воркер: новый экземпляр middleware, общего кэша нет.
+        other = ReplicaRoutingMiddleware(self.read_marker)
+        other.shared = False
+        self.factory.cookies[pin.key] = pin.value
+        self.assertEqual(self.request(other, 'get').content, b'default')
+        with mock.patch('django.core.signing.time.time',
+                        return_value=10 ** 10):
+            self.assertEqual(self.request(other, 'get').content, b'replica1')
+        self.factory.cookies[pin.key] = 'forged'
+        self.assertEqual(self.request(other, 'get').content, b'replica1')
+
+    def test_write_pins_token_client_in_shared_cache(self):
+        middleware = ReplicaRoutingMiddleware(self.read_marker)
+        middleware.shared = True
+        token = {'HTTP_AUTHORIZATION': 'Token first'}
+        self.request(middleware, 'post', **token)
+        self.assertEqual(
+            self.request(middleware, 'get', **token).content, b'default'
+        )
+        self.assertEqual(
+            self.request(middleware, 'get',
+                         HTTP_AUTHORIZATION='Token second').content,
+            b'replica1'
+        )
+
+    def test_async_request_routes_and_pins(self):
+        async def read_marker(request):
+            return await sync_to_async(self.read_marker)(request)
+
+        middleware = ReplicaRoutingMiddleware(read_marker)
+        factory = AsyncRequestFactory()
+        response = async_to_sync(middleware)(factory.get('/api/tags/'))
+        self.assertEqual(response.content, b'replica1')
+        pin = async_to_sync(middleware)(factory.post('/api/tags/')).cookies[
+            ReplicaRoutingMiddleware.cookie_name
+        ]
+        factory.cookies[pin.key] = pin.value
+        response = async_to_sync(middleware)(factory.get('/api/tags/'))
+        self.assertEqual(response.content, b'default')
@@ -0,0 +1,123 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.db.models import QuerySet
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from api.models import Task
+from api.taskqueue import claim, execute, task
+
+calls = []
+
+
+@task(name='tests.record', key=lambda value: f'record:{value}')
+def record(value):
+    calls.append(value)
+
+
+@task(name='tests.explode', max_attempts=3)
+def explode():
+    raise ValueError('boom')
+
+
+class DedupTests(TestCase):
+
+    def test_waiting_task_is_not_duplicated(self):
+        self.assertIsNotNone(record.enqueue(1))
+        self.assertIsNone(record.enqueue(1))
+        self.assertIsNotNone(record.enqueue(2))
+        self.assertEqual(
+            Task.objects.filter(dedup_key='record:1').count(), 1
+        )
+
+    def test_running_task_does_not_block_a_new_one(self):
+        record.enqueue(1)
+        claimed = claim('worker')
+        self.assertEqual(claimed.status, Task.RUNNING)
+        self.assertIsNotNone(record.enqueue(1))
+
+    def test_retry_is_dropped_when_same_task_waits(self):
+        first = Task.objects.create(
+            name='tests.explode', dedup_key='same', run_after=timezone.now()
+        )
+        claimed = claim('worker')
+        Task.objects.create(
+            name='tests.explode', dedup_key='same', run_after=timezone.now()
+        )
+        execute(claimed, 'worker')
+        first.refresh_from_db()
+        self.assertEqual(first.status, Task.FAILED)
+        self.assertEqual(Task.objects.filter(status=Task.QUEUED).count(), 1)
+
+
+class ClaimTests(TestCase):
+
+    def test_task_is_claimed_once_when_workers_race(self):
+        record.enqueue(1)
+        update = QuerySet.update
+        rival = []
+
+        def update_after_rival(queryset, **kwargs):
+            # Соперник забирает задачу между выборкой кандидатов и
+            # условным UPDATE этого исполнителя.
+            if not rival:
+                rival.append(None)
+                rival[0] = claim('rival')
+            return update(queryset, **kwargs)
+
+        with mock.patch.object(QuerySet, 'update', update_after_rival):
+            self.assertIsNone(claim('worker'))
+        self.assertEqual(rival[0].locked_by, 'rival')
+        self.assertEqual(Task.objects.get().attempts, 1)
+
+    def test_priority_and_run_after_order(self):
+        record.enqueue(1)
+        urgent = record.enqueue(2, priority=5)
+        record.enqueue(3, priority=10, delay=60)
+        self.assertEqual(claim('worker').pk, urgent.pk)
+
+    @override_settings(TASK_LEASE_SECONDS=60)
+    def test_expired_lease_is_claimed_again(self):
+        record.enqueue(1)
+        claim('crashed')
+        self.assertIsNone(claim('worker'))
+        with mock.patch('api.taskqueue.timezone.now',
+                        return_value=timezone.now() + timedelta(seconds=61)):
+            reclaimed = claim('worker')
+        self.assertEqual(reclaimed.locked_by, 'worker')
+        self.assertEqual(reclaimed.attempts, 2)
+
+
+@override_settings(TASK_RETRY_DELAY_SECONDS=10)
+class RetryTests(TestCase):
+
+    def run_once(self, now):
+        with mock.patch('api.taskqueue.timezone.now', return_value=now):
+            claimed = claim('worker')
+            execute(claimed, 'worker')
+        return Task.objects.get(pk=claimed.pk)
+
+    def test_backoff_doubles_until_attempts_run_out(self):
+        explode.enqueue()
+        now = timezone.now()
+        for attempt, delay in ((1, 10), (2, 20)):
+            failed = self.run_once(now)
+            self.assertEqual(failed.status, Task.QUEUED)
+            self.assertEqual(failed.attempts, attempt)
+            self.assertEqual(failed.run_after, now + timedelta(seconds=delay))
+            self.assertIn('boom', failed.last_error)
+            with mock.patch('api.taskqueue.timezone.now', return_value=now):
+                self.assertIsNone(claim('worker'))
+            now = failed.run_after
+        failed = self.run_once(now)
+        self.assertEqual(failed.status, Task.FAILED)
+        self.assertEqual(failed.attempts, 3)
+        self.assertIsNone(failed.locked_until)
+
+    def test_success_marks_task_done(self):
+        calls.clear()
+        record.enqueue(7)
+        done = self.run_once(timezone.now())
+        self.assertEqual(done.status, Task.DONE)
+        self.assertEqual(calls, [7])
@@ -0,0 +1,24 @@
+"""Вызов синхронного кода с базой из асинхронного."""
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.db import close_old_connections
+
+
+def in_thread(func):
+    """Запускает синхронную функцию в свободном потоке.
+
+    В отличие от thread_sensitive-режима по умолчанию, такие вызовы
+    действительно идут параллельно: у каждого потока своё соединение.
+    """
+    def run(*args, **kwargs):
+        close_old_connections()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            close_old_connections()
+    return sync_to_async(run, thread_sensitive=False)
+
+
+def concurrently(*calls):
+    return asyncio.gather(*(in_thread(func)(*args) for func, *args in calls))
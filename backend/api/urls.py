@@ -1,7 +1,9 @@
+from django.conf import settings
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
-from api.views import IngredientViewSet, RecipeViewSet, TagViewSet, UserViewSet
+from api.views import (EventTicketView, IngredientViewSet, MetricsView,
+                       RecipeViewSet, SyncView, TagViewSet, UserViewSet)
 
 app_name = 'api'
 
@@ -15,7 +17,22 @@ router.register('recipes', RecipeViewSet, basename='recipes')
 urlpatterns = [
     path('', include(router.urls)),
     path('auth/', include('djoser.urls.authtoken')),
+    path('sync/', SyncView.as_view(), name='sync'),
+    path('metrics/', MetricsView.as_view(), name='metrics'),
+    path('events/ticket/', EventTicketView.as_view(), name='event-ticket'),
     path('recipe/<slug:slug>/',
          RecipeViewSet.as_view({'get': 'retrieve_by_slug'}),
          name='recipe-detail-by-slug'),
 ]
+
+if settings.ASYNC_READS:
+    from api import async_views
+
+    urlpatterns = [
+        path('recipes/', async_views.recipe_list),
+        path('recipes/<int:pk>/', async_views.recipe_detail),
+        path('recipe/<slug:slug>/', async_views.recipe_by_slug),
+        path('tags/', async_views.tag_list),
+        path('ingredients/', async_views.ingredient_list),
+        path('users/subscriptions/', async_views.subscriptions),
+    ] + urlpatterns
@@ -1,25 +1,41 @@
+from urllib.parse import urlencode
+
+from django.conf import settings
 from django.contrib.auth import update_session_auth_hash
-from django.db.models import F, Sum
-from django.http import HttpResponse
+from django.http import Http404, HttpResponse
 from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
+from django_filters.utils import translate_validation
 from djoser.serializers import SetPasswordSerializer
 from rest_framework import mixins, status, viewsets
 from rest_framework.decorators import action
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from rest_framework.response import Response
+from rest_framework.views import APIView
 from users.models import Subscription, User
 from api.serializers import (FavoriteSerializer, IngredientSerializer,
                              RecipeGetSerializer, RecipePostSerializer,
                              RecipeShortSerializer, ShoppingListSerializer,
-                             TagSerializer, UserAvatarSerializer,
-                             UserGetSerializer, UserPostSerializer,
-                             UserWithRecipesSerializer)
-from recipes.models import (Favorite, Ingredient, IngredientInRecipe, Recipe,
-                            ShopList, Tag)
+                             ShoppingMultiplierSerializer, SyncItemSerializer,
+                             TagSerializer, TombstoneSerializer,
+                             UserAvatarSerializer, UserGetSerializer,
+                             UserPostSerializer, UserWithRecipesSerializer)
+from recipes.models import Favorite, Ingredient, Recipe, ShopList, Tag
+from recipes.pantry import pantry_index
+from recipes.shopping import (cache_is_shared, cached_shopping_list,
+                              format_amount)
+from recipes.similarity import similarity_index
+from .catalog import catalog_response
+from .conditional import etag_matches, recipe_etag
+from .events import PATH as EVENTS_PATH, make_ticket
+from .fieldsets import select_recipes, select_subscriptions, select_users
 from .filters import IngredientFilter, RecipeFilter
+from .metrics import render_metrics
 from .pagination import CustomPagination
 from .permissions import IsAuthorOrAdminOrReadOnly
+from .sync import collect_changes, decode_token, encode_token, is_expired
+from .tasks import build_shopping_list
 
 
 class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
@@ -29,6 +45,12 @@ class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
     search_fields = ('^name',)
     pagination_class = None
 
+    def list(self, request, *args, **kwargs):
+        if (not request.query_params
+                and request.accepted_renderer.format == 'json'):
+            return catalog_response(request)
+        return super().list(request, *args, **kwargs)
+
 
 class TagViewSet(viewsets.ReadOnlyModelViewSet):
     queryset = Tag.objects.all()
@@ -43,6 +65,11 @@ class RecipeViewSet(viewsets.ModelViewSet):
     filterset_class  = RecipeFilter
     pagination_class = CustomPagination
 
+    def get_queryset(self):
+        if self.request.method == 'GET':
+            return select_recipes(self.request)
+        return super().get_queryset()
+
     def get_serializer_class(self):
         if self.request.method == 'GET':
             return RecipeGetSerializer
@@ -51,47 +78,80 @@ class RecipeViewSet(viewsets.ModelViewSet):
         elif self.request.method in ['POST', 'PATCH']:
             return RecipePostSerializer
 
-    def add_or_remove_item(self, request, pk, model, serializer_class):
+    def add_or_remove_item(self, request, pk, model, serializer_class,
+                           **fields):
         """Метод для добавления и удаления объектов."""
         user = self.request.user
         recipe = get_object_or_404(Recipe, pk=pk)
 
         if self.request.method == "POST":
-            model.objects.create(user=user, recipe=recipe)
+            model.objects.create(user=user, recipe=recipe, **fields)
+            self.item_changed(model, user)
             serializer = serializer_class(recipe, context={'request': request})
             return Response(serializer.data, status=status.HTTP_201_CREATED)
 
         item = get_object_or_404(model, user=user, recipe=recipe)
         item.delete()
+        self.item_changed(model, user)
         return Response(status=status.HTTP_204_NO_CONTENT)
 
+    def perform_create(self, serializer):
+        serializer.save()
+        self.duplicates = serializer.duplicates
+
+    def perform_update(self, serializer):
+        serializer.save()
+        self.duplicates = serializer.duplicates
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        """Политика warn: почти такие же рецепты — в X-Duplicate-Recipes."""
+        if getattr(self, 'duplicates', None):
+            response['X-Duplicate-Recipes'] = ','.join(
+                map(str, self.duplicates)
+            )
+        return super().finalize_response(request, response, *args, **kwargs)
+
+    @staticmethod
+    def item_changed(model, user):
+        """Откладывает работу, зависящую от списков пользователя."""
+        # Список из кэша исполнителя виден веб-процессам, только если
+        # кэш общий; иначе его посчитает сам запрос на скачивание.
+        if model is ShopList and cache_is_shared():
+            build_shopping_list.defer(user.pk)
+
     @action(["POST", "DELETE"], detail=True)
     def favorite(self, request, pk=None):
         return self.add_or_remove_item(
             request, pk, Favorite, FavoriteSerializer
         )
 
-    @action(["POST", "DELETE"], detail=True)
+    @action(["POST", "PATCH", "DELETE"], detail=True)
     def shopping_cart(self, request, pk=None):
+        """POST и PATCH принимают необязательный multiplier — множитель
+        порций, на который умножаются количества в списке покупок."""
+        fields = {}
+        if request.method in ('POST', 'PATCH'):
+            serializer = ShoppingMultiplierSerializer(data=request.data)
+            serializer.is_valid(raise_exception=True)
+            fields = serializer.validated_data
+        if request.method == 'PATCH':
+            item = get_object_or_404(ShopList, user=request.user, recipe=pk)
+            for name, value in fields.items():
+                setattr(item, name, value)
+            item.save()
+            self.item_changed(ShopList, request.user)
+            return Response(ShoppingMultiplierSerializer(item).data)
         return self.add_or_remove_item(
-            request, pk, ShopList, ShoppingListSerializer
+            request, pk, ShopList, ShoppingListSerializer, **fields
         )
 
     @action(detail=False, permission_classes=[IsAuthenticated, ])
     def download_shopping_cart(self, request):
-        user = request.user
-        ingredients = IngredientInRecipe.objects.filter(
-            recipe__shopping_cart__user=user).values(
-            name=F('ingredient__name'),
-            measurement_unit=F('ingredient__measurement_unit')).annotate(
-            total_amount=Sum('amount')
-        )
         data = []
-        for ingredient in ingredients:
+        for ingredient in cached_shopping_list(request.user.pk):
             data.append(
                 f'{ingredient["name"]} - '
-                f'{ingredient["total_amount"]} '
-                f'{ingredient["measurement_unit"]}'
+                f'{format_amount(ingredient["total"], ingredient["unit"])}'
             )
         content = 'Список покупок: \n\n' + '\n'.join(data)
         filename = 'purchases.txt'
@@ -99,10 +159,114 @@ class RecipeViewSet(viewsets.ModelViewSet):
         request['Content-Disposition'] = f'attachment; filename={filename}'
         return request
 
+    @action(detail=True)
+    def similar(self, request, pk=None):
+        """Рецепты с самыми похожими наборами ингредиентов."""
+        recipe = self.get_object()
+        try:
+            limit = int(request.query_params.get(
+                'limit', settings.SIMILAR_RECIPES_LIMIT
+            ))
+        except ValueError:
+            limit = settings.SIMILAR_RECIPES_LIMIT
+        limit = max(1, min(limit, settings.SIMILAR_RECIPES_MAX_LIMIT))
+        scores = dict(similarity_index.similar(recipe.pk, limit))
+        recipes = Recipe.objects.in_bulk(list(scores))
+        data = []
+        for recipe_id, score in scores.items():
+            if recipe_id not in recipes:
+                continue
+            item = RecipeShortSerializer(
+                recipes[recipe_id], context={'request': request}
+            ).data
+            item['similarity'] = round(score, 4)
+            data.append(item)
+        return Response(data)
+
+    @staticmethod
+    def int_list(values, name):
+        try:
+            return [int(value) for item in values
+                    for value in item.split(',') if value.strip()]
+        except ValueError:
+            raise ValidationError({name: 'Ожидается список id через запятую.'})
+
+    def pantry_filter_ids(self, request):
+        """id рецептов по фильтрам RecipeFilter, кроме тэгов."""
+        params = request.query_params.copy()
+        params.pop('tags', None)
+        if not any(name in params for name in RecipeFilter.Meta.fields):
+            return None
+        filterset = RecipeFilter(
+            params, queryset=Recipe.objects.all(), request=request
+        )
+        if not filterset.is_valid():
+            raise translate_validation(filterset.errors)
+        return set(filterset.qs.values_list('id', flat=True))
+
+    @action(detail=False)
+    def pantry(self, request):
+        """Рецепты, которые можно приготовить из имеющихся продуктов.
+
+        ?ingredients= — id продуктов, ?max_missing= — сколько ингредиентов
+        может не хватать; сначала рецепты, где не хватает меньше. Фильтры
+        RecipeFilter (tags, author, ...) работают как в списке рецептов.
+        """
+        ingredient_ids = self.int_list(
+            request.query_params.getlist('ingredients'), 'ingredients'
+        )
+        if not ingredient_ids:
+            raise ValidationError({'ingredients': 'Укажите продукты.'})
+        max_missing = self.int_list(
+            [request.query_params.get('max_missing', '')], 'max_missing'
+        ) or [settings.PANTRY_MAX_MISSING]
+        max_missing = max(0, min(max_missing[0],
+                                 settings.PANTRY_MAX_MISSING_LIMIT))
+        tag_ids = None
+        if request.query_params.getlist('tags'):
+            tag_ids = list(Tag.objects.filter(
+                slug__in=request.query_params.getlist('tags')
+            ).values_list('id', flat=True))
+        matches = pantry_index.search(
+            ingredient_ids, max_missing, tag_ids,
+            self.pantry_filter_ids(request)
+        )
+        page = self.paginate_queryset(matches)
+        recipes = select_recipes(request).in_bulk(
+            [recipe_id for recipe_id, _ in page]
+        )
+        data = []
+        for recipe_id, missing in page:
+            if recipe_id not in recipes:
+                continue
+            item = self.get_serializer(recipes[recipe_id]).data
+            item['missing_count'] = missing
+            item['missing_ingredients'] = pantry_index.missing_ingredients(
+                recipe_id, ingredient_ids
+            )
+            data.append(item)
+        return self.get_paginated_response(data)
+
+    def retrieve(self, request, pk=None):
+        return self.retrieve_if_modified(request, pk=pk)
+
     def retrieve_by_slug(self, request, slug=None):
-        recipe = get_object_or_404(Recipe, slug=slug)
+        return self.retrieve_if_modified(request, slug=slug)
+
+    def retrieve_if_modified(self, request, **lookup):
+        """Рецепт с ETag; 304 без сериализации, если у клиента он свежий."""
+        etag = recipe_etag(
+            request.user, lookup, request.accepted_renderer.format
+        )
+        if etag is None:
+            raise Http404
+        if etag_matches(request, etag):
+            return Response(status=status.HTTP_304_NOT_MODIFIED,
+                            headers={'ETag': etag})
+        recipe = get_object_or_404(self.get_queryset(), **lookup)
+        self.check_object_permissions(request, recipe)
         serializer = self.get_serializer(recipe)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        return Response(serializer.data, headers={'ETag': etag})
 
 
 class UserViewSet(mixins.CreateModelMixin,
@@ -115,6 +279,11 @@ class UserViewSet(mixins.CreateModelMixin,
     def get_instance(self):
         return self.request.user
 
+    def get_queryset(self):
+        if self.request.method == 'GET':
+            return select_users(self.request)
+        return super().get_queryset()
+
     def get_serializer_class(self):
         if self.action == 'avatar':
             return UserAvatarSerializer
@@ -164,9 +333,9 @@ class UserViewSet(mixins.CreateModelMixin,
         permission_classes=[IsAuthenticated, ]
     )
     def subscriptions(self, request):
-        users = User.objects.filter(
+        users = select_subscriptions(request, User.objects.filter(
             following__user=request.user
-        ).prefetch_related('recipes')
+        ))
         page = self.paginate_queryset(users)
 
         if page is not None:
@@ -214,3 +383,65 @@ class UserViewSet(mixins.CreateModelMixin,
         serializer.is_valid(raise_exception=True)
         serializer.save()
         return Response(serializer.data, status=status.HTTP_200_OK)
+
+
+class SyncView(APIView):
+    """Инкрементальная синхронизация: только изменения после токена."""
+    page_size = 500
+    max_page_size = 2000
+
+    def get_limit(self, request):
+        try:
+            limit = int(request.query_params.get('limit', self.page_size))
+        except ValueError:
+            return self.page_size
+        return max(1, min(limit, self.max_page_size))
+
+    def get(self, request):
+        cursors, synced = decode_token(request.query_params.get('since'))
+        reset = is_expired(synced)
+        if reset:
+            cursors, _ = decode_token(None)
+        changes, cursors, has_more, synced = collect_changes(
+            request.user, cursors, self.get_limit(request)
+        )
+        context = {'request': request}
+        data = {
+            'reset': reset,
+            'has_more': has_more,
+            'next': encode_token(cursors, synced),
+            'recipes': RecipeGetSerializer(
+                changes['recipes'], many=True, context=context
+            ).data,
+            'deleted': TombstoneSerializer(
+                changes['deleted'], many=True
+            ).data,
+        }
+        for name in ('favorites', 'shopping_cart'):
+            data[name] = SyncItemSerializer(
+                changes.get(name, []), many=True
+            ).data
+        return Response(data)
+
+
+class MetricsView(APIView):
+    """Метрики всех воркеров для Prometheus; только администраторам."""
+    permission_classes = (IsAdminUser,)
+
+    def get(self, request):
+        return HttpResponse(
+            render_metrics(),
+            content_type='text/plain; version=0.0.4; charset=utf-8'
+        )
+
+
+class EventTicketView(APIView):
+    """Билет для потока событий: EventSource не передаёт заголовки."""
+    permission_classes = (IsAuthenticated,)
+
+    def post(self, request):
+        ticket = make_ticket(request.user)
+        return Response({
+            'ticket': ticket,
+            'url': f'{EVENTS_PATH}?{urlencode({"ticket": ticket})}',
+        })
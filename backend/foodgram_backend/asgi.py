@@ -4,4 +4,9 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'foodgram_backend.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Поток событий импортирует модели, поэтому только после настройки Django.
+from api.events import EventStreamApplication  # noqa: E402
+
+application = EventStreamApplication(django_application)
@@ -0,0 +1,134 @@
+import hashlib
+import random
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+
+# По умолчанию всё идёт в основную базу: реплики включаются только
+# для безопасных API-запросов, помеченных middleware.
+use_primary = ContextVar('use_primary', default=True)
+
+
+def replica_aliases():
+    return [alias for alias in settings.DATABASES
+            if alias != DEFAULT_DB_ALIAS]
+
+
+class ReplicaRouter:
+    """Чтение из реплик, запись и чтение после записи — из основной базы."""
+
+    def db_for_read(self, model, **hints):
+        replicas = replica_aliases()
+        if use_primary.get() or not replicas:
+            return DEFAULT_DB_ALIAS
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
+
+
+class ReplicaRoutingMiddleware:
+    """Отправляет безопасные API-запросы в реплики.
+
+    После изменяющего запроса клиент на REPLICA_PIN_SECONDS закрепляется
+    за основной базой, чтобы сразу увидеть собственные изменения. Метка
+    закрепления — подписанная cookie, её видит любой воркер; клиентам без
+    cookie (токен в заголовке) метку хранит общий кэш, если он есть.
+    """
+
+    sync_capable = True
+    async_capable = True
+    cookie_name = 'db-pin'
+
+    def __init__(self, get_response):
+        # Модуль загружается вместе с роутером, до готовности приложений.
+        from recipes.shopping import cache_is_shared
+
+        self.get_response = get_response
+        self.shared = cache_is_shared()
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    @staticmethod
+    def pin_key(request):
+        identity = (request.META.get('HTTP_AUTHORIZATION')
+                    or request.COOKIES.get(settings.SESSION_COOKIE_NAME)
+                    or request.META.get('REMOTE_ADDR', ''))
+        return 'db-pin:' + hashlib.sha1(identity.encode()).hexdigest()
+
+    @staticmethod
+    def is_safe(request):
+        return request.method in ('GET', 'HEAD', 'OPTIONS')
+
+    def may_use_replica(self, request):
+        return (self.is_safe(request)
+                and request.path.startswith(settings.REPLICA_PATH_PREFIXES))
+
+    def has_pin_cookie(self, request):
+        return request.get_signed_cookie(
+            self.cookie_name, default=None,
+            max_age=settings.REPLICA_PIN_SECONDS
+        ) is not None
+
+    def set_pin_cookie(self, request, response):
+        response.set_signed_cookie(
+            self.cookie_name, '1', max_age=settings.REPLICA_PIN_SECONDS,
+            secure=request.is_secure(), httponly=True, samesite='Lax'
+        )
+
+    def is_pinned(self, request):
+        return self.has_pin_cookie(request) or (
+            self.shared and cache.get(self.pin_key(request))
+        )
+
+    async def ais_pinned(self, request):
+        return self.has_pin_cookie(request) or (
+            self.shared and await cache.aget(self.pin_key(request))
+        )
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if not replica_aliases():
+            return self.get_response(request)
+        reset = use_primary.set(not (
+            self.may_use_replica(request) and not self.is_pinned(request)
+        ))
+        try:
+            response = self.get_response(request)
+        finally:
+            use_primary.reset(reset)
+        if not self.is_safe(request):
+            self.set_pin_cookie(request, response)
+            if self.shared:
+                cache.set(self.pin_key(request), True,
+                          settings.REPLICA_PIN_SECONDS)
+        return response
+
+    async def __acall__(self, request):
+        if not replica_aliases():
+            return await self.get_response(request)
+        reset = use_primary.set(not (
+            self.may_use_replica(request)
+            and not await self.ais_pinned(request)
+        ))
+        try:
+            response = await self.get_response(request)
+        finally:
+            use_primary.reset(reset)
+        if not self.is_safe(request):
+            self.set_pin_cookie(request, response)
+            if self.shared:
+                await cache.aset(self.pin_key(request), True,
+                                 settings.REPLICA_PIN_SECONDS)
+        return response
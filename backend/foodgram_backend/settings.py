@@ -1,7 +1,12 @@
 import os
+import tempfile
 from pathlib import Path
+from urllib.parse import quote
 
 import dotenv
+from django.core.exceptions import ImproperlyConfigured
+
+from foodgram_backend.db_config import database_from_env
 
 dotenv.load_dotenv()
 
@@ -32,13 +37,17 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'foodgram_backend.db_routers.ReplicaRoutingMiddleware',
+    'api.response_cache.AnonymousResponseCacheMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'api.profiling.ProfilingMiddleware',
 ]
 
 ROOT_URLCONF = 'foodgram_backend.urls'
@@ -61,20 +70,56 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'foodgram_backend.wsgi.application'
 
+# Асинхронные GET-эндпоинты для запуска под ASGI (uvicorn).
+ASYNC_READS = os.getenv('ASYNC_READS', 'False').lower() == 'true'
+
 DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
+    'default': database_from_env(BASE_DIR),
 }
 
+# Реплики для чтения: DB_REPLICAS=postgres://...,sqlite:///replica.sqlite3
+# Запись без схемы считается путём к файлу SQLite.
+for number, url in enumerate(
+    filter(None, os.getenv('DB_REPLICAS', '').split(',')), start=1
+):
+    url = url.strip()
+    if '://' not in url:
+        url = 'sqlite:///' + quote(url)
+    DATABASES[f'replica{number}'] = {
+        **database_from_env(BASE_DIR, url),
+        'TEST': {'MIRROR': 'default'},
+    }
+
+# PRAGMA для SQLite, применяются к каждому новому соединению.
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'mmap_size': int(os.getenv('SQLITE_MMAP_SIZE', 256 * 1024 * 1024)),
+    'busy_timeout': int(os.getenv('SQLITE_BUSY_TIMEOUT', 5000)),
+} if os.getenv('SQLITE_PRAGMAS', 'True').lower() == 'true' else {}
+
+DATABASE_ROUTERS = ['foodgram_backend.db_routers.ReplicaRouter']
+
+REPLICA_PATH_PREFIXES = ('/api/',)
+
+REPLICA_PIN_SECONDS = int(os.getenv('REPLICA_PIN_SECONDS', 5))
+
 REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.AllowAny',
     ],
 
+    'DEFAULT_RENDERER_CLASSES': [
+        'api.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'api.renderers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'api.authentication.CachedTokenAuthentication',
     ],
     'DEFAULT_FILTER_BACKENDS': (
         'django_filters.rest_framework.DjangoFilterBackend',
@@ -120,3 +165,157 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 MEDIA_URL = "/media/"
 MEDIA_ROOT = BASE_DIR / 'media'
+
+# Медиа с именами по содержимому: одинаковые загрузки хранятся один раз,
+# файлы без ссылок удаляет manage.py prune_media.
+STORAGES = {
+    'default': {
+        'BACKEND': 'api.storage.ContentAddressedStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage',
+    },
+}
+MEDIA_ORPHAN_GRACE_SECONDS = int(
+    os.getenv('MEDIA_ORPHAN_GRACE_SECONDS', 86400)
+)
+MEDIA_PRUNE_BATCH_SIZE = int(os.getenv('MEDIA_PRUNE_BATCH_SIZE', 500))
+
+# Счётчики страниц: кэш точного COUNT(*) и порог оценки планировщика.
+COUNT_CACHE_TTL = int(os.getenv('COUNT_CACHE_TTL', 300))
+COUNT_ESTIMATE_THRESHOLD = int(os.getenv('COUNT_ESTIMATE_THRESHOLD', 10000))
+
+SYNC_TOMBSTONE_DAYS = int(os.getenv('SYNC_TOMBSTONE_DAYS', 30))
+# Синхронизация отдаёт только строки старше стольких секунд: транзакция
+# могла записать modified раньше, а зафиксироваться позже.
+SYNC_OVERLAP_SECONDS = int(os.getenv('SYNC_OVERLAP_SECONDS', 10))
+
+TOKEN_CACHE_TTL = int(os.getenv('TOKEN_CACHE_TTL', 60))
+TOKEN_CACHE_SIZE = int(os.getenv('TOKEN_CACHE_SIZE', 1024))
+TOKEN_CACHE_ALIAS = os.getenv('TOKEN_CACHE_ALIAS')
+# Без общего кэша выход и смена пароля доходят до других воркеров
+# только через столько секунд.
+TOKEN_CACHE_LOCAL_TTL = int(os.getenv('TOKEN_CACHE_LOCAL_TTL', 5))
+
+# Общий кэш нужен, когда воркеров несколько: иначе сброс кэша ответов
+# и счётчиков виден только в процессе, где изменились данные.
+if os.getenv('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.getenv('REDIS_URL'),
+        }
+    }
+
+RESPONSE_CACHE_SECONDS = int(os.getenv('RESPONSE_CACHE_SECONDS', 30))
+RESPONSE_CACHE_STALE_SECONDS = int(
+    os.getenv('RESPONSE_CACHE_STALE_SECONDS', 300)
+)
+RESPONSE_CACHE_LOCK_SECONDS = int(os.getenv('RESPONSE_CACHE_LOCK_SECONDS', 5))
+RESPONSE_CACHE_ALIAS = os.getenv('RESPONSE_CACHE_ALIAS', 'default')
+RESPONSE_CACHE_PATHS = (
+    r'^/api/tags/$',
+    r'^/api/recipes/$',
+    r'^/api/recipes/\d+/$',
+    r'^/api/recipe/[-\w]+/$',
+    r'^/api/recipes/\d+/similar/$',
+)
+
+INGREDIENT_CATALOG_DIR = os.getenv(
+    'INGREDIENT_CATALOG_DIR', STATIC_ROOT / 'catalog'
+)
+
+SIMILAR_RECIPES_LIMIT = int(os.getenv('SIMILAR_RECIPES_LIMIT', 6))
+SIMILAR_RECIPES_MAX_LIMIT = int(os.getenv('SIMILAR_RECIPES_MAX_LIMIT', 50))
+
+# Индексы рецептов в памяти процесса (похожие рецепты, поиск по продуктам).
+RECIPE_INDEX_REFRESH_SECONDS = float(
+    os.getenv('RECIPE_INDEX_REFRESH_SECONDS', 1)
+)
+RECIPE_INDEX_OVERLAP_SECONDS = int(
+    os.getenv('RECIPE_INDEX_OVERLAP_SECONDS', 10)
+)
+PANTRY_MAX_MISSING = int(os.getenv('PANTRY_MAX_MISSING', 2))
+PANTRY_MAX_MISSING_LIMIT = int(os.getenv('PANTRY_MAX_MISSING_LIMIT', 5))
+
+# Сколько объектов удаляет за раз действие админки «Удалить частями».
+ADMIN_DELETE_BATCH_SIZE = int(os.getenv('ADMIN_DELETE_BATCH_SIZE', 500))
+
+# Метрики Prometheus: снимки воркеров складываются в METRICS_DIR, который
+# нужно очищать при перезапуске сервиса.
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'True').lower() == 'true'
+METRICS_DIR = os.getenv(
+    'METRICS_DIR', os.path.join(tempfile.gettempdir(), 'foodgram-metrics')
+)
+METRICS_FLUSH_SECONDS = float(os.getenv('METRICS_FLUSH_SECONDS', 5))
+
+# Профилирование по заголовку X-Profile: 1 для сотрудников или подписанный
+# токен из manage.py profiling_token. Хранятся последние PROFILING_KEEP.
+PROFILING_DIR = os.getenv(
+    'PROFILING_DIR', os.path.join(tempfile.gettempdir(), 'foodgram-profiles')
+)
+PROFILING_KEEP = int(os.getenv('PROFILING_KEEP', 100))
+PROFILING_MAX_QUERIES = int(os.getenv('PROFILING_MAX_QUERIES', 2000))
+PROFILING_TOKEN_MAX_AGE = int(os.getenv('PROFILING_TOKEN_MAX_AGE', 3600))
+
+# Очередь отложенных задач (manage.py run_tasks).
+TASK_CONCURRENCY = int(os.getenv('TASK_CONCURRENCY', 2))
+TASK_POLL_SECONDS = float(os.getenv('TASK_POLL_SECONDS', 1))
+TASK_LEASE_SECONDS = int(os.getenv('TASK_LEASE_SECONDS', 300))
+TASK_RETRY_DELAY_SECONDS = int(os.getenv('TASK_RETRY_DELAY_SECONDS', 10))
+TASK_KEEP_DONE_SECONDS = int(os.getenv('TASK_KEEP_DONE_SECONDS', 86400))
+
+SHOPPING_LIST_CACHE_SECONDS = int(
+    os.getenv('SHOPPING_LIST_CACHE_SECONDS', 3600)
+)
+
+# manage.py warm_caches: что прогревать после выкладки.
+WARM_CACHE_PAGES = int(os.getenv('WARM_CACHE_PAGES', 3))
+WARM_CACHE_TOP_RECIPES = int(os.getenv('WARM_CACHE_TOP_RECIPES', 20))
+WARM_CACHE_THREADS = int(os.getenv('WARM_CACHE_THREADS', 4))
+WARM_CACHE_HOSTS = [
+    host for host in os.getenv('WARM_CACHE_HOSTS', ALLOWED_HOSTS[0]).split(',')
+    if host
+]
+
+# Поток событий /api/events/ (SSE, только под ASGI). Без Redis события
+# доходят лишь до клиентов того воркера, где создан рецепт.
+EVENTS_BACKEND = os.getenv(
+    'EVENTS_BACKEND',
+    'api.events.RedisBackend' if os.getenv('REDIS_URL')
+    else 'api.events.MemoryBackend'
+)
+EVENTS_REDIS_URL = os.getenv('EVENTS_REDIS_URL', os.getenv('REDIS_URL'))
+EVENTS_QUEUE_SIZE = int(os.getenv('EVENTS_QUEUE_SIZE', 100))
+EVENTS_HEARTBEAT_SECONDS = int(os.getenv('EVENTS_HEARTBEAT_SECONDS', 15))
+EVENTS_RETRY_SECONDS = int(os.getenv('EVENTS_RETRY_SECONDS', 5))
+EVENTS_TICKET_MAX_AGE = int(os.getenv('EVENTS_TICKET_MAX_AGE', 60))
+EVENTS_REPLAY_LIMIT = int(os.getenv('EVENTS_REPLAY_LIMIT', 50))
+EVENTS_MAX_CONNECTIONS = int(os.getenv('EVENTS_MAX_CONNECTIONS', 10000))
+
+# Почти одинаковые рецепты (recipes/duplicates.py). POLICY: off, warn —
+# id похожих рецептов в заголовке X-Duplicate-Recipes, reject — ошибка
+# 400. SCOPE: author — среди рецептов того же автора, all — среди всех.
+# DISTANCE — различающихся битов SimHash, не больше 3.
+DUPLICATE_RECIPE_POLICY = os.getenv('DUPLICATE_RECIPE_POLICY', 'warn')
+DUPLICATE_RECIPE_SCOPE = os.getenv('DUPLICATE_RECIPE_SCOPE', 'author')
+DUPLICATE_RECIPE_DISTANCE = int(os.getenv('DUPLICATE_RECIPE_DISTANCE', 3))
+# 3 — recipes.duplicates.MAX_DISTANCE: модуль нельзя импортировать до
+# загрузки приложений.
+if not 0 <= DUPLICATE_RECIPE_DISTANCE <= 3:
+    raise ImproperlyConfigured(
+        'DUPLICATE_RECIPE_DISTANCE должен быть от 0 до 3.'
+    )
+
+# ?ordering=trending (recipes/trending.py): вес добавления в избранное и
+# в список покупок и период, за который он уменьшается вдвое. После
+# изменения нужен manage.py rebuild_trending.
+TRENDING_FAVORITE_WEIGHT = float(os.getenv('TRENDING_FAVORITE_WEIGHT', 1))
+TRENDING_CART_WEIGHT = float(os.getenv('TRENDING_CART_WEIGHT', 2))
+TRENDING_HALF_LIFE_HOURS = float(os.getenv('TRENDING_HALF_LIFE_HOURS', 72))
+if min(TRENDING_FAVORITE_WEIGHT, TRENDING_CART_WEIGHT,
+       TRENDING_HALF_LIFE_HOURS) <= 0:
+    raise ImproperlyConfigured(
+        'TRENDING_FAVORITE_WEIGHT, TRENDING_CART_WEIGHT и '
+        'TRENDING_HALF_LIFE_HOURS должны быть больше нуля.'
+    )
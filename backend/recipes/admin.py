@@ -1,27 +1,141 @@
+from django.conf import settings
 from django.contrib import admin
+from django.contrib.admin.helpers import ACTION_CHECKBOX_NAME
 from django.contrib.auth.models import Group
-
+from django.core.exceptions import PermissionDenied
+from django.db import models, transaction
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.template.response import TemplateResponse
+from django.urls import path
+
+from .duplicates import duplicate_groups, update_fingerprint
 from .models import (Favorite, Ingredient, IngredientInRecipe, Recipe,
                      ShopList, Tag)
 
+DUPLICATE_GROUPS_SHOWN = 100
+
+
+def count_of(model, field):
+    """Число строк model, ссылающихся на объект через field.
+
+    Подзапрос вместо Count по join: несколько счётчиков в одном списке не
+    перемножают строки, а посчитаны они только для строк страницы.
+    """
+    return Coalesce(Subquery(
+        model.objects.filter(**{field: OuterRef('pk')}).order_by().values(
+            field
+        ).annotate(count=Count('pk')).values('count'),
+        output_field=IntegerField(),
+    ), 0)
+
+
+def delete_batched(queryset, batch_size):
+    """Удаляет объекты частями по batch_size, начиная с зависимых.
+
+    Каскадные зависимости (рецепты автора, ингредиенты рецептов) тоже
+    удаляются частями, поэтому в памяти никогда не оказывается весь
+    каскад. Сигналы post_delete срабатывают как обычно. Каждая часть —
+    своя транзакция, поэтому прерванное удаление не откатывается целиком.
+    """
+    model = queryset.model
+    ids = list(queryset.order_by().values_list('pk', flat=True))
+    deleted = 0
+    for start in range(0, len(ids), batch_size):
+        batch = ids[start:start + batch_size]
+        for relation in model._meta.related_objects:
+            if relation.many_to_many or relation.on_delete != models.CASCADE:
+                continue
+            deleted += delete_batched(
+                relation.related_model._base_manager.filter(
+                    **{f'{relation.field.name}__in': batch}
+                ),
+                batch_size
+            )
+        with transaction.atomic():
+            deleted += model._base_manager.filter(pk__in=batch).delete()[0]
+    return deleted
+
+
+@admin.action(
+    description='Удалить выбранные объекты частями',
+    permissions=['delete'],
+)
+def delete_in_batches(modeladmin, request, queryset):
+    """Замена delete_selected, которая не собирает каскад целиком.
+
+    Страница подтверждения показывает только число объектов, а не
+    список всего, что удалится вместе с ними.
+    """
+    if request.POST.get('post'):
+        deleted = delete_batched(queryset, settings.ADMIN_DELETE_BATCH_SIZE)
+        modeladmin.message_user(request, f'Удалено объектов: {deleted}.')
+        return None
+    opts = modeladmin.model._meta
+    select_across = request.POST.get('select_across') in ('1', 'True')
+    return TemplateResponse(request, 'admin/delete_in_batches.html', {
+        **modeladmin.admin_site.each_context(request),
+        'title': 'Удаление частями',
+        'opts': opts,
+        'count': queryset.count(),
+        'select_across': int(select_across),
+        # При select_across отмечена только текущая страница, но без
+        # отмеченных строк админка действие не запустит.
+        'selected': request.POST.getlist(ACTION_CHECKBOX_NAME),
+        'action_checkbox_name': ACTION_CHECKBOX_NAME,
+    })
+
+
+class ScalableAdmin(admin.ModelAdmin):
+    """Список без полного COUNT(*) и удаление частями."""
+    actions = (delete_in_batches,)
+    show_full_result_count = False
+
+    def get_actions(self, request):
+        actions = super().get_actions(request)
+        actions.pop('delete_selected', None)
+        return actions
+
 
 class IngredientsInLine(admin.TabularInline):
     model = Recipe.ingredients.through
+    autocomplete_fields = ('ingredient',)
+    extra = 1
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related(
+            'recipe', 'ingredient'
+        )
+
+
+class TagsInLine(admin.TabularInline):
+    model = Recipe.tags.through
+    extra = 1
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('recipe', 'tag')
 
 
-class IngredientAdmin(admin.ModelAdmin):
+class IngredientAdmin(ScalableAdmin):
     """Ингредиенты"""
     list_display = ('pk', 'name', 'measurement_unit')
+    search_fields = ('name',)
 
 
-class IngredienInRecipeAdmin(admin.ModelAdmin):
+class IngredienInRecipeAdmin(ScalableAdmin):
     """Ингредиенты в рецептах"""
     list_display = ('recipe', 'ingredient', 'amount')
+    list_select_related = ('recipe', 'ingredient')
+    autocomplete_fields = ('recipe', 'ingredient')
+    search_fields = ('recipe__name', 'ingredient__name')
 
 
-class FavoriteAdmin(admin.ModelAdmin):
+class FavoriteAdmin(ScalableAdmin):
     """Избранные пельмени"""
     list_display = ('user', 'recipe')
+    list_select_related = ('user', 'recipe')
+    autocomplete_fields = ('user', 'recipe')
+    search_fields = ('user__username', 'recipe__name')
 
 
 class TagAdmin(admin.ModelAdmin):
@@ -29,19 +143,65 @@ class TagAdmin(admin.ModelAdmin):
     list_display = ('pk', 'name', 'slug')
 
 
-class RecipeAdmin(admin.ModelAdmin):
+class RecipeAdmin(ScalableAdmin):
     """Рецепты"""
     list_display = (
-        'name', 'author', 'pub_date',
+        'name', 'author', 'pub_date', 'favorites',
     )
-    list_filter = ('name', 'author',)
-    search_fields = ('name',)
-    inlines = (IngredientsInLine,)
-
-
-class ShopListAdmin(admin.ModelAdmin):
+    list_select_related = ('author',)
+    list_filter = ('tags', 'pub_date')
+    search_fields = ('name', 'author__username')
+    autocomplete_fields = ('author',)
+    inlines = (IngredientsInLine, TagsInLine)
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(
+            favorites_count=count_of(Favorite, 'recipe')
+        )
+
+    @admin.display(description='В избранном', ordering='favorites_count')
+    def favorites(self, obj):
+        return obj.favorites_count
+
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        # Ингредиенты из inline сохраняются после рецепта.
+        update_fingerprint(form.instance)
+
+    def get_urls(self):
+        return [
+            path('duplicates/',
+                 self.admin_site.admin_view(self.duplicates_view),
+                 name='recipes_recipe_duplicates'),
+        ] + super().get_urls()
+
+    def duplicates_view(self, request):
+        """Отчёт: группы почти одинаковых рецептов, крупные первыми."""
+        if not self.has_view_permission(request):
+            raise PermissionDenied
+        groups = duplicate_groups(settings.DUPLICATE_RECIPE_DISTANCE)
+        shown = groups[:DUPLICATE_GROUPS_SHOWN]
+        recipes = Recipe.objects.select_related('author').in_bulk(
+            [pk for group in shown for pk in group]
+        )
+        return TemplateResponse(
+            request, 'admin/recipes/recipe/duplicates.html', {
+                **self.admin_site.each_context(request),
+                'title': 'Похожие рецепты',
+                'opts': self.model._meta,
+                'groups': [[recipes[pk] for pk in group if pk in recipes]
+                           for group in shown],
+                'total': len(groups),
+            }
+        )
+
+
+class ShopListAdmin(ScalableAdmin):
     """Покупки"""
-    list_display = ('user', 'recipe')
+    list_display = ('user', 'recipe', 'multiplier')
+    list_select_related = ('user', 'recipe')
+    autocomplete_fields = ('user', 'recipe')
+    search_fields = ('user__username', 'recipe__name')
 
 
 admin.site.register(Ingredient, IngredientAdmin)
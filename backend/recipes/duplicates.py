@@ -0,0 +1,147 @@
+"""Поиск почти одинаковых рецептов по отпечатку SimHash.
+
+Отпечаток — 64-битный SimHash признаков рецепта: id ингредиентов (без
+количеств) и триграмм нормализованного названия. У почти одинаковых
+рецептов отпечатки отличаются в нескольких битах. Отпечаток разбит на
+четыре 16-битные полосы, каждая в своём индексированном столбце: если
+отпечатки различаются не больше чем в трёх битах, хотя бы одна полоса у
+них совпадает целиком. Поэтому кандидаты находятся поиском по индексам,
+а точное расстояние считается только для них.
+"""
+import re
+from hashlib import blake2b
+from itertools import combinations, groupby
+from operator import itemgetter
+
+from django.db.models import Count, Q
+
+from .models import IngredientInRecipe, Recipe
+
+BITS = 64
+BANDS = 4
+BAND_BITS = BITS // BANDS
+BAND_MASK = (1 << BAND_BITS) - 1
+# Больше расстояние не гарантирует совпадения хотя бы одной полосы.
+MAX_DISTANCE = BANDS - 1
+INGREDIENT_WEIGHT = 2
+CANDIDATE_LIMIT = 200
+
+
+def normalize_name(name):
+    """Название без регистра, ё, знаков препинания и лишних пробелов."""
+    return ' '.join(re.findall(r'\w+', name.lower().replace('ё', 'е')))
+
+
+def features(name, ingredient_ids):
+    padded = f' {normalize_name(name)} '
+    for start in range(len(padded) - 2):
+        yield f'n:{padded[start:start + 3]}', 1
+    for ingredient_id in sorted(set(ingredient_ids)):
+        yield f'i:{ingredient_id}', INGREDIENT_WEIGHT
+
+
+def simhash(name, ingredient_ids):
+    """64-битный отпечаток рецепта со знаком, как в BigIntegerField."""
+    totals = [0] * BITS
+    for feature, weight in features(name, ingredient_ids):
+        digest = int.from_bytes(
+            blake2b(feature.encode(), digest_size=BITS // 8).digest(), 'big'
+        )
+        for bit in range(BITS):
+            totals[bit] += weight if digest >> bit & 1 else -weight
+    value = sum(1 << bit for bit, total in enumerate(totals) if total > 0)
+    return value - (1 << BITS) if value >> (BITS - 1) else value
+
+
+def fingerprint_fields(name, ingredient_ids):
+    """Значения полей отпечатка для Recipe."""
+    value = simhash(name, ingredient_ids)
+    fields = {'fingerprint': value}
+    for band in range(BANDS):
+        fields[f'fingerprint_band{band}'] = (
+            value >> band * BAND_BITS & BAND_MASK
+        )
+    return fields
+
+
+def distance(first, second):
+    return bin((first ^ second) & ((1 << BITS) - 1)).count('1')
+
+
+def find_duplicates(fields, queryset=None, max_distance=MAX_DISTANCE):
+    """id рецептов из queryset с отпечатком не дальше max_distance.
+
+    fields — результат fingerprint_fields.
+    """
+    if queryset is None:
+        queryset = Recipe.objects.all()
+    bands = Q()
+    for band in range(BANDS):
+        name = f'fingerprint_band{band}'
+        bands |= Q(**{name: fields[name]})
+    candidates = queryset.filter(bands).order_by().values_list(
+        'pk', 'fingerprint'
+    )[:CANDIDATE_LIMIT]
+    return sorted(
+        pk for pk, fingerprint in candidates
+        if distance(fields['fingerprint'], fingerprint) <= max_distance
+    )
+
+
+def update_fingerprint(recipe):
+    """Пересчитывает отпечаток по ингредиентам рецепта в базе."""
+    fields = fingerprint_fields(recipe.name, IngredientInRecipe.objects.filter(
+        recipe=recipe
+    ).values_list('ingredient_id', flat=True))
+    Recipe.objects.filter(pk=recipe.pk).update(**fields)
+    for name, value in fields.items():
+        setattr(recipe, name, value)
+
+
+def duplicate_groups(max_distance=MAX_DISTANCE):
+    """Группы почти одинаковых рецептов (списки id), крупные первыми.
+
+    Для каждой полосы берутся только значения, общие для нескольких
+    рецептов, и внутри них сравниваются различные отпечатки.
+    """
+    parent = {}
+
+    def find(pk):
+        parent.setdefault(pk, pk)
+        while parent[pk] != pk:
+            parent[pk] = parent[parent[pk]]
+            pk = parent[pk]
+        return pk
+
+    def union(first, second):
+        parent[find(first)] = find(second)
+
+    for band in range(BANDS):
+        column = f'fingerprint_band{band}'
+        shared = Recipe.objects.filter(fingerprint__isnull=False).values(
+            column
+        ).annotate(count=Count('pk')).filter(count__gt=1).values(column)
+        rows = Recipe.objects.filter(**{f'{column}__in': shared}).order_by(
+            column
+        ).values_list(column, 'fingerprint', 'pk')
+        for _, group in groupby(rows.iterator(), key=itemgetter(0)):
+            # Одинаковые отпечатки объединяются сразу, сравниваются
+            # только различные.
+            representatives = {}
+            for _, fingerprint, pk in group:
+                if fingerprint in representatives:
+                    union(pk, representatives[fingerprint])
+                else:
+                    representatives[fingerprint] = pk
+            for (first, first_pk), (second, second_pk) in combinations(
+                representatives.items(), 2
+            ):
+                if distance(first, second) <= max_distance:
+                    union(first_pk, second_pk)
+    groups = {}
+    for pk in parent:
+        groups.setdefault(find(pk), []).append(pk)
+    return sorted(
+        (sorted(group) for group in groups.values() if len(group) > 1),
+        key=lambda group: (-len(group), group[0]),
+    )
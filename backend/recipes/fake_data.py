@@ -0,0 +1,77 @@
+"""Генерация синтетических рецептов для бенчмарков.
+
+Данные создаются bulk_create и предназначены для запуска внутри
+транзакции, которая затем откатывается.
+"""
+import itertools
+import random
+
+import shortuuid
+
+from users.models import User
+from .models import Ingredient, IngredientInRecipe, Recipe, RecipeTag, Tag
+
+BATCH_SIZE = 5000
+
+
+def create_fake_recipes(recipes, tags=20, tags_per_recipe=3,
+                        ingredients=2000, ingredients_per_recipe=8,
+                        authors=100, ingredient_skew=0.0, seed=0):
+    """ingredient_skew > 0 делает частоты ингредиентов ципфовскими:
+    как в жизни, соль и мука встречаются намного чаще остального.
+    """
+    rng = random.Random(seed)
+    prefix = shortuuid.uuid()[:8]
+    author_objs = User.objects.bulk_create([
+        User(username=f'{prefix}-cook{n}', email=f'{prefix}{n}@bench.local',
+             first_name='Bench', last_name='Cook')
+        for n in range(authors)
+    ])
+    tag_objs = Tag.objects.bulk_create([
+        Tag(name=f'{prefix} tag {n}', slug=f'{prefix}-tag-{n}')
+        for n in range(tags)
+    ])
+    ingredient_objs = list(Ingredient.objects.all()[:ingredients])
+    missing = ingredients - len(ingredient_objs)
+    if missing > 0:
+        ingredient_objs += Ingredient.objects.bulk_create([
+            Ingredient(name=f'{prefix} ингредиент {n}', measurement_unit='г')
+            for n in range(missing)
+        ])
+    recipe_objs = Recipe.objects.bulk_create([
+        Recipe(author=rng.choice(author_objs), name=f'Рецепт {n}',
+               image='media_imgs/recipes/bench.png', text='bench',
+               cooking_time=rng.randint(1, 180),
+               slug=f'{prefix}{n}')
+        for n in range(recipes)
+    ], batch_size=BATCH_SIZE)
+    RecipeTag.objects.bulk_create([
+        RecipeTag(recipe=recipe, tag=tag)
+        for recipe in recipe_objs
+        for tag in rng.sample(tag_objs, min(tags_per_recipe, len(tag_objs)))
+    ], batch_size=BATCH_SIZE)
+    per_recipe = min(ingredients_per_recipe, len(ingredient_objs))
+    weights = None
+    if ingredient_skew:
+        weights = list(itertools.accumulate(
+            1 / (rank + 1) ** ingredient_skew
+            for rank in range(len(ingredient_objs))
+        ))
+
+    def pick_ingredients():
+        if weights is None:
+            return rng.sample(ingredient_objs, per_recipe)
+        picked = set()
+        while len(picked) < per_recipe:
+            picked.update(rng.choices(ingredient_objs, cum_weights=weights,
+                                      k=per_recipe - len(picked)))
+        return picked
+
+    IngredientInRecipe.objects.bulk_create([
+        IngredientInRecipe(recipe=recipe, ingredient=ingredient,
+                           amount=rng.randint(1, 700))
+        for recipe in recipe_objs
+        for ingredient in pick_ingredients()
+    ], batch_size=BATCH_SIZE)
+    return {'authors': author_objs, 'tags': tag_objs,
+            'ingredients': ingredient_objs, 'recipes': recipe_objs}
@@ -0,0 +1,124 @@
+"""Общая часть индексов рецептов, которые живут в памяти процесса.
+
+Индекс строится при первом запросе и дальше догоняет базу по
+Recipe.modified и надгробиям удалённых рецептов, так что изменения из
+других процессов тоже до него доходят. request_rebuild заставляет все
+процессы построить свои индексы заново.
+"""
+import threading
+import time
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from .models import IngredientInRecipe, Recipe, RecipeTag, Tombstone
+
+VERSION_KEY = 'recipe-index-version'
+
+
+def request_rebuild():
+    """Просит все процессы заново построить индексы при следующем запросе."""
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.set(VERSION_KEY, 1, None)
+
+
+def related_sets(model, field, recipe_ids=None):
+    """{id рецепта: frozenset id связанных объектов} для model."""
+    rows = model.objects.values_list('recipe_id', field)
+    if recipe_ids is not None:
+        rows = rows.filter(recipe_id__in=recipe_ids)
+    sets = defaultdict(set)
+    for recipe_id, related_id in rows.iterator(chunk_size=10000):
+        sets[recipe_id].add(related_id)
+    return {recipe_id: frozenset(ids) for recipe_id, ids in sets.items()}
+
+
+def ingredient_sets(recipe_ids=None):
+    return related_sets(IngredientInRecipe, 'ingredient_id', recipe_ids)
+
+
+def tag_sets(recipe_ids=None):
+    return related_sets(RecipeTag, 'tag_id', recipe_ids)
+
+
+class RecipeIndex:
+    """Основа индекса: построение, догоняющее обновление, блокировка.
+
+    Наследники задают load (данные рецептов из базы), put, remove и
+    reset; bulk_put можно переопределить для быстрого построения.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.version = None
+        self.since = None
+        self.checked = 0.0
+        self.reset()
+
+    def reset(self):
+        raise NotImplementedError
+
+    def load(self, recipe_ids=None):
+        raise NotImplementedError
+
+    def put(self, recipe_id, data):
+        raise NotImplementedError
+
+    def remove(self, recipe_id):
+        raise NotImplementedError
+
+    def bulk_put(self, items):
+        for recipe_id, data in items.items():
+            self.put(recipe_id, data)
+
+    def rebuild(self):
+        """Строит индекс целиком; вызывается под self.lock."""
+        started = timezone.now()
+        self.reset()
+        self.bulk_put(self.load())
+        self.since = started
+
+    def catch_up(self):
+        """Перечитывает рецепты, изменённые или удалённые с прошлой проверки.
+
+        Окно перекрывается на RECIPE_INDEX_OVERLAP_SECONDS: транзакция
+        могла записать modified раньше, а зафиксироваться позже.
+        """
+        started = timezone.now()
+        since = self.since - timedelta(
+            seconds=settings.RECIPE_INDEX_OVERLAP_SECONDS
+        )
+        changed = list(Recipe.objects.filter(
+            modified__gte=since
+        ).values_list('id', flat=True))
+        deleted = Tombstone.objects.filter(
+            kind=Tombstone.RECIPE, deleted__gte=since
+        ).values_list('object_id', flat=True)
+        for recipe_id in deleted:
+            self.remove(recipe_id)
+        if changed:
+            items = self.load(changed)
+            for recipe_id in changed:
+                if recipe_id in items:
+                    self.put(recipe_id, items[recipe_id])
+                else:
+                    self.remove(recipe_id)
+        self.since = started
+
+    def refresh(self):
+        """Не чаще раза в RECIPE_INDEX_REFRESH_SECONDS сверяется с базой."""
+        now = time.monotonic()
+        if now - self.checked < settings.RECIPE_INDEX_REFRESH_SECONDS:
+            return
+        version = cache.get(VERSION_KEY, 0)
+        if version != self.version or self.since is None:
+            self.rebuild()
+            self.version = version
+        else:
+            self.catch_up()
+        self.checked = now
@@ -0,0 +1,43 @@
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand
+
+from recipes.duplicates import fingerprint_fields
+from recipes.models import IngredientInRecipe, Recipe
+
+FIELDS = ('fingerprint', 'fingerprint_band0', 'fingerprint_band1',
+          'fingerprint_band2', 'fingerprint_band3')
+
+
+class Command(BaseCommand):
+    help = ('computing duplicate-detection fingerprints for recipes '
+            'that have none, or for every recipe with --all')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true',
+                            help='пересчитать и уже посчитанные')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.order_by('pk').only('pk', 'name')
+        if not options['all']:
+            recipes = recipes.filter(fingerprint__isnull=True)
+        done = last = 0
+        while True:
+            batch = list(recipes.filter(pk__gt=last)[:options['batch_size']])
+            if not batch:
+                break
+            last = batch[-1].pk
+            ingredients = defaultdict(list)
+            for recipe_id, ingredient_id in IngredientInRecipe.objects.filter(
+                recipe__in=batch
+            ).values_list('recipe_id', 'ingredient_id'):
+                ingredients[recipe_id].append(ingredient_id)
+            for recipe in batch:
+                for name, value in fingerprint_fields(
+                    recipe.name, ingredients[recipe.pk]
+                ).items():
+                    setattr(recipe, name, value)
+            Recipe.objects.bulk_update(batch, FIELDS)
+            done += len(batch)
+        self.stdout.write(f'Посчитано отпечатков: {done}')
@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from recipes.indexes import request_rebuild
+from recipes.pantry import PantryIndex
+from recipes.similarity import SimilarityIndex
+
+
+class Command(BaseCommand):
+    help = ('rebuilding the in-memory recipe indexes (similar recipes, '
+            'pantry search) from scratch; running processes rebuild theirs '
+            'on the next request')
+
+    def handle(self, *args, **options):
+        for name, index in (('similar', SimilarityIndex()),
+                            ('pantry', PantryIndex())):
+            start = time.perf_counter()
+            with index.lock:
+                index.rebuild()
+            self.stdout.write(
+                f'{name}: {len(index)} recipes '
+                f'in {time.perf_counter() - start:.2f} s'
+            )
+        request_rebuild()
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from recipes.trending import recompute_scores
+
+
+class Command(BaseCommand):
+    help = ('recomputing trending scores of all recipes from favorites and '
+            'shopping carts, e.g. after changing the weights or half-life')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        changed = recompute_scores(options['batch_size'])
+        self.stdout.write(f'Изменено оценок: {changed}')
@@ -0,0 +1,20 @@
+# Generated by Django 4.2.13 on 2026-10-19 08:34
+
+from decimal import Decimal
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0007_hot_lookup_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='shoplist',
+            name='multiplier',
+            field=models.DecimalField(decimal_places=2, default=1, max_digits=5, validators=[django.core.validators.MinValueValidator(Decimal('0.1')), django.core.validators.MaxValueValidator(Decimal('100'))], verbose_name='Множитель порций'),
+        ),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 4.2.13 on 2026-10-19 08:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0008_shoplist_multiplier'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='fingerprint',
+            field=models.BigIntegerField(blank=True, editable=False, null=True, verbose_name='Отпечаток'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='fingerprint_band0',
+            field=models.IntegerField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='fingerprint_band1',
+            field=models.IntegerField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='fingerprint_band2',
+            field=models.IntegerField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='fingerprint_band3',
+            field=models.IntegerField(editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['fingerprint_band0'], name='recipe_fingerprint_band0_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['fingerprint_band1'], name='recipe_fingerprint_band1_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['fingerprint_band2'], name='recipe_fingerprint_band2_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['fingerprint_band3'], name='recipe_fingerprint_band3_idx'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 4.2.13 on 2026-10-19 12:00
+
+from django.db import migrations, models
+from django.db.models import F
+import django.utils.timezone
+
+
+def copy_modified(apps, schema_editor):
+    # Для старых записей дата добавления неизвестна, ближе всего modified.
+    for name in ('Favorite', 'ShopList'):
+        apps.get_model('recipes', name).objects.update(created=F('modified'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0010_recipe_trending_score'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='favorite',
+            name='created',
+            field=models.DateTimeField(auto_now_add=True, default=django.utils.timezone.now, verbose_name='Дата добавления'),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='shoplist',
+            name='created',
+            field=models.DateTimeField(auto_now_add=True, default=django.utils.timezone.now, verbose_name='Дата добавления'),
+            preserve_default=False,
+        ),
+        migrations.RunPython(copy_modified, migrations.RunPython.noop),
+    ]
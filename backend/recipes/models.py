@@ -1,3 +1,5 @@
+from decimal import Decimal
+
 import shortuuid
 from django.core.validators import MaxValueValidator, MinValueValidator
 from django.db import models
@@ -84,6 +86,7 @@ class Recipe(models.Model):
     )
     tags = models.ManyToManyField(
         Tag,
+        through='RecipeTag',
         related_name='recipes',
         blank=False
     )
@@ -107,11 +110,50 @@ class Recipe(models.Model):
         unique=True,
         blank=True,
     )
+    modified = models.DateTimeField(
+        'Дата изменения',
+        auto_now=True,
+    )
+    # SimHash названия и ингредиентов, см. recipes/duplicates.py.
+    fingerprint = models.BigIntegerField(
+        'Отпечаток',
+        null=True,
+        blank=True,
+        editable=False,
+    )
+    fingerprint_band0 = models.IntegerField(null=True, editable=False)
+    fingerprint_band1 = models.IntegerField(null=True, editable=False)
+    fingerprint_band2 = models.IntegerField(null=True, editable=False)
+    fingerprint_band3 = models.IntegerField(null=True, editable=False)
+    # Популярность с затуханием, см. recipes/trending.py.
+    trending_score = models.FloatField(
+        'Популярность',
+        default=0,
+        editable=False,
+    )
 
     class Meta:
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
         ordering = ['-pub_date']
+        indexes = [
+            models.Index(fields=['modified', 'id'],
+                         name='recipe_modified_idx'),
+            models.Index(fields=['-pub_date'],
+                         name='recipe_pub_date_idx'),
+            models.Index(fields=['author', '-pub_date'],
+                         name='recipe_author_pub_date_idx'),
+            models.Index(fields=['fingerprint_band0'],
+                         name='recipe_fingerprint_band0_idx'),
+            models.Index(fields=['fingerprint_band1'],
+                         name='recipe_fingerprint_band1_idx'),
+            models.Index(fields=['fingerprint_band2'],
+                         name='recipe_fingerprint_band2_idx'),
+            models.Index(fields=['fingerprint_band3'],
+                         name='recipe_fingerprint_band3_idx'),
+            models.Index(fields=['-trending_score', '-id'],
+                         name='recipe_trending_idx'),
+        ]
 
     def save(self, *args, **kwargs):
         if not self.slug:
@@ -122,6 +164,34 @@ class Recipe(models.Model):
         return self.name
 
 
+class RecipeTag(models.Model):
+    """Связь рецепта и тэга."""
+    # Таблица досталась от автоматически созданной связи: её id был
+    # BigAutoField по DEFAULT_AUTO_FIELD, тип столбца не меняется.
+    id = models.BigAutoField(primary_key=True)
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+    )
+    tag = models.ForeignKey(
+        Tag,
+        on_delete=models.CASCADE,
+    )
+
+    class Meta:
+        db_table = 'recipes_recipe_tags'
+        verbose_name = 'Тэг рецепта'
+        verbose_name_plural = 'Тэги рецептов'
+        unique_together = ('recipe', 'tag')
+        indexes = [
+            models.Index(fields=['tag', 'recipe'],
+                         name='recipe_tag_tag_recipe_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.tag.name} у рецепта {self.recipe.name}'
+
+
 class IngredientInRecipe(models.Model):
     """Связь рецепта и ингредиентов."""
     recipe = models.ForeignKey(
@@ -151,6 +221,10 @@ class IngredientInRecipe(models.Model):
                 fields=['recipe', 'ingredient'],
                 name="unique_ingredient_in_recipe")
         ]
+        indexes = [
+            models.Index(fields=['ingredient', 'recipe'],
+                         name='ingredient_recipe_idx'),
+        ]
 
     def __str__(self):
         return f'{self.ingredient.name} в рецепте {self.recipe.name}'
@@ -168,6 +242,14 @@ class Favorite(models.Model):
         on_delete=models.CASCADE,
         related_name='Favorite',
     )
+    created = models.DateTimeField(
+        'Дата добавления',
+        auto_now_add=True,
+    )
+    modified = models.DateTimeField(
+        'Дата изменения',
+        auto_now=True,
+    )
 
     class Meta:
         verbose_name = 'Избранный рецепт'
@@ -175,6 +257,12 @@ class Favorite(models.Model):
         constraints = [
             UniqueConstraint(fields=['user', 'recipe'], name='unique_favorite')
         ]
+        indexes = [
+            models.Index(fields=['user', 'modified', 'id'],
+                         name='favorite_user_modified_idx'),
+            models.Index(fields=['recipe', 'user'],
+                         name='favorite_recipe_user_idx'),
+        ]
 
     def __str__(self):
         return f'{self.recipe.name} в избранном {self.user.username}'
@@ -191,6 +279,24 @@ class ShopList(models.Model):
         Recipe,
         related_name='shopping_cart',
         on_delete=models.CASCADE)
+    multiplier = models.DecimalField(
+        'Множитель порций',
+        max_digits=5,
+        decimal_places=2,
+        default=1,
+        validators=[
+            MinValueValidator(Decimal('0.1')),
+            MaxValueValidator(Decimal('100'))
+        ]
+    )
+    created = models.DateTimeField(
+        'Дата добавления',
+        auto_now_add=True,
+    )
+    modified = models.DateTimeField(
+        'Дата изменения',
+        auto_now=True,
+    )
 
     class Meta:
         verbose_name = 'Рецепт в списке покупок'
@@ -199,6 +305,52 @@ class ShopList(models.Model):
             UniqueConstraint(fields=['user', 'recipe'],
                              name='unique_shopping_cart')
         ]
+        indexes = [
+            models.Index(fields=['user', 'modified', 'id'],
+                         name='shoplist_user_modified_idx'),
+            models.Index(fields=['recipe', 'user'],
+                         name='shoplist_recipe_user_idx'),
+        ]
 
     def __str__(self):
         return f'{self.recipe.name} в списке покупок у {self.user.username}'
+
+
+class Tombstone(models.Model):
+    """Отметка об удалении объекта для инкрементальной синхронизации."""
+    RECIPE = 'recipe'
+    FAVORITE = 'favorite'
+    SHOPPING_CART = 'shopping_cart'
+    KINDS = (
+        (RECIPE, 'Рецепт'),
+        (FAVORITE, 'Избранное'),
+        (SHOPPING_CART, 'Список покупок'),
+    )
+
+    kind = models.CharField(
+        'Тип объекта',
+        max_length=20,
+        choices=KINDS,
+    )
+    object_id = models.BigIntegerField('ID рецепта')
+    # Не внешний ключ: отметки переживают каскадное удаление пользователя.
+    user_id = models.BigIntegerField(
+        'ID пользователя',
+        null=True,
+        blank=True,
+    )
+    deleted = models.DateTimeField(
+        'Дата удаления',
+        auto_now_add=True,
+    )
+
+    class Meta:
+        verbose_name = 'Удалённый объект'
+        verbose_name_plural = 'Удалённые объекты'
+        indexes = [
+            models.Index(fields=['user_id', 'deleted', 'id'],
+                         name='tombstone_user_deleted_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.kind} {self.object_id}'
@@ -0,0 +1,261 @@
+"""Поиск «что приготовить» по имеющимся продуктам.
+
+Каждому рецепту выдаётся слот — номер бита. Для популярных ингредиентов
+список рецептов хранится битовой маской (int), для редких — множеством
+слотов: плотная маска на каждый из тысяч ингредиентов заняла бы слишком
+много памяти. Число общих с запросом ингредиентов считается сразу для
+всех рецептов поразрядно: счётчик хранится «срезами» — k-я маска
+содержит k-й бит счётчика каждого рецепта. Так же хранятся размеры
+рецептов, и число недостающих ингредиентов получается вычитанием
+срезов, без перебора рецептов в Python.
+"""
+from collections import Counter, defaultdict
+from functools import reduce
+from operator import or_
+
+from .indexes import RecipeIndex, ingredient_sets, tag_sets
+
+# Список рецептов ингредиента хранится маской, если он длиннее
+# 1/DENSE_RATIO всех слотов: тогда маска не больше множества.
+DENSE_RATIO = 32
+
+
+def to_bitset(slots, size):
+    bits = bytearray((size + 7) // 8)
+    for slot in slots:
+        bits[slot >> 3] |= 1 << (slot & 7)
+    return int.from_bytes(bits, 'little')
+
+
+def counts_to_planes(counts, size):
+    """Срезы счётчиков из словаря {слот: значение}."""
+    if not counts:
+        return []
+    planes = [bytearray((size + 7) // 8)
+              for _ in range(max(counts.values()).bit_length())]
+    for slot, value in counts.items():
+        for plane in planes:
+            if value & 1:
+                plane[slot >> 3] |= 1 << (slot & 7)
+            value >>= 1
+    return [int.from_bytes(plane, 'little') for plane in planes]
+
+
+def add_planes(first, second):
+    """Поразрядная сумма двух счётчиков в срезах."""
+    result, carry = [], 0
+    for index in range(max(len(first), len(second))):
+        x = first[index] if index < len(first) else 0
+        y = second[index] if index < len(second) else 0
+        result.append(x ^ y ^ carry)
+        carry = (x & y) | (carry & (x ^ y))
+    if carry:
+        result.append(carry)
+    return result
+
+
+def subtract_planes(first, second):
+    """Поразрядная разность счётчиков; first не меньше second."""
+    result, borrow = [], 0
+    for index in range(len(first)):
+        x = first[index]
+        y = second[index] if index < len(second) else 0
+        result.append(x ^ y ^ borrow)
+        borrow = (~x & y) | (~(x ^ y) & borrow)
+    return result
+
+
+def equal_to(planes, value, mask):
+    """Маска слотов из mask, у которых счётчик равен value."""
+    if value >> len(planes):
+        return 0
+    for index, plane in enumerate(planes):
+        mask &= plane if value >> index & 1 else ~plane
+    return mask
+
+
+def popcount(mask):
+    return bin(mask).count('1')
+
+
+def iter_slots(mask):
+    """Слоты маски от старших к младшим, то есть от новых к старым."""
+    while mask:
+        slot = mask.bit_length() - 1
+        yield slot
+        mask ^= 1 << slot
+
+
+class PantryMatches:
+    """Найденные рецепты в порядке ранжирования; режется лениво.
+
+    Подходит для Paginator: len() — по числу бит в масках, срез
+    достаёт id рецептов только нужной страницы.
+    """
+
+    def __init__(self, groups, slots):
+        self.groups = [(missing, mask, popcount(mask))
+                       for missing, mask in groups if mask]
+        self.slots = slots
+
+    def __len__(self):
+        return sum(count for _, _, count in self.groups)
+
+    def __getitem__(self, item):
+        start, stop, _ = item.indices(len(self))
+        found = []
+        for missing, mask, count in self.groups:
+            if start >= count:
+                start, stop = start - count, stop - count
+                continue
+            for position, slot in enumerate(iter_slots(mask)):
+                if position >= stop:
+                    break
+                if position >= start:
+                    found.append((self.slots[slot], missing))
+            if stop <= count:
+                break
+            start, stop = 0, stop - count
+        return found
+
+
+class PantryIndex(RecipeIndex):
+    """Индекс «ингредиент → рецепты» и «тэг → рецепты» на битовых масках."""
+
+    def reset(self):
+        self.slots = []
+        self.slot_of = {}
+        self.ingredients = {}
+        self.tags = {}
+        self.dense = {}
+        self.sparse = defaultdict(set)
+        self.tag_bits = defaultdict(int)
+        self.size_planes = []
+
+    def __len__(self):
+        return len(self.ingredients)
+
+    def load(self, recipe_ids=None):
+        ingredients = ingredient_sets(recipe_ids)
+        tags = tag_sets(recipe_ids)
+        return {
+            recipe_id: (recipe_ingredients, tags.get(recipe_id, frozenset()))
+            for recipe_id, recipe_ingredients in ingredients.items()
+        }
+
+    def bulk_put(self, items):
+        postings = defaultdict(list)
+        tag_postings = defaultdict(list)
+        sizes = {}
+        for recipe_id in sorted(items):
+            ingredients, tags = items[recipe_id]
+            slot = len(self.slots)
+            self.slots.append(recipe_id)
+            self.slot_of[recipe_id] = slot
+            self.ingredients[recipe_id] = ingredients
+            self.tags[recipe_id] = tags
+            sizes[slot] = len(ingredients)
+            for ingredient_id in ingredients:
+                postings[ingredient_id].append(slot)
+            for tag_id in tags:
+                tag_postings[tag_id].append(slot)
+        total = len(self.slots)
+        for ingredient_id, slots in postings.items():
+            if len(slots) * DENSE_RATIO > total:
+                self.dense[ingredient_id] = to_bitset(slots, total)
+            else:
+                self.sparse[ingredient_id] = set(slots)
+        for tag_id, slots in tag_postings.items():
+            self.tag_bits[tag_id] = to_bitset(slots, total)
+        self.size_planes = counts_to_planes(sizes, total)
+
+    def put(self, recipe_id, data):
+        self.remove(recipe_id)
+        ingredients, tags = data
+        slot = self.slot_of.get(recipe_id)
+        if slot is None:
+            slot = len(self.slots)
+            self.slots.append(recipe_id)
+            self.slot_of[recipe_id] = slot
+        bit = 1 << slot
+        self.ingredients[recipe_id] = ingredients
+        self.tags[recipe_id] = tags
+        for ingredient_id in ingredients:
+            if ingredient_id in self.dense:
+                self.dense[ingredient_id] |= bit
+            else:
+                self.sparse[ingredient_id].add(slot)
+        for tag_id in tags:
+            self.tag_bits[tag_id] |= bit
+        size = len(ingredients)
+        while size >> len(self.size_planes):
+            self.size_planes.append(0)
+        for index in range(len(self.size_planes)):
+            if size >> index & 1:
+                self.size_planes[index] |= bit
+
+    def remove(self, recipe_id):
+        """Снимает биты рецепта; слот остаётся за ним до перестроения."""
+        if recipe_id not in self.ingredients:
+            return
+        slot = self.slot_of[recipe_id]
+        keep = ~(1 << slot)
+        for ingredient_id in self.ingredients.pop(recipe_id):
+            if ingredient_id in self.dense:
+                self.dense[ingredient_id] &= keep
+            else:
+                self.sparse[ingredient_id].discard(slot)
+        for tag_id in self.tags.pop(recipe_id):
+            self.tag_bits[tag_id] &= keep
+        self.size_planes = [plane & keep for plane in self.size_planes]
+
+    def overlap_planes(self, ingredient_ids):
+        total = len(self.slots)
+        planes = []
+        counts = Counter()
+        for ingredient_id in ingredient_ids:
+            if ingredient_id in self.dense:
+                planes = add_planes(planes, [self.dense[ingredient_id]])
+            elif ingredient_id in self.sparse:
+                counts.update(self.sparse[ingredient_id])
+        return add_planes(planes, counts_to_planes(counts, total))
+
+    def search(self, ingredient_ids, max_missing, tag_ids=None,
+               recipe_ids=None):
+        """Рецепты, где есть хотя бы один из продуктов и не хватает не
+        больше max_missing ингредиентов; сначала те, где не хватает меньше.
+
+        tag_ids оставляет рецепты хотя бы с одним из тэгов, recipe_ids —
+        только перечисленные рецепты.
+        """
+        with self.lock:
+            self.refresh()
+            overlap = self.overlap_planes(set(ingredient_ids))
+            if not overlap:
+                return PantryMatches([], self.slots)
+            mask = reduce(or_, overlap)
+            if tag_ids is not None:
+                mask &= reduce(
+                    or_, (self.tag_bits.get(tag_id, 0) for tag_id in tag_ids),
+                    0
+                )
+            if recipe_ids is not None:
+                mask &= to_bitset(
+                    (self.slot_of[recipe_id] for recipe_id in recipe_ids
+                     if recipe_id in self.slot_of),
+                    len(self.slots)
+                )
+            missing = subtract_planes(self.size_planes, overlap)
+            return PantryMatches(
+                [(count, equal_to(missing, count, mask))
+                 for count in range(max_missing + 1)],
+                self.slots
+            )
+
+    def missing_ingredients(self, recipe_id, ingredient_ids):
+        return sorted(
+            self.ingredients.get(recipe_id, frozenset()) - set(ingredient_ids)
+        )
+
+
+pantry_index = PantryIndex()
@@ -0,0 +1,106 @@
+"""Сводный список покупок с приведением единиц измерения.
+
+Совместимые единицы приводятся к базовой (кг → г, л и ложки → мл), так
+что «мука 500 г» и «мука 1 кг» складываются в одну строку. Перевод и
+умножение на множитель порций из ShopList делает сама база: весь список
+считается одним GROUP BY-запросом, без обхода строк в Python.
+"""
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import DEFAULT_CACHE_ALIAS, cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db.models import (Case, CharField, Count, F, FloatField, Max, Sum,
+                              Value, When)
+from django.db.models.functions import Cast
+
+from .models import IngredientInRecipe, ShopList
+
+# Единица → (базовая единица, сколько базовых в одной).
+UNITS = {
+    'г': ('г', 1),
+    'кг': ('г', 1000),
+    'мл': ('мл', 1),
+    'л': ('мл', 1000),
+    'стакан': ('мл', 250),
+    'ст. л.': ('мл', 15),
+    'ч. л.': ('мл', 5),
+    'капля': ('мл', 0.05),
+}
+
+# Крупная единица для вывода больших количеств.
+DISPLAY_UNITS = {'г': ('кг', 1000), 'мл': ('л', 1000)}
+
+
+def canonical_unit():
+    return Case(
+        *(When(ingredient__measurement_unit=unit, then=Value(canonical))
+          for unit, (canonical, _) in UNITS.items()),
+        default=F('ingredient__measurement_unit'),
+        output_field=CharField(),
+    )
+
+
+def unit_factor():
+    return Case(
+        *(When(ingredient__measurement_unit=unit, then=Value(float(factor)))
+          for unit, (_, factor) in UNITS.items()),
+        default=Value(1.0),
+        output_field=FloatField(),
+    )
+
+
+def shopping_list(user):
+    """Строки {name, unit, total} списка покупок пользователя."""
+    return IngredientInRecipe.objects.filter(
+        recipe__shopping_cart__user=user
+    ).values(
+        name=F('ingredient__name'), unit=canonical_unit()
+    ).annotate(total=Sum(
+        F('amount') * unit_factor()
+        * Cast('recipe__shopping_cart__multiplier', FloatField()),
+        output_field=FloatField(),
+    )).order_by('name', 'unit')
+
+
+def cart_stamp(user_id):
+    """Отпечаток корзины: меняется при добавлении, удалении, смене
+    множителя и правке любого рецепта из неё."""
+    return ShopList.objects.filter(user_id=user_id).aggregate(
+        items=Count('id'), cart=Max('modified'),
+        recipes=Max('recipe__modified'),
+    )
+
+
+def cache_is_shared(backend=None):
+    """Видят ли записи backend (по умолчанию — cache) другие процессы.
+
+    Кэш в памяти процесса у каждого воркера и исполнителя задач свой:
+    заранее считать в него что-то для других процессов бесполезно.
+    """
+    # cache — прокси, isinstance проверяет настоящий бэкенд.
+    backend = caches[DEFAULT_CACHE_ALIAS] if backend is None else backend
+    return not isinstance(backend, (LocMemCache, DummyCache))
+
+
+def cached_shopping_list(user_id):
+    """shopping_list из кэша, если корзина с тех пор не менялась."""
+    key = f'shopping-list:{user_id}'
+    stamp = cart_stamp(user_id)
+    cached = cache.get(key)
+    if cached is not None and cached[0] == stamp:
+        return cached[1]
+    rows = list(shopping_list(user_id))
+    cache.set(key, (stamp, rows), settings.SHOPPING_LIST_CACHE_SECONDS)
+    return rows
+
+
+def format_amount(total, unit):
+    """Количество для человека: 1500 г → «1.5 кг», без лишних нулей."""
+    if unit in DISPLAY_UNITS:
+        display_unit, factor = DISPLAY_UNITS[unit]
+        if total >= factor:
+            total, unit = total / factor, display_unit
+    amount = Decimal(str(round(total, 2))).normalize()
+    return f'{amount:f} {unit}'
@@ -0,0 +1,139 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_delete)
+from django.dispatch import receiver
+from django.utils import timezone
+
+from users.models import User
+from .models import (Favorite, Ingredient, IngredientInRecipe, Recipe,
+                     RecipeTag, ShopList, Tag, Tombstone)
+from .trending import add_event, remove_event, weights
+
+
+def touch(recipes):
+    """Обновляет modified рецептов, чьё представление изменилось.
+
+    От modified зависят ETag рецепта, синхронизация и индексы в памяти.
+    """
+    recipes.update(modified=timezone.now())
+
+
+# id рецептов, которые touch_once обновит при выходе из блока.
+pending = ContextVar('pending_touches', default=None)
+
+
+def touch_ids(recipe_ids):
+    ids = pending.get()
+    if ids is None:
+        touch(Recipe.objects.filter(pk__in=recipe_ids))
+    else:
+        ids.update(recipe_ids)
+
+
+@contextmanager
+def touch_once():
+    """Внутри блока modified каждого рецепта обновляется один раз.
+
+    Сериализатор пересобирает тэги и ингредиенты несколькими запросами,
+    и без блока каждый из них обновлял бы рецепт отдельно.
+    """
+    ids = set()
+    reset = pending.set(ids)
+    try:
+        yield
+    finally:
+        pending.reset(reset)
+    if ids:
+        touch(Recipe.objects.filter(pk__in=ids))
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_deleted(sender, instance, **kwargs):
+    """Запоминает удалённый рецепт для клиентов синхронизации."""
+    Tombstone.objects.create(kind=Tombstone.RECIPE, object_id=instance.pk)
+
+
+@receiver(post_delete, sender=Favorite)
+def favorite_deleted(sender, instance, **kwargs):
+    """Запоминает рецепт, удалённый из избранного."""
+    Tombstone.objects.create(
+        kind=Tombstone.FAVORITE,
+        object_id=instance.recipe_id,
+        user_id=instance.user_id
+    )
+
+
+@receiver(post_delete, sender=ShopList)
+def shopping_cart_deleted(sender, instance, **kwargs):
+    """Запоминает рецепт, удалённый из списка покупок."""
+    Tombstone.objects.create(
+        kind=Tombstone.SHOPPING_CART,
+        object_id=instance.recipe_id,
+        user_id=instance.user_id
+    )
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_save, sender=ShopList)
+def trending_item_added(sender, instance, created, **kwargs):
+    """Добавление в избранное или покупки поднимает рецепт в популярных."""
+    if created:
+        add_event(instance.recipe_id, weights()[sender], instance.created)
+
+
+@receiver(post_delete, sender=Favorite)
+@receiver(post_delete, sender=ShopList)
+def trending_item_removed(sender, instance, origin=None, **kwargs):
+    if getattr(origin, 'model', type(origin)) is Recipe:
+        # Рецепт удаляется целиком, его оценка уже не нужна.
+        return
+    remove_event(instance.recipe_id, weights()[sender], instance.created)
+
+
+@receiver(post_save, sender=IngredientInRecipe)
+@receiver(post_delete, sender=IngredientInRecipe)
+@receiver(post_save, sender=RecipeTag)
+@receiver(post_delete, sender=RecipeTag)
+def recipe_part_changed(sender, instance, origin=None, **kwargs):
+    """Ингредиент или тэг рецепта добавлен, изменён или удалён."""
+    deleted_with = getattr(origin, 'model', type(origin))
+    if origin is not None and deleted_with is not sender:
+        # Каскад: рецепт удаляется сам, а удаление ингредиента или тэга
+        # обновляет свои рецепты одним запросом в pre_delete.
+        return
+    touch_ids([instance.recipe_id])
+
+
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def recipe_relations_changed(sender, instance, action, reverse, pk_set,
+                             **kwargs):
+    """recipe.tags.set(...), tag.recipes.clear() и прочие массовые
+    изменения связей, для которых post_save связей не приходит."""
+    if not reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            touch_ids([instance.pk])
+    elif action in ('post_add', 'post_remove'):
+        touch_ids(pk_set)
+    elif action == 'pre_clear':
+        touch(instance.recipes.all())
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(pre_delete, sender=Ingredient)
+@receiver(post_save, sender=Tag)
+@receiver(pre_delete, sender=Tag)
+def recipe_reference_changed(sender, instance, created=False, **kwargs):
+    """Название ингредиента или тэга есть в ответе каждого его рецепта."""
+    if not created:
+        touch(instance.recipes.all())
+
+
+@receiver(post_save, sender=User)
+def author_changed(sender, instance, created, update_fields=None, **kwargs):
+    """Автор есть в ответе рецепта; вход (last_login) не в счёт."""
+    if created or update_fields and set(update_fields) <= {'last_login'}:
+        return
+    touch(Recipe.objects.filter(author=instance))
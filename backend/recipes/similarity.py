@@ -0,0 +1,63 @@
+"""Поиск похожих рецептов по общим ингредиентам.
+
+Рецепт — разреженный бинарный вектор своих ингредиентов, близость двух
+рецептов — коэффициент Жаккара. Индекс хранит обратные списки
+«ингредиент → рецепты»: кандидатами становятся только рецепты, у
+которых есть хотя бы один общий ингредиент, поэтому запрос не
+перебирает весь каталог.
+"""
+import heapq
+from collections import Counter, defaultdict
+
+from .indexes import RecipeIndex, ingredient_sets
+
+
+class SimilarityIndex(RecipeIndex):
+    """Обратный индекс ингредиентов для поиска похожих рецептов."""
+
+    def __len__(self):
+        return len(self.recipes)
+
+    def reset(self):
+        self.recipes = {}
+        self.postings = defaultdict(set)
+
+    def load(self, recipe_ids=None):
+        return ingredient_sets(recipe_ids)
+
+    def put(self, recipe_id, ingredients):
+        self.remove(recipe_id)
+        self.recipes[recipe_id] = ingredients
+        for ingredient_id in ingredients:
+            self.postings[ingredient_id].add(recipe_id)
+
+    def remove(self, recipe_id):
+        for ingredient_id in self.recipes.pop(recipe_id, ()):
+            posting = self.postings[ingredient_id]
+            posting.discard(recipe_id)
+            if not posting:
+                del self.postings[ingredient_id]
+
+    def similar(self, recipe_id, limit):
+        """До limit пар (id рецепта, сходство) по убыванию сходства."""
+        with self.lock:
+            self.refresh()
+            ingredients = self.recipes.get(recipe_id)
+            if not ingredients:
+                return []
+            overlap = Counter()
+            for ingredient_id in ingredients:
+                overlap.update(self.postings[ingredient_id])
+            del overlap[recipe_id]
+            size = len(ingredients)
+            scored = (
+                (common / (size + len(self.recipes[other]) - common), other)
+                for other, common in overlap.items()
+            )
+            return [
+                (other, score)
+                for score, other in heapq.nlargest(limit, scored)
+            ]
+
+
+similarity_index = SimilarityIndex()
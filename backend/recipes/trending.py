@@ -0,0 +1,114 @@
+"""Популярные сейчас рецепты: оценка с затуханием во времени.
+
+Каждое добавление в избранное или в список покупок весит w и
+затухает вдвое за TRENDING_HALF_LIFE_HOURS. Вместо того чтобы уменьшать
+все оценки со временем, вклад события считается относительно
+неподвижной точки EPOCH: w * 2^((t - EPOCH) / период полураспада).
+Все оценки в любой момент затухают в одно и то же число раз, поэтому
+порядок рецептов не меняется, и оценку не нужно пересчитывать.
+
+Такие вклады растут экспоненциально, поэтому в Recipe.trending_score
+хранится натуральный логарифм их суммы. Событие меняет оценку одним
+UPDATE строки рецепта (log-sum-exp в SQL), а страница ?ordering=trending
+читается по индексу (-trending_score, -id). 0 — взаимодействий не было:
+вклад любого события после EPOCH с весом от 1 больше нуля.
+"""
+import math
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.db.models import Case, F, FloatField, Value, When
+from django.db.models.functions import Abs, Exp, Greatest, Ln
+from django.utils import timezone
+
+from .models import Favorite, Recipe, ShopList
+
+EPOCH = datetime(2024, 1, 1, tzinfo=dt_timezone.utc)
+# Разница логарифмов меньше этой — погрешность, а не взаимодействия.
+EPSILON = 1e-9
+
+
+def weights():
+    return {Favorite: settings.TRENDING_FAVORITE_WEIGHT,
+            ShopList: settings.TRENDING_CART_WEIGHT}
+
+
+def event_score(weight, moment):
+    """Логарифм вклада события с весом weight в момент moment."""
+    hours = (moment - EPOCH).total_seconds() / 3600
+    return math.log(weight) + math.log(2) * hours / (
+        settings.TRENDING_HALF_LIFE_HOURS
+    )
+
+
+def log_add(first, second):
+    """Логарифм суммы по логарифмам слагаемых; 0 — пустое слагаемое."""
+    if first <= 0:
+        return second
+    high, low = max(first, second), min(first, second)
+    return high + math.log1p(math.exp(low - high))
+
+
+def add_event(recipe_id, weight, moment=None):
+    """Прибавляет к оценке рецепта событие с весом weight."""
+    value = Value(event_score(weight, moment or timezone.now()),
+                  output_field=FloatField())
+    score = F('trending_score')
+    Recipe.objects.filter(pk=recipe_id).update(trending_score=Case(
+        When(trending_score__lte=0, then=value),
+        default=Greatest(score, value) + Ln(
+            Value(1.0) + Exp(-Abs(score - value))
+        ),
+        output_field=FloatField(),
+    ))
+
+
+def remove_event(recipe_id, weight, moment):
+    """Вычитает из оценки вклад события, добавленного в moment.
+
+    moment — неизменяемая дата добавления (created): вычитается ровно то,
+    что прибавил add_event.
+    """
+    value = event_score(weight, moment)
+    score = F('trending_score')
+    Recipe.objects.filter(pk=recipe_id).update(trending_score=Case(
+        # Вклад не меньше оценки: это было последнее взаимодействие.
+        When(trending_score__lte=value + EPSILON, then=Value(0.0)),
+        # Погрешность вычитания не должна увести оценку ниже «ничего».
+        default=Greatest(score + Ln(Value(1.0) - Exp(
+            Value(value, output_field=FloatField()) - score
+        )), Value(0.0)),
+        output_field=FloatField(),
+    ))
+
+
+def recompute_scores(batch_size=1000):
+    """Пересчитывает оценки всех рецептов по избранному и спискам покупок.
+
+    Нужен после смены весов или периода полураспада и чтобы исправить
+    оценки, которые разошлись с данными: bulk_create и update() не
+    посылают сигналов. Возвращает число изменённых рецептов.
+    """
+    scores = {}
+    for model, weight in weights().items():
+        rows = model.objects.order_by().values_list('recipe_id', 'created')
+        for recipe_id, moment in rows.iterator(chunk_size=batch_size):
+            scores[recipe_id] = log_add(
+                scores.get(recipe_id, 0), event_score(weight, moment)
+            )
+    changed = last = 0
+    while True:
+        batch = list(Recipe.objects.filter(pk__gt=last).order_by('pk').only(
+            'pk', 'trending_score'
+        )[:batch_size])
+        if not batch:
+            return changed
+        last = batch[-1].pk
+        stale = []
+        for recipe in batch:
+            score = scores.get(recipe.pk, 0.0)
+            if not math.isclose(recipe.trending_score, score):
+                recipe.trending_score = score
+                stale.append(recipe)
+        Recipe.objects.bulk_update(stale, ['trending_score'])
+        changed += len(stale)
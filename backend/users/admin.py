@@ -1,6 +1,8 @@
 from django.contrib import admin
+from django.contrib.auth.models import Permission
 
-from recipes.models import Favorite, ShopList
+from recipes.admin import ScalableAdmin, count_of
+from recipes.models import Favorite, Recipe, ShopList
 from .models import Subscription, User
 
 
@@ -8,24 +10,36 @@ class SubsInLine(admin.TabularInline):
     """Подписки"""
     model = Subscription
     fk_name = 'user'
+    autocomplete_fields = ('author',)
     extra = 1
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('author')
+
 
 class FavoriteInLine(admin.TabularInline):
     """Избранное"""
     model = Favorite
     fk_name = 'user'
+    autocomplete_fields = ('recipe',)
     extra = 1
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('recipe', 'user')
+
 
 class ShoplistInLine(admin.TabularInline):
     """Покупки"""
     model = ShopList
     fk_name = 'user'
+    autocomplete_fields = ('recipe',)
     extra = 1
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('recipe', 'user')
 
-class UserAdmin(admin.ModelAdmin):
+
+class UserAdmin(ScalableAdmin):
     """Пользователи"""
     list_display = (
         'id',
@@ -34,15 +48,42 @@ class UserAdmin(admin.ModelAdmin):
         'first_name',
         'last_name',
         'password',
+        'recipes',
+        'followers',
     )
-    search_fields = ('username',)
-    list_filter = ('username', 'email')
+    search_fields = ('username', 'email')
+    list_filter = ('is_staff', 'is_active')
     inlines = (SubsInLine, FavoriteInLine, ShoplistInLine,)
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(
+            recipes_count=count_of(Recipe, 'author'),
+            followers_count=count_of(Subscription, 'author'),
+        )
+
+    def formfield_for_manytomany(self, db_field, request, **kwargs):
+        if db_field.name == 'user_permissions':
+            # Название права включает модель: без join это запрос на право.
+            kwargs['queryset'] = Permission.objects.select_related(
+                'content_type'
+            )
+        return super().formfield_for_manytomany(db_field, request, **kwargs)
+
+    @admin.display(description='Рецептов', ordering='recipes_count')
+    def recipes(self, obj):
+        return obj.recipes_count
+
+    @admin.display(description='Подписчиков', ordering='followers_count')
+    def followers(self, obj):
+        return obj.followers_count
+
 
-class SubscriptionAdmin(admin.ModelAdmin):
+class SubscriptionAdmin(ScalableAdmin):
     """Подписки пользователя"""
     list_display = ('user', 'author')
+    list_select_related = ('user', 'author')
+    autocomplete_fields = ('user', 'author')
+    search_fields = ('user__username', 'author__username')
 
 
 admin.site.register(User, UserAdmin)